@@ -0,0 +1,162 @@
+"""
+Admin endpoints for ConversAI (cache and storage observability and maintenance)
+"""
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.core.database import get_db
+from app.core.security import require_admin
+from app.models.database import APIRegistry
+from app.services.api_handler import request_handler
+from app.services.retention import retention_service
+from app.services.api_index import api_routing_index
+from app.core.startup import startup_profile
+from app.services.http_client import shared_http_client
+from app.services.warmup import warmup_service
+from app.services.admission import admission_controller
+from app.services.scheduler import llm_scheduler, upstream_scheduler
+from app.services.intent_batcher import intent_batcher
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every admin endpoint requires a token of a user in ADMIN_USER_IDS
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/cache/stats")
+async def get_cache_stats(top_n: int = 10):
+    """
+    Response cache statistics
+    
+    Reports hits, misses, hit ratio, evictions, expirations, entries and bytes
+    held, per API and per category, plus the hottest keys.
+    """
+    try:
+        return await request_handler.get_cache_stats(top_n=top_n)
+        
+    except Exception as e:
+        logger.error(f"Error getting cache stats: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting cache stats: {str(e)}"
+        )
+
+
+@router.delete("/cache")
+async def invalidate_cache(
+    api_id: Optional[str] = None,
+    category: Optional[str] = None,
+    prefix: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Invalidate cached responses by api_id, category or key prefix
+    
+    Cache keys have the form "<api_id>:<hash>". With no filters the whole
+    response cache is cleared.
+    """
+    try:
+        if not (api_id or category or prefix):
+            await request_handler.clear_cache()
+            request_handler.stats.reset()
+            return {"message": "Cache cleared"}
+        
+        api_ids = [api_id] if api_id else []
+        if category:
+            category_apis = db.query(APIRegistry.api_id).filter(APIRegistry.category == category).all()
+            api_ids.extend(row.api_id for row in category_apis)
+            api_ids.extend(request_handler.stats.api_ids_for_category(category))
+        
+        removed = await request_handler.invalidate(api_ids=sorted(set(api_ids)), prefix=prefix)
+        return {
+            "message": "Cache entries invalidated",
+            "removed": removed
+        }
+        
+    except Exception as e:
+        logger.error(f"Error invalidating cache: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error invalidating cache: {str(e)}"
+        )
+
+
+@router.get("/retention")
+async def get_retention_status():
+    """
+    Retention status: settings, progress of a running pass and the last report
+    (conversations/messages archived, archive size, metadata compacted, and
+    row counts and database bytes before and after)
+    """
+    try:
+        return retention_service.get_status()
+        
+    except Exception as e:
+        logger.error(f"Error getting retention status: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting retention status: {str(e)}"
+        )
+
+
+@router.post("/retention/run", status_code=status.HTTP_202_ACCEPTED)
+async def run_retention(background_tasks: BackgroundTasks):
+    """Start a retention pass now; poll GET /admin/retention for the report"""
+    if retention_service.running:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A retention pass is already running"
+        )
+    
+    background_tasks.add_task(retention_service.run)
+    return {"message": "Retention pass started"}
+
+
+@router.get("/routing/stats")
+async def get_routing_stats():
+    """Routing index size: system APIs, loaded per-user shards and matrix memory"""
+    try:
+        return api_routing_index.get_stats()
+        
+    except Exception as e:
+        logger.error(f"Error getting routing stats: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting routing stats: {str(e)}"
+        )
+
+
+@router.get("/startup")
+async def get_startup_profile():
+    """
+    Boot report of this worker: import and startup phase timings against
+    STARTUP_BUDGET_MS, and services constructed on first use since
+    """
+    return startup_profile.report()
+
+
+@router.get("/connections")
+async def get_connection_stats():
+    """Upstream connection pool and DNS cache contents, and the startup warmup report"""
+    return {
+        **shared_http_client.get_stats(),
+        "warmup": warmup_service.get_status()
+    }
+
+
+@router.get("/admission")
+async def get_admission_stats():
+    """Chat admission control: turns in progress, queue depth, queue waits and shed counts"""
+    return admission_controller.get_stats()
+
+
+@router.get("/scheduler")
+async def get_scheduler_stats():
+    """Per priority class slots in use, queue depth and queue waits of each lane, and intent batching"""
+    return {
+        "chat": admission_controller.get_stats(),
+        "llm": llm_scheduler.get_stats(),
+        "upstream": upstream_scheduler.get_stats(),
+        "intent_batching": intent_batcher.get_stats()
+    }
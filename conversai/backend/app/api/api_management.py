@@ -1,14 +1,23 @@
 """
 API Management endpoints for ConversAI
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, status, Header, Response
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, List, Optional
 from app.api.schemas import APICreate, APIUpdate, APIResponse, APITestRequest, APITestResponse
 from app.core.database import get_db
 from app.models.database import APIRegistry
 from app.services.api_handler import request_handler
-from app.core.security import encryption_service
+from app.services.response_formatter import response_formatter
+from app.services.scheduler import priority_lane
+from app.services.registry_snapshot import registry_snapshot, LISTING_FIELDS
+from app.services.openapi_importer import openapi_importer, ImportValidationError
+from app.services.api_index import api_routing_index
+from app.services.credentials import credential_resolver
+from app.core.config import settings
+from app.core.security import encryption_service, get_current_user_id
+from app.core.etags import etag_matches
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,45 +25,50 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/apis", tags=["api-management"])
 
 
+def visible_apis(db: Session, user_id: str):
+    """Query over the APIs a user may see: system APIs and their own"""
+    return db.query(APIRegistry).filter(
+        or_(APIRegistry.is_system == True, APIRegistry.user_id == user_id)
+    )
+
+
 @router.get("/list", response_model=List[APIResponse])
 async def list_apis(
     include_system: bool = True,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
-    """List all available APIs"""
+    """
+    List the APIs available to the caller (system APIs and their own)
+    
+    Served from a pre-serialized snapshot with a strong ETag (send it as
+    If-None-Match to get a 304). `fields` limits each entry to a comma
+    separated list of fields, e.g. `fields=api_name,category`.
+    """
     try:
-        query = db.query(APIRegistry).filter(APIRegistry.is_active == True)
-        
-        if not include_system:
-            query = query.filter(APIRegistry.is_system == False)
-        
-        apis = query.all()
-        
-        # Explicitly convert to dict to ensure all fields are included
-        result = []
-        for api in apis:
-            api_dict = {
-                "api_id": api.api_id,
-                "api_name": api.api_name,
-                "description": api.description,
-                "category": api.category,
-                "intent_keywords": api.intent_keywords,
-                "endpoint": api.endpoint,
-                "method": api.method,
-                "auth_config": api.auth_config,
-                "parameters": api.parameters,
-                "response_mapping": api.response_mapping,
-                "response_template": api.response_template,
-                "rate_limit": api.rate_limit,
-                "error_messages": api.error_messages,
-                "is_active": api.is_active,
-                "is_system": api.is_system,
-                "created_at": api.created_at
-            }
-            result.append(api_dict)
-        
-        return result
+        field_list = None
+        if fields:
+            field_list = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = [field for field in field_list if field not in LISTING_FIELDS]
+            if unknown:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown fields: {', '.join(unknown)}"
+                )
+        
+        body, etag = registry_snapshot.get(db, user_id, include_system=include_system, fields=field_list)
+        
+        # Clients may cache the listing but must revalidate it
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
         
+        return Response(content=body, media_type="application/json", headers=headers)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing APIs: {e}")
         raise HTTPException(
@@ -66,11 +80,12 @@ async def list_apis(
 @router.get("/{api_id}", response_model=APIResponse)
 async def get_api(
     api_id: str,
+    user_id: str = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Get API details by ID"""
     try:
-        api = db.query(APIRegistry).filter(APIRegistry.api_id == api_id).first()
+        api = visible_apis(db, user_id).filter(APIRegistry.api_id == api_id).first()
         
         if not api:
             raise HTTPException(
@@ -93,6 +108,8 @@ async def get_api(
 @router.post("/register", response_model=APIResponse, status_code=status.HTTP_201_CREATED)
 async def register_api(
     api_data: APICreate,
+    background_tasks: BackgroundTasks,
+    user_id: str = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Register a new custom API"""
@@ -104,7 +121,7 @@ async def register_api(
         
         # Create new API
         new_api = APIRegistry(
-            user_id="demo-user",  # In production, get from auth
+            user_id=user_id,
             api_name=api_data.api_name,
             description=api_data.description,
             intent_keywords=api_data.intent_keywords,
@@ -117,12 +134,18 @@ async def register_api(
             response_template=api_data.response_template,
             rate_limit=api_data.rate_limit,
             error_messages=api_data.error_messages,
+            response_config=api_data.response_config,
             is_system=False
         )
         
         db.add(new_api)
         db.commit()
         db.refresh(new_api)
+        registry_snapshot.invalidate()
+        api_routing_index.upsert(new_api)
+        
+        # Pre-generate error explanations for common failure modes
+        background_tasks.add_task(response_formatter.warm_error_explanations, new_api)
         
         logger.info(f"Registered new API: {new_api.api_name}")
         return new_api
@@ -136,17 +159,91 @@ async def register_api(
         )
 
 
+@router.post("/import", status_code=status.HTTP_201_CREATED)
+async def import_apis(
+    response: Response,
+    document: Any = Body(...),
+    dry_run: bool = False,
+    user_id: str = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Bulk-register APIs from an OpenAPI 3 document or a JSON array of APIs
+    
+    Every entry is validated first; if any is invalid nothing is imported and
+    all errors are returned. Valid imports are inserted in batches within a
+    single transaction. With dry_run the derived entries are returned
+    (200 instead of 201) without importing them.
+    """
+    try:
+        try:
+            entries = openapi_importer.parse(document)
+        except ImportValidationError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={"message": "Import validation failed", "errors": e.errors}
+            )
+        
+        if dry_run:
+            response.status_code = status.HTTP_200_OK
+            return {"imported": 0, "apis": [entry.model_dump() for entry in entries]}
+        
+        new_apis = []
+        for start in range(0, len(entries), settings.IMPORT_BATCH_SIZE):
+            batch = []
+            for api_data in entries[start:start + settings.IMPORT_BATCH_SIZE]:
+                # Encrypt sensitive data if present
+                auth_config = api_data.auth_config
+                if auth_config and "key" in auth_config:
+                    auth_config["key"] = encryption_service.encrypt(auth_config["key"])
+                
+                batch.append(APIRegistry(
+                    user_id=user_id,
+                    auth_config=auth_config,
+                    is_system=False,
+                    **api_data.model_dump(exclude={"auth_config"})
+                ))
+            db.add_all(batch)
+            # Send the batch's INSERTs now; the transaction stays open
+            db.flush()
+            new_apis.extend(batch)
+        
+        db.commit()
+        
+        # Refresh registry-derived state once for the whole import
+        registry_snapshot.invalidate()
+        api_routing_index.upsert_many(new_apis)
+        
+        logger.info(f"Imported {len(new_apis)} APIs")
+        return {
+            "imported": len(new_apis),
+            "apis": [{"api_id": api.api_id, "api_name": api.api_name} for api in new_apis]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error importing APIs: {e}")
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error importing APIs: {str(e)}"
+        )
+
+
 @router.put("/{api_id}", response_model=APIResponse)
 async def update_api(
     api_id: str,
     api_update: APIUpdate,
+    background_tasks: BackgroundTasks,
+    user_id: str = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Update an existing API"""
     try:
         logger.info(f"Updating API {api_id} with data: {api_update.dict(exclude_unset=True)}")
         
-        api = db.query(APIRegistry).filter(APIRegistry.api_id == api_id).first()
+        api = visible_apis(db, user_id).filter(APIRegistry.api_id == api_id).first()
         
         if not api:
             raise HTTPException(
@@ -175,6 +272,14 @@ async def update_api(
         
         db.commit()
         db.refresh(api)
+        registry_snapshot.invalidate()
+        api_routing_index.upsert(api)
+        credential_resolver.forget(api.api_id)
+        
+        # Cached responses and explanations may be stale, so drop/regenerate them
+        await request_handler.invalidate(api_ids=[api.api_id])
+        await response_formatter.invalidate_error_explanations(api.api_id)
+        background_tasks.add_task(response_formatter.warm_error_explanations, api)
         
         logger.info(f"Successfully updated API: {api.api_name}")
         return api
@@ -193,11 +298,12 @@ async def update_api(
 @router.delete("/{api_id}")
 async def delete_api(
     api_id: str,
+    user_id: str = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Delete a custom API"""
     try:
-        api = db.query(APIRegistry).filter(APIRegistry.api_id == api_id).first()
+        api = visible_apis(db, user_id).filter(APIRegistry.api_id == api_id).first()
         
         if not api:
             raise HTTPException(
@@ -213,6 +319,12 @@ async def delete_api(
         
         db.delete(api)
         db.commit()
+        registry_snapshot.invalidate()
+        api_routing_index.remove(api_id)
+        credential_resolver.forget(api_id)
+        
+        await request_handler.invalidate(api_ids=[api_id])
+        await response_formatter.invalidate_error_explanations(api_id)
         
         logger.info(f"Deleted API: {api.api_name}")
         return {"message": f"API '{api.api_name}' deleted successfully"}
@@ -232,13 +344,14 @@ async def delete_api(
 async def test_api(
     api_id: str,
     test_request: APITestRequest,
+    user_id: str = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Test an API with sample parameters"""
     try:
         from app.services.api_mapper import APIMapper
         
-        api = db.query(APIRegistry).filter(APIRegistry.api_id == api_id).first()
+        api = visible_apis(db, user_id).filter(APIRegistry.api_id == api_id).first()
         
         if not api:
             raise HTTPException(
@@ -247,7 +360,8 @@ async def test_api(
             )
         
         # Prepare request
-        api_mapper = APIMapper(db)
+        api_mapper = APIMapper(db, user_id=user_id)
+        await credential_resolver.prime(api)
         request_config = api_mapper.prepare_api_request(api, test_request.test_params)
         
         if not request_config:
@@ -256,12 +370,15 @@ async def test_api(
                 error="Failed to prepare API request"
             )
         
-        # Send test request
-        response = await request_handler.send_request(
-            request_config=request_config,
-            category=api.category,
-            use_cache=False  # Don't cache test requests
-        )
+        # Send test request (admin lane: a slow custom API can't take live chats' upstream slots)
+        with priority_lane("admin"):
+            response = await request_handler.send_request(
+                request_config=request_config,
+                category=api.category,
+                use_cache=False,  # Don't cache test requests
+                response_config=api.response_config,  # Still capped by max_response_bytes
+                keep_raw=True  # Show the full upstream payload
+            )
         
         # Check for errors
         if "error" in response:
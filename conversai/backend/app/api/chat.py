@@ -1,16 +1,23 @@
 """
 Chat endpoints for ConversAI
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Header, Response, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, List, Optional
 from app.api.schemas import ChatMessage, ChatResponse, MessageHistory
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, SessionLocal
+from app.core.security import get_current_user_id
+from app.core.etags import etag_matches
+from app.core import serialization
 from app.services.query_processor import QueryProcessor
-from app.services.api_mapper import APIMapper
-from app.services.api_handler import request_handler
-from app.services.response_formatter import response_formatter
-from app.models.database import Message, Conversation
+from app.services.chat_pipeline import chat_pipeline, ChatSessionState
+from app.services.context_builder import context_builder
+from app.services.admission import admission_controller, AdmissionRejected, CHAT_PRIORITIES
+from app.services.scheduler import priority_lane
+from app.models.database import Conversation
+import asyncio
+import hashlib
 import logging
 from datetime import datetime
 
@@ -22,134 +29,46 @@ router = APIRouter(prefix="/chat", tags=["chat"])
 @router.post("/message", response_model=ChatResponse)
 async def send_message(
     chat_msg: ChatMessage,
+    background_tasks: BackgroundTasks,
+    x_priority: str = Header("interactive"),
+    user_id: str = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
     Process a user message and return AI response
     
-    Flow:
+    Answers 503 with Retry-After when the server is at its chat
+    concurrency limit and the wait queue is full or the wait times out.
+    Automated clients should send `X-Priority: batch`, so their turns
+    don't take capacity reserved for interactive users.
+    
+    Flow (see ChatPipeline):
     1. Process query and extract intent
     2. Find matching API
     3. Prepare and send API request
     4. Format response naturally
     5. Save conversation
     """
-    try:
-        # Initialize services
-        query_processor = QueryProcessor(db)
-        api_mapper = APIMapper(db)
-        
-        # Get or create session
-        session_id = chat_msg.session_id
-        if not session_id:
-            # For demo, use a default user_id (in production, get from auth)
-            session_id = query_processor.create_session(user_id="demo-user")
-        
-        # Process query and extract intent
-        intent_data = query_processor.process_query(chat_msg.message, session_id)
-        
-        # Check if clarification needed
-        if intent_data.get("needs_clarification"):
-            query_processor.save_message(
-                session_id=session_id,
-                role="assistant",
-                content=intent_data["clarification_question"],
-                metadata=intent_data
-            )
-            
-            return ChatResponse(
-                response=intent_data["clarification_question"],
-                session_id=session_id,
-                intent=intent_data,
-                api_used=None,
-                cached=False
-            )
-        
-        # Find matching API
-        api = api_mapper.find_matching_api(
-            intent_data["intent"],
-            intent_data.get("entities", {}),
-            chat_msg.message  # Pass the original user query for better keyword matching
-        )
-        
-        if not api:
-            error_msg = "I couldn't find an appropriate API for your request. Please try rephrasing or register a custom API."
-            query_processor.save_message(
-                session_id=session_id,
-                role="assistant",
-                content=error_msg,
-                metadata={"error": "no_api_found"}
-            )
-            
-            return ChatResponse(
-                response=error_msg,
-                session_id=session_id,
-                intent=intent_data,
-                api_used=None,
-                cached=False
-            )
-        
-        # Prepare API request
-        request_config = api_mapper.prepare_api_request(api, intent_data.get("entities", {}))
-        
-        if not request_config:
-            error_msg = "Failed to prepare API request. Please check your input parameters."
-            query_processor.save_message(
-                session_id=session_id,
-                role="assistant",
-                content=error_msg,
-                metadata={"error": "request_preparation_failed"}
-            )
-            
-            return ChatResponse(
-                response=error_msg,
-                session_id=session_id,
-                intent=intent_data,
-                api_used=api.api_name,
-                cached=False
-            )
-        
-        # Send API request
-        api_response = await request_handler.send_request(
-            request_config=request_config,
-            category=api.category
-        )
-        
-        # Format response naturally
-        try:
-            formatted_response = await response_formatter.format_response(
-                api_data=api_response,
-                api=api,
-                query=chat_msg.message,
-                use_llm=True
-            )
-        except Exception as format_error:
-            logger.error(f"Response formatting error: {format_error}", exc_info=True)
-            logger.error(f"API response data: {api_response}")
-            logger.error(f"API config: {api.api_name}, category: {api.category}")
-            raise
-        
-        # Save assistant response
-        query_processor.save_message(
-            session_id=session_id,
-            role="assistant",
-            content=formatted_response,
-            metadata={
-                "intent": intent_data,
-                "api_id": api.api_id,
-                "api_name": api.api_name,
-                "cached": api_response.get("_cached", False)
-            }
+    if x_priority not in CHAT_PRIORITIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"X-Priority must be one of: {', '.join(CHAT_PRIORITIES)}"
         )
+    
+    try:
+        with priority_lane(x_priority):
+            async with admission_controller.admit():
+                response = await chat_pipeline.run(db, user_id, chat_msg.message, session_id=chat_msg.session_id)
+        # Fold the exchange into the session summary after the response is sent
+        background_tasks.add_task(context_builder.record_turn, response.session_id, response.intent, response.api_used)
+        return response
         
-        return ChatResponse(
-            response=formatted_response,
-            session_id=session_id,
-            intent=intent_data,
-            api_used=api.api_name,
-            cached=api_response.get("_cached", False)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
         )
-        
     except Exception as e:
         logger.error(f"Error processing message: {e}")
         raise HTTPException(
@@ -158,25 +77,162 @@ async def send_message(
         )
 
 
+@router.websocket("/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    session_id: Optional[str] = None,
+    token: Optional[str] = None,
+    priority: str = "interactive"
+):
+    """
+    Chat over one long-lived connection
+    
+    The session's context, last entities and any pending clarification are
+    kept in memory for the life of the connection, so follow-up turns skip
+    the history query. Authenticate with an Authorization header or a
+    `token` query parameter; pass `session_id` to resume one of your open
+    sessions (anything else starts a new one) and `priority=batch` for
+    automated clients.
+    
+    Client sends: {"message": "...", "id": optional client reference}
+    Server sends, per message and strictly in the order received:
+      {"type": "stage", "id", "stage": "understanding" | "routing" | "fetching" | "formatting", ...}
+      {"type": "token", "id", "text"}   (the answer, streamed in pieces)
+      {"type": "done", "id", ...ChatResponse fields}
+      {"type": "error", "id", "detail"}   (plus "retry_after" when shed under overload)
+    Messages may be pipelined (sent before earlier answers arrive), up to
+    WS_MAX_PENDING_MESSAGES waiting.
+    """
+    try:
+        authorization = websocket.headers.get("authorization") or (f"Bearer {token}" if token else None)
+        user_id = get_current_user_id(authorization)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if priority not in CHAT_PRIORITIES:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    
+    db = SessionLocal()
+    try:
+        exists = session_id and db.query(Conversation.session_id).filter(
+            Conversation.session_id == session_id,
+            Conversation.user_id == user_id,
+            Conversation.ended_at.is_(None)
+        ).first()
+        if not exists:
+            session_id = QueryProcessor(db).create_session(user_id=user_id)
+    finally:
+        db.close()
+    
+    state = ChatSessionState(session_id, user_id)
+    # Resuming: the first turn seeds the in-memory context from stored history
+    state.history_loaded = not exists
+    await websocket.send_json({"type": "session", "session_id": session_id})
+    
+    pending: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_MAX_PENDING_MESSAGES)
+    # The worker task inherits the connection's priority class
+    with priority_lane(priority):
+        worker = asyncio.create_task(_process_websocket_messages(websocket, state, pending))
+    try:
+        while True:
+            data = await websocket.receive_json()
+            message = data.get("message") if isinstance(data, dict) else None
+            message_id = data.get("id") if isinstance(data, dict) else None
+            if not isinstance(message, str) or not message.strip():
+                await websocket.send_json({"type": "error", "id": message_id, "detail": "Expected {\"message\": \"...\"}"})
+                continue
+            try:
+                pending.put_nowait({"id": message_id, "message": message})
+            except asyncio.QueueFull:
+                await websocket.send_json({"type": "error", "id": message_id, "detail": "Too many pending messages"})
+    except (WebSocketDisconnect, ValueError):
+        pass
+    finally:
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
+
+
+async def _process_websocket_messages(websocket: WebSocket, state: ChatSessionState, pending: asyncio.Queue):
+    """Run a connection's messages one at a time, in the order they arrived"""
+    while True:
+        item = await pending.get()
+        message_id = item["id"]
+        
+        async def emit(event: Dict[str, Any]):
+            await websocket.send_json({**event, "id": message_id})
+        
+        db = SessionLocal()
+        try:
+            async with admission_controller.admit():
+                response = await chat_pipeline.run(db, state.user_id, item["message"], state=state, emit=emit)
+            await context_builder.record_turn(response.session_id, response.intent, response.api_used)
+            await websocket.send_json({"type": "done", "id": message_id, **response.model_dump(mode="json")})
+        except (WebSocketDisconnect, asyncio.CancelledError):
+            raise
+        except AdmissionRejected as e:
+            await websocket.send_json({"type": "error", "id": message_id, "detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            try:
+                await websocket.send_json({"type": "error", "id": message_id, "detail": f"Error processing message: {str(e)}"})
+            except Exception:
+                return
+        finally:
+            db.close()
+
+
 @router.get("/history/{session_id}", response_model=List[MessageHistory])
 async def get_conversation_history(
     session_id: str,
-    limit: int = 50,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    include_metadata: bool = False,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Get conversation history for a session"""
+    """
+    Get conversation history for a session, newest page first
+    
+    Pass the X-Next-Cursor header of a response as `before` to page back to
+    older messages. Message metadata is only returned with include_metadata.
+    Responses carry an ETag; send it as If-None-Match to get a 304 when the
+    page is unchanged.
+    """
     try:
-        messages = db.query(Message).filter(
-            Message.session_id == session_id
-        ).order_by(
-            Message.created_at.desc()
-        ).limit(limit).all()
+        query_processor = QueryProcessor(db)
+        try:
+            messages, next_cursor = query_processor.get_history_page(
+                session_id, limit, before=before, include_metadata=include_metadata
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        
+        # Hash the page as served: retention compaction rewrites the metadata
+        # of old messages, so their IDs alone don't identify the body
+        body = serialization.dumps({"messages": messages, "next_cursor": next_cursor})
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
         
-        # Reverse for chronological order
-        messages = list(reversed(messages))
+        headers = {"ETag": etag}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
         
+        response.headers.update(headers)
         return messages
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving history: {e}")
         raise HTTPException(
@@ -200,6 +256,7 @@ async def clear_conversation(
         if conversation:
             conversation.ended_at = datetime.utcnow()
             db.commit()
+            await context_builder.forget(session_id)
             return {"message": "Conversation ended successfully"}
         else:
             raise HTTPException(
@@ -219,13 +276,13 @@ async def clear_conversation(
 
 @router.post("/session/new")
 async def create_new_session(
+    user_id: str = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Create a new conversation session"""
     try:
         query_processor = QueryProcessor(db)
-        # For demo, use default user_id
-        session_id = query_processor.create_session(user_id="demo-user")
+        session_id = query_processor.create_session(user_id=user_id)
         
         return {
             "session_id": session_id,
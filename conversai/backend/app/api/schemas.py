@@ -72,6 +72,7 @@ class APICreate(BaseModel):
     response_template: Optional[str] = None
     rate_limit: Optional[Dict[str, Any]] = None
     error_messages: Optional[Dict[str, Any]] = None
+    response_config: Optional[Dict[str, Any]] = None
 
 
 class APIUpdate(BaseModel):
@@ -87,6 +88,7 @@ class APIUpdate(BaseModel):
     response_template: Optional[str] = None
     rate_limit: Optional[Dict[str, Any]] = None
     error_messages: Optional[Dict[str, Any]] = None
+    response_config: Optional[Dict[str, Any]] = None
     is_active: Optional[bool] = None
 
 
@@ -104,6 +106,7 @@ class APIResponse(BaseModel):
     response_template: Optional[str] = None
     rate_limit: Optional[Dict[str, Any]] = None
     error_messages: Optional[Dict[str, Any]] = None
+    response_config: Optional[Dict[str, Any]] = None
     is_active: bool
     is_system: bool
     created_at: datetime
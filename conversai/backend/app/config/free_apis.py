@@ -173,6 +173,9 @@ FREE_APIS = [
         "rate_limit": {
             "requests_per_minute": 100
         },
+        "response_config": {
+            "negative_ttl": 3600  # Misspelled words stay misspelled
+        },
         "is_system": True,
         "is_active": True
     },
@@ -274,6 +277,9 @@ FREE_APIS = [
         "rate_limit": {
             "requests_per_second": 200
         },
+        "response_config": {
+            "negative_ttl": 600
+        },
         "is_system": True,
         "is_active": True
     },
@@ -0,0 +1,850 @@
+"""
+Cache backends shared by the request handler and other caches
+
+The in-process backend keeps each worker's cache separate, while the Redis and
+SQLite backends let every uvicorn worker share one cache. The in-process backend
+can optionally be backed by a persistent SQLite tier that survives restarts.
+
+Async callers use the a* methods (aget, aset, ...), which run the Redis and
+SQLite backends' I/O in a small thread pool instead of on the event loop.
+"""
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core import serialization
+import asyncio
+import heapq
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Optional dependency, only needed for CACHE_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """Key/value cache with per-entry TTLs and compactly serialized values"""
+
+    name = "base"
+    # True when operations do network or disk I/O (the a* methods then run them off the event loop)
+    blocking = False
+
+    def __init__(self, namespace: str, default_ttl: int = 300):
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        # Called as listener(key, reason) when the backend drops an entry itself
+        # (reason is "eviction" or "expiration")
+        self.listener: Optional[Callable[[str, str], None]] = None
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on a miss"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Store a value for ttl seconds (default_ttl if not given)"""
+
+    @abstractmethod
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Store a value only if the key is absent (atomic across workers on shared backends)
+
+        Returns True if the value was stored; used as a short lease, e.g. to
+        elect one worker to refresh a key.
+        """
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a single key"""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> int:
+        """Remove all keys starting with prefix, returning how many were removed"""
+
+    @abstractmethod
+    def clear(self):
+        """Remove every key in this namespace"""
+
+    @abstractmethod
+    def size(self) -> int:
+        """Number of live entries in this namespace"""
+
+    def stats(self) -> Dict[str, Any]:
+        """Basic backend statistics"""
+        return {
+            "backend": self.name,
+            "namespace": self.namespace,
+            "size": self.size(),
+            "default_ttl": self.default_ttl
+        }
+
+    def usage_by_prefix(self) -> Dict[str, Dict[str, int]]:
+        """Entries and bytes held, grouped by the key part before the first ':'"""
+        return {}
+
+    def set_listener(self, listener: Callable[[str, str], None]):
+        """Register a callback for evictions and expirations"""
+        self.listener = listener
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get() for async callers"""
+        return await self.run(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[int] = None):
+        """set() for async callers"""
+        if not self.blocking:
+            self.set(key, value, ttl)
+            return
+        # Serialize on the caller's side so later mutations of value cannot leak into the write
+        await self.run(self.set_serialized, key, self._serialize(value), ttl)
+
+    async def adelete(self, key: str):
+        """delete() for async callers"""
+        await self.run(self.delete, key)
+
+    async def adelete_prefix(self, prefix: str) -> int:
+        """delete_prefix() for async callers"""
+        return await self.run(self.delete_prefix, prefix)
+
+    async def aclear(self):
+        """clear() for async callers"""
+        await self.run(self.clear)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Call fn(*args), in the cache I/O threads if this backend blocks"""
+        if not self.blocking:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(_io_executor(), fn, *args)
+
+    def set_serialized(self, key: str, payload: bytes, ttl: Optional[int] = None):
+        """Store an already serialized value"""
+        self.set(key, self._deserialize(payload), ttl)
+
+    def _notify(self, key: str, reason: str):
+        if self.listener:
+            try:
+                self.listener(key, reason)
+            except Exception as e:
+                logger.warning(f"Cache listener failed: {e}")
+
+    def _serialize(self, value: Any) -> bytes:
+        """Serialize a value to compact JSON bytes"""
+        return serialization.dumps(value)
+
+    def _deserialize(self, data: bytes) -> Any:
+        """Deserialize bytes written by _serialize"""
+        return serialization.loads(data)
+
+    def _ttl(self, ttl: Optional[int]) -> int:
+        return ttl if ttl is not None else self.default_ttl
+
+
+# Approximate per-entry bookkeeping overhead (key, tuples, heap items) in bytes
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class GDSFStore:
+    """Byte-bounded mapping of serialized payloads with per-entry expiry
+    
+    Eviction follows Greedy-Dual-Size-Frequency: an entry's priority is
+    clock + frequency / size, so small, frequently hit entries outlive large
+    cold ones. The clock advances to the priority of each evicted entry, which
+    ages out entries that stopped being hit. Entries larger than
+    max_entry_bytes are not admitted at all.
+    
+    Every entry dropped by the store itself (eviction or expiry) is reported
+    to on_remove(key, reason).
+    """
+
+    def __init__(self, max_bytes: int, on_remove: Callable[[str, str], None], max_entry_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes
+        self.on_remove = on_remove
+        # Format: {key: [payload, expires_at, frequency, priority, size]}
+        self.data: Dict[str, list] = {}
+        # Min-heaps of (expires_at, key) and (priority, key); stale items are skipped when popped
+        self.expiry: List[Tuple[float, str]] = []
+        self.priorities: List[Tuple[float, str]] = []
+        self.clock = 0.0
+        self.bytes = 0
+        self.rejected = 0
+
+    def get(self, key: str, now: float) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            self._remove(key, "expiration")
+            return None
+        entry[2] += 1
+        self._prioritize(key, entry)
+        return entry[0]
+
+    def set(self, key: str, payload: bytes, expires_at: float, now: float) -> bool:
+        """Store a payload, returning False if it was not admitted"""
+        size = len(payload) + len(key) + ENTRY_OVERHEAD_BYTES
+        previous = self.data.get(key)
+        self.pop(key)
+        if size > self.max_entry_bytes:
+            self.rejected += 1
+            return False
+        
+        self.expire(now)
+        while self.data and self.bytes + size > self.max_bytes:
+            self._evict()
+        
+        # Keep the hit count of a refreshed key so prefetched hot entries stay hot
+        entry = [payload, expires_at, previous[2] if previous else 1, 0.0, size]
+        self.data[key] = entry
+        self.bytes += size
+        heapq.heappush(self.expiry, (expires_at, key))
+        self._prioritize(key, entry)
+        return True
+
+    def pop(self, key: str) -> bool:
+        entry = self.data.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[4]
+        return True
+
+    def expire(self, now: float):
+        """Drop entries whose expiry has passed"""
+        while self.expiry and self.expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self.expiry)
+            entry = self.data.get(key)
+            if entry is not None and entry[1] == expires_at:
+                self._remove(key, "expiration")
+        # Rebuild the heaps if overwritten/deleted keys left too many stale items
+        if len(self.expiry) > 2 * len(self.data) + 64:
+            self.expiry = [(entry[1], key) for key, entry in self.data.items()]
+            heapq.heapify(self.expiry)
+        if len(self.priorities) > 2 * len(self.data) + 64:
+            self.priorities = [(entry[3], key) for key, entry in self.data.items()]
+            heapq.heapify(self.priorities)
+
+    def clear(self):
+        self.data.clear()
+        self.expiry.clear()
+        self.priorities.clear()
+        self.bytes = 0
+
+    def _prioritize(self, key: str, entry: list):
+        entry[3] = self.clock + entry[2] / entry[4]
+        heapq.heappush(self.priorities, (entry[3], key))
+
+    def _evict(self):
+        """Evict the entry with the lowest priority"""
+        while self.priorities:
+            priority, key = heapq.heappop(self.priorities)
+            entry = self.data.get(key)
+            if entry is not None and entry[3] == priority:
+                self.clock = priority
+                self._remove(key, "eviction")
+                return
+
+    def _remove(self, key: str, reason: str):
+        if self.pop(key):
+            self.on_remove(key, reason)
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process cache (one per worker)"""
+
+    name = "memory"
+
+    def __init__(self, namespace: str, default_ttl: int = 300, max_bytes: Optional[int] = None):
+        super().__init__(namespace, default_ttl)
+        max_bytes = max_bytes or settings.CACHE_MAX_BYTES
+        self.cache = GDSFStore(
+            max_bytes,
+            on_remove=self._notify,
+            max_entry_bytes=int(max_bytes * settings.CACHE_MAX_ENTRY_FRACTION)
+        )
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            payload = self.cache.get(key, time.time())
+        if payload is None:
+            return None
+        return self._deserialize(payload)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self.set_serialized(key, self._serialize(value), ttl)
+
+    def set_serialized(self, key: str, payload: bytes, ttl: Optional[int] = None):
+        """Store an already serialized value"""
+        now = time.time()
+        with self.lock:
+            self.cache.set(key, payload, now + self._ttl(ttl), now)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        payload = self._serialize(value)
+        now = time.time()
+        with self.lock:
+            if self.cache.get(key, now) is not None:
+                return False
+            return self.cache.set(key, payload, now + self._ttl(ttl), now)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.cache.pop(key)
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self.lock:
+            keys = [key for key in self.cache.data if key.startswith(prefix)]
+            for key in keys:
+                self.cache.pop(key)
+        return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def size(self) -> int:
+        with self.lock:
+            self.cache.expire(time.time())
+            return len(self.cache.data)
+
+    def usage_by_prefix(self) -> Dict[str, Dict[str, int]]:
+        with self.lock:
+            self.cache.expire(time.time())
+            usage: Dict[str, Dict[str, int]] = {}
+            for key, entry in self.cache.data.items():
+                bucket = usage.setdefault(key.split(":", 1)[0], {"entries": 0, "bytes": 0})
+                bucket["entries"] += 1
+                bucket["bytes"] += entry[4]
+        return usage
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["bytes"] = self.cache.bytes
+        stats["max_bytes"] = self.cache.max_bytes
+        stats["rejected"] = self.cache.rejected
+        return stats
+
+
+class RedisCacheBackend(CacheBackend):
+    """Cache shared by all workers through a Redis-protocol server
+
+    Next to the entries each namespace keeps an index: a sorted set of its
+    keys by expiry time, a hash of their sizes and a hash of entry and byte
+    counters per key prefix. size() and usage_by_prefix() read the index
+    instead of scanning the keyspace; keys Redis expired on its own are
+    taken off the counters when the index is pruned (at most once a minute
+    on writes, and before reporting).
+    """
+
+    name = "redis"
+    blocking = True
+    # Seconds between index prunes triggered by writes
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, namespace: str, default_ttl: int = 300, url: Optional[str] = None, client: Any = None):
+        super().__init__(namespace, default_ttl)
+        if client is None:
+            if redis is None:
+                raise RuntimeError("redis package is not installed (pip install redis)")
+            client = redis.Redis.from_url(url or settings.REDIS_URL)
+        # Any redis-py compatible client works, e.g. fakeredis.FakeRedis() in tests
+        self.client = client
+        index = f"cache-index:{namespace}"
+        self.expiry_key = f"{index}:expiry"
+        self.sizes_key = f"{index}:sizes"
+        self.usage_key = f"{index}:usage"
+        self.next_prune = 0.0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        data = self.client.get(self._key(key))
+        if data is None:
+            return None
+        return self._deserialize(data)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self.set_serialized(key, self._serialize(value), ttl)
+
+    def set_serialized(self, key: str, payload: bytes, ttl: Optional[int] = None):
+        """Store an already serialized value"""
+        ttl = max(1, int(self._ttl(ttl)))
+        self.client.set(self._key(key), payload, ex=ttl)
+        self._track(key, len(payload), ttl)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        ttl = self._ttl(ttl)
+        payload = self._serialize(value)
+        if not self.client.set(self._key(key), payload, px=max(1, int(ttl * 1000)), nx=True):
+            return False
+        self._track(key, len(payload), ttl)
+        return True
+
+    def delete(self, key: str):
+        self._untrack([key], delete_entries=True)
+
+    def delete_prefix(self, prefix: str) -> int:
+        namespace_length = len(self.namespace) + 1
+        keys = [
+            self._text(raw_key)[namespace_length:]
+            for raw_key in self.client.scan_iter(match=f"{self._glob_escape(self._key(prefix))}*", count=500)
+        ]
+        for start in range(0, len(keys), 500):
+            self._untrack(keys[start:start + 500], delete_entries=True)
+        return len(keys)
+
+    def clear(self):
+        self.delete_prefix("")
+        self.client.delete(self.expiry_key, self.sizes_key, self.usage_key)
+
+    def size(self) -> int:
+        self.prune()
+        return self.client.zcard(self.expiry_key)
+
+    def usage_by_prefix(self) -> Dict[str, Dict[str, int]]:
+        # Redis expires keys itself, so evictions/expirations are not reported to the listener
+        self.prune()
+        usage: Dict[str, Dict[str, int]] = {}
+        for field, value in self.client.hgetall(self.usage_key).items():
+            prefix, counter = self._text(field).rsplit(":", 1)
+            usage.setdefault(prefix, {"entries": 0, "bytes": 0})[counter] = int(value)
+        return {prefix: counts for prefix, counts in usage.items() if counts["entries"] > 0}
+
+    def prune(self):
+        """Take keys past their expiry time off the index and counters"""
+        self.next_prune = time.time() + self.PRUNE_INTERVAL
+        while True:
+            expired = [
+                self._text(raw_key)
+                for raw_key in self.client.zrangebyscore(self.expiry_key, "-inf", time.time(), start=0, num=500)
+            ]
+            if expired:
+                self._untrack(expired, delete_entries=False)
+            if len(expired) < 500:
+                return
+
+    def _track(self, key: str, size: int, ttl: float):
+        """Record a stored key in the index and counters"""
+        pipe = self.client.pipeline()
+        pipe.hget(self.sizes_key, key)
+        pipe.zadd(self.expiry_key, {key: time.time() + ttl})
+        pipe.hset(self.sizes_key, key, size)
+        previous = pipe.execute()[0]
+
+        # The MULTI above read and replaced the size atomically, so concurrent
+        # writers of one key each apply only their own difference
+        prefix = self._prefix(key)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrby(self.usage_key, f"{prefix}:bytes", size - int(previous or 0))
+        if previous is None:
+            pipe.hincrby(self.usage_key, f"{prefix}:entries", 1)
+        pipe.execute()
+
+        if time.time() >= self.next_prune:
+            self.prune()
+
+    def _untrack(self, keys: List[str], delete_entries: bool):
+        """Remove keys from the index (and the entries themselves if asked), updating the counters"""
+        if not keys:
+            return
+        pipe = self.client.pipeline()
+        pipe.hmget(self.sizes_key, keys)
+        pipe.hdel(self.sizes_key, *keys)
+        pipe.zrem(self.expiry_key, *keys)
+        if delete_entries:
+            pipe.delete(*(self._key(key) for key in keys))
+        sizes = pipe.execute()[0]
+
+        pipe = self.client.pipeline(transaction=False)
+        for key, size in zip(keys, sizes):
+            if size is not None:
+                prefix = self._prefix(key)
+                pipe.hincrby(self.usage_key, f"{prefix}:entries", -1)
+                pipe.hincrby(self.usage_key, f"{prefix}:bytes", -int(size))
+        pipe.execute()
+
+    def _glob_escape(self, text: str) -> str:
+        """Escape SCAN MATCH metacharacters so text is matched literally"""
+        return re.sub(r"([\\*?\[\]])", r"\\\1", text)
+
+    def _prefix(self, key: str) -> str:
+        return key.split(":", 1)[0]
+
+    def _text(self, value: Any) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Cache shared by all workers on one host through a SQLite file"""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, namespace: str, default_ttl: int = 300, path: Optional[str] = None):
+        super().__init__(namespace, default_ttl)
+        self.path = path or settings.CACHE_SQLITE_PATH
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+        # WAL lets readers in other workers proceed while one worker writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, expires_at) for a live entry, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= time.time():
+            self.delete(key)
+            self._notify(key, "expiration")
+            return None
+        return self._deserialize(row[0]), row[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self.set_serialized(key, self._serialize(value), ttl)
+
+    def set_serialized(self, key: str, payload: bytes, ttl: Optional[int] = None):
+        """Store an already serialized value"""
+        expires_at = time.time() + self._ttl(ttl)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, payload, expires_at)
+            )
+            self.conn.commit()
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        payload = self._serialize(value)
+        now = time.time()
+        with self.lock:
+            # One write transaction, so workers in other processes see either no row or ours
+            self.conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                (self.namespace, key, now)
+            )
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, payload, now + self._ttl(ttl))
+            )
+            self.conn.commit()
+        return cursor.rowcount == 1
+
+    def delete(self, key: str):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            )
+            self.conn.commit()
+
+    def delete_prefix(self, prefix: str) -> int:
+        # substr() instead of LIKE so '%' and '_' in keys are matched literally
+        with self.lock:
+            cursor = self.conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND substr(key, 1, ?) = ?",
+                (self.namespace, len(prefix), prefix)
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def clear(self):
+        self.delete_prefix("")
+
+    def size(self) -> int:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ? AND expires_at > ?",
+                (self.namespace, time.time())
+            ).fetchone()
+        return row[0]
+
+    def usage_by_prefix(self) -> Dict[str, Dict[str, int]]:
+        with self.lock:
+            rows = self.conn.execute(
+                """SELECT CASE WHEN instr(key, ':') > 0 THEN substr(key, 1, instr(key, ':') - 1) ELSE key END,
+                          COUNT(*), SUM(length(value))
+                   FROM cache_entries WHERE namespace = ? AND expires_at > ?
+                   GROUP BY 1""",
+                (self.namespace, time.time())
+            ).fetchall()
+        return {prefix: {"entries": entries, "bytes": size or 0} for prefix, entries, size in rows}
+
+    def purge_expired(self) -> int:
+        """Delete expired entries in this namespace, returning how many were removed"""
+        now = time.time()
+        with self.lock:
+            expired = [
+                row[0] for row in self.conn.execute(
+                    "SELECT key FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+                    (self.namespace, now)
+                )
+            ]
+            self.conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+                (self.namespace, now)
+            )
+            self.conn.commit()
+        for key in expired:
+            self._notify(key, "expiration")
+        return len(expired)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class TieredCacheBackend(CacheBackend):
+    """In-process cache backed by a persistent SQLite tier for warm restarts
+    
+    Reads hit memory first and lazily load from disk on a miss. Writes go to
+    memory immediately and are written through to disk by a background thread,
+    which also garbage collects expired entries.
+
+    Deletes are queued the same way, so until the writer has applied one the
+    deleted key (or prefix) is tombstoned: reads treat it as a miss instead
+    of loading the old disk row back into memory.
+    """
+
+    name = "tiered"
+
+    def __init__(self, memory: MemoryCacheBackend, persistent: SQLiteCacheBackend, gc_interval: int = 300):
+        super().__init__(memory.namespace, memory.default_ttl)
+        self.memory = memory
+        self.persistent = persistent
+        self.gc_interval = gc_interval
+
+        # Keys and prefixes deleted in memory whose disk delete is still queued
+        # (Format: {key_or_prefix: queued deletes})
+        self.lock = threading.Lock()
+        self.deleted_keys: Dict[str, int] = {}
+        self.deleted_prefixes: Dict[str, int] = {}
+        # Bumped by every delete so a disk read that raced with one is not promoted
+        self.generation = 0
+        
+        # Pending disk operations, applied in order by the writer thread
+        self.pending: "queue.Queue[Optional[Callable[[], Any]]]" = queue.Queue()
+        self.writer = threading.Thread(
+            target=self._run_writer,
+            name=f"cache-writer-{self.namespace}",
+            daemon=True
+        )
+        self.writer.start()
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None or self._deleted(key):
+            return value
+        return self._load(key)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None or self._deleted(key):
+            return value
+        # Only the disk lookup of a memory miss leaves the event loop
+        return await asyncio.get_running_loop().run_in_executor(_io_executor(), self._load, key)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        # Serialize once so later mutations of value cannot leak into the disk write
+        ttl = self._ttl(ttl)
+        payload = self._serialize(value)
+        self.memory.set_serialized(key, payload, ttl=ttl)
+        self.pending.put(lambda: self.persistent.set_serialized(key, payload, ttl=ttl))
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        # Each worker has its own memory tier, so its leases stay in memory too
+        return self.memory.add(key, value, ttl)
+
+    def delete(self, key: str):
+        self._delete(self.deleted_keys, key, self.memory.delete, self.persistent.delete)
+
+    def delete_prefix(self, prefix: str) -> int:
+        return self._delete(self.deleted_prefixes, prefix, self.memory.delete_prefix, self.persistent.delete_prefix)
+
+    def clear(self):
+        self._delete(self.deleted_prefixes, "", lambda _: self.memory.clear(), self.persistent.delete_prefix)
+
+    def size(self) -> int:
+        return self.memory.size()
+
+    def usage_by_prefix(self) -> Dict[str, Dict[str, int]]:
+        return self.memory.usage_by_prefix()
+
+    def set_listener(self, listener: Callable[[str, str], None]):
+        # Only the memory tier's removals matter to callers; the disk tier
+        # purges entries that were already dropped from memory
+        super().set_listener(listener)
+        self.memory.set_listener(listener)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "namespace": self.namespace,
+            "size": self.size(),
+            "default_ttl": self.default_ttl,
+            "memory": self.memory.stats(),
+            "persistent": self.persistent.stats(),
+            "pending_writes": self.pending.qsize()
+        }
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until pending writes have reached disk"""
+        done = threading.Event()
+        self.pending.put(done.set)
+        done.wait(timeout)
+
+    def close(self):
+        """Flush pending writes and stop the writer thread"""
+        self.pending.put(None)
+        self.writer.join(timeout=5.0)
+        self.persistent.close()
+
+    def _run_writer(self):
+        """Apply queued disk writes and periodically purge expired entries"""
+        next_gc = time.monotonic() + self.gc_interval
+        while True:
+            try:
+                operation = self.pending.get(timeout=max(0.0, next_gc - time.monotonic()))
+            except queue.Empty:
+                operation = self._collect_garbage
+                next_gc = time.monotonic() + self.gc_interval
+            
+            if operation is None:
+                break
+            
+            try:
+                operation()
+            except Exception as e:
+                logger.error(f"Persistent cache operation failed for {self.namespace}: {e}")
+
+    def _load(self, key: str) -> Optional[Any]:
+        """Read a key from disk and promote it to memory for the rest of its lifetime"""
+        generation = self.generation
+        entry = self.persistent.get_entry(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        with self.lock:
+            # A delete issued while the row was being read wins
+            if generation != self.generation:
+                return None
+            self.memory.set(key, value, ttl=expires_at - time.time())
+        return value
+
+    def _deleted(self, key: str) -> bool:
+        """Whether a queued disk delete covers key"""
+        with self.lock:
+            return key in self.deleted_keys or any(key.startswith(prefix) for prefix in self.deleted_prefixes)
+
+    def _delete(self, tombstones: Dict[str, int], target: str, memory_delete: Callable, disk_delete: Callable) -> Any:
+        """Delete from memory now and tombstone target until the writer has deleted it on disk"""
+        with self.lock:
+            self.generation += 1
+            tombstones[target] = tombstones.get(target, 0) + 1
+            removed = memory_delete(target)
+
+        def apply():
+            try:
+                disk_delete(target)
+            finally:
+                with self.lock:
+                    tombstones[target] -= 1
+                    if not tombstones[target]:
+                        del tombstones[target]
+
+        self.pending.put(apply)
+        return removed
+
+    def _collect_garbage(self):
+        removed = self.persistent.purge_expired()
+        if removed:
+            logger.info(f"Purged {removed} expired entries from persistent {self.namespace} cache")
+
+
+# Backends with background writers, closed on shutdown
+_tiered_backends: List[TieredCacheBackend] = []
+
+# Threads for blocking backend I/O of async callers (created on first use)
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _io_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(settings.CACHE_IO_THREADS, 1),
+                    thread_name_prefix="cache-io"
+                )
+    return _executor
+
+
+def create_cache_backend(namespace: str, default_ttl: int = 300, max_bytes: Optional[int] = None) -> CacheBackend:
+    """Create the cache backend selected by settings.CACHE_BACKEND
+    
+    max_bytes bounds the in-process tier (settings.CACHE_MAX_BYTES by default).
+    """
+    backend = settings.CACHE_BACKEND.lower()
+
+    try:
+        if backend == "redis":
+            return RedisCacheBackend(namespace, default_ttl)
+        if backend == "sqlite":
+            return SQLiteCacheBackend(namespace, default_ttl)
+    except Exception as e:
+        logger.error(f"Could not create {backend} cache backend, falling back to memory: {e}")
+
+    if backend not in ("memory", "redis", "sqlite"):
+        logger.warning(f"Unknown CACHE_BACKEND '{settings.CACHE_BACKEND}', using memory")
+
+    memory = MemoryCacheBackend(namespace, default_ttl, max_bytes=max_bytes)
+    
+    # Optional persistent tier so restarts start with a warm cache
+    if settings.CACHE_PERSISTENT_PATH:
+        try:
+            persistent = SQLiteCacheBackend(namespace, default_ttl, path=settings.CACHE_PERSISTENT_PATH)
+            tiered = TieredCacheBackend(memory, persistent, gc_interval=settings.CACHE_PERSISTENT_GC_INTERVAL)
+            _tiered_backends.append(tiered)
+            return tiered
+        except Exception as e:
+            logger.error(f"Could not open persistent cache tier, using memory only: {e}")
+
+    return memory
+
+
+def close_cache_backends():
+    """Flush and close persistent cache tiers and stop the cache I/O threads"""
+    global _executor
+    while _tiered_backends:
+        _tiered_backends.pop().close()
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
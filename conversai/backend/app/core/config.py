@@ -20,12 +20,20 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite:///./conversai.db"
+    # Log every SQL statement (slow; for debugging queries only)
+    DB_ECHO: bool = False
     
     # Security
     JWT_SECRET_KEY: str = "your-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     ENCRYPTION_KEY: str = "your-encryption-key-here-32chars"
+    # User for requests without a Bearer token (single-user/demo deployments)
+    DEFAULT_USER_ID: str = "demo-user"
+    # Comma-separated user IDs ("sub" of their Bearer token) allowed to call /api/admin (empty = nobody)
+    ADMIN_USER_IDS: str = ""
+    # How long decrypted custom API keys stay in memory
+    CREDENTIAL_CACHE_TTL_SECONDS: int = 300
     
     # LLM Configuration (Groq Free Tier)
     GROQ_API_KEY: str = ""
@@ -44,11 +52,127 @@ class Settings(BaseSettings):
     MAX_REQUESTS_PER_MINUTE: int = 60
     MAX_REQUESTS_PER_DAY: int = 1000
     
+    # Cache backend: "memory" (per worker), "redis" or "sqlite" (shared by all workers)
+    CACHE_BACKEND: str = "memory"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_SQLITE_PATH: str = "./conversai_cache.db"
+    # Threads running Redis/SQLite cache I/O for async callers (keeps it off the event loop)
+    CACHE_IO_THREADS: int = 4
+    
+    # Memory budget of the in-process response cache (approximate serialized bytes)
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Entries larger than this fraction of the budget are not cached in memory
+    CACHE_MAX_ENTRY_FRACTION: float = 0.05
+    
+    # Optional persistent tier behind the memory backend (empty = disabled)
+    CACHE_PERSISTENT_PATH: str = ""
+    CACHE_PERSISTENT_GC_INTERVAL: int = 300
+    
     # Cache TTL (seconds)
     CACHE_TTL_WEATHER: int = 600
     CACHE_TTL_CRYPTO: int = 60
     CACHE_TTL_NEWS: int = 1800
     CACHE_TTL_DEFAULT: int = 300
+    CACHE_TTL_ERROR_EXPLANATION: int = 86400
+    # Not-found and empty results (per API override: response_config.negative_ttl, 0 disables)
+    CACHE_TTL_NEGATIVE: int = 120
+    
+    # Largest upstream response body read (per API override: response_config.max_response_bytes)
+    MAX_RESPONSE_BYTES: int = 2 * 1024 * 1024
+    
+    # Shared upstream connection pool and DNS cache
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    DNS_CACHE_TTL_SECONDS: int = 300
+    
+    # Warmup after startup: resolve API hosts, pre-open connections to the most used ones;
+    # GET /health/ready answers 503 until it finishes (or times out)
+    WARMUP_ENABLED: bool = True
+    WARMUP_CONNECT_HOSTS: int = 4
+    WARMUP_TIMEOUT_SECONDS: float = 5.0
+    # Also list the LLM's models once to open its connection (no tokens used)
+    WARMUP_LLM_PROBE: bool = False
+    
+    # Payload projection (keep only the fields formatting uses before caching)
+    PROJECTION_ENABLED: bool = True
+    PROJECTION_ARRAY_LIMIT: int = 10
+    
+    # Hot key prefetching (refresh popular cache entries before they expire)
+    PREFETCH_ENABLED: bool = True
+    PREFETCH_INTERVAL_SECONDS: int = 5
+    PREFETCH_LEAD_SECONDS: int = 15
+    PREFETCH_MAX_KEYS: int = 50
+    PREFETCH_TRACKED_KEYS: int = 5000
+    PREFETCH_MIN_SCORE: float = 3.0
+    PREFETCH_SCORE_DECAY: float = 0.98
+    # Upstream calls per minute per worker (keys and API rate limit shares are leased across workers)
+    PREFETCH_BUDGET_PER_MINUTE: int = 60
+    PREFETCH_RATE_LIMIT_SHARE: float = 0.5
+    
+    # API routing: hashed n-gram vector index over name, description, keywords and category
+    ROUTING_INDEX_DIMENSIONS: int = 1024
+    ROUTING_TOP_K: int = 20
+    # Minimum cosine similarity to route without keyword hits or a category match
+    ROUTING_MIN_SIMILARITY: float = 0.3
+    # Seconds between checks for registry writes made by other workers
+    ROUTING_INDEX_SYNC_SECONDS: float = 5.0
+    # Per-user index shards are loaded on first use and dropped when idle
+    ROUTING_SHARD_IDLE_SECONDS: int = 900
+    ROUTING_MAX_SHARDS: int = 1000
+    
+    # Rows per INSERT batch when bulk importing APIs (one transaction per import)
+    IMPORT_BATCH_SIZE: int = 100
+    
+    # Seconds a registry listing snapshot is served before re-checking the database
+    # for writes made by other workers (local writes invalidate it immediately)
+    REGISTRY_SNAPSHOT_REVALIDATE_SECONDS: float = 5.0
+    
+    # Intent prompt context: rolling session summary plus the last few messages
+    CONTEXT_TOKEN_BUDGET: int = 300
+    CONTEXT_RECENT_MESSAGES: int = 2
+    CONTEXT_MESSAGE_MAX_CHARS: int = 240
+    CONTEXT_SUMMARY_TURNS: int = 5
+    CONTEXT_SUMMARY_TTL: int = 86400
+    
+    # Admission control for chat turns: at most CHAT_MAX_CONCURRENT run at once, up to
+    # CHAT_QUEUE_SIZE wait (each at most CHAT_QUEUE_TIMEOUT_SECONDS); the rest get a 503
+    CHAT_ADMISSION_ENABLED: bool = True
+    CHAT_MAX_CONCURRENT: int = 32
+    CHAT_QUEUE_SIZE: int = 64
+    CHAT_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    
+    # Priority lanes: interactive chat, batch chat (X-Priority: batch, prefetching) and
+    # admin traffic (API tests, error explanation warming). In chat admission and in the
+    # LLM and upstream call limits, each class keeps a reserved fraction of the capacity
+    # and shares the rest by weight
+    PRIORITY_INTERACTIVE_RESERVED: float = 0.5
+    PRIORITY_BATCH_RESERVED: float = 0.1
+    PRIORITY_ADMIN_RESERVED: float = 0.1
+    PRIORITY_INTERACTIVE_WEIGHT: int = 6
+    PRIORITY_BATCH_WEIGHT: int = 3
+    PRIORITY_ADMIN_WEIGHT: int = 1
+    LLM_MAX_CONCURRENT: int = 8
+    UPSTREAM_MAX_CONCURRENT: int = 64
+    
+    # Micro-batching of intent classification: while an intent call is in flight, queries
+    # gathered for up to INTENT_BATCH_WINDOW_MS (at most INTENT_BATCH_MAX_SIZE) share one LLM call
+    INTENT_BATCH_ENABLED: bool = False
+    INTENT_BATCH_WINDOW_MS: int = 20
+    INTENT_BATCH_MAX_SIZE: int = 8
+    
+    # Chat WebSocket (/api/chat/ws): messages a connection may queue while one is processed
+    WS_MAX_PENDING_MESSAGES: int = 16
+    
+    # Retention of old conversations (archived to gzip JSONL, then deleted)
+    RETENTION_ENABLED: bool = False
+    RETENTION_DAYS: int = 30
+    RETENTION_COMPACT_AFTER_DAYS: int = 7
+    RETENTION_ARCHIVE_DIR: str = "./archive"
+    RETENTION_BATCH_SIZE: int = 200
+    RETENTION_INTERVAL_SECONDS: int = 3600
+    # Also return freed SQLite pages to the filesystem after deleting
+    RETENTION_VACUUM: bool = False
     
     # CORS
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5173"
@@ -56,6 +180,9 @@ class Settings(BaseSettings):
     # Logging
     LOG_LEVEL: str = "INFO"
     
+    # Boot time budget per worker (imports plus startup phases); exceeding it logs a warning
+    STARTUP_BUDGET_MS: int = 2000
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -65,6 +192,11 @@ class Settings(BaseSettings):
     def cors_origins_list(self) -> list[str]:
         """Convert CORS_ORIGINS string to list"""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
+    
+    @property
+    def admin_user_ids_list(self) -> list[str]:
+        """Convert ADMIN_USER_IDS string to list"""
+        return [user_id.strip() for user_id in self.ADMIN_USER_IDS.split(",") if user_id.strip()]
 
 
 # Global settings instance
@@ -1,9 +1,10 @@
 """
 Database connection and session management
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import settings
+from app.core import serialization
 from app.models.database import Base
 from typing import Generator
 
@@ -12,7 +13,10 @@ from typing import Generator
 engine = create_engine(
     settings.DATABASE_URL,
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    echo=settings.DEBUG
+    echo=settings.DB_ECHO,
+    # JSON columns (message metadata, API configs) use the shared codec
+    json_serializer=serialization.dumps_str,
+    json_deserializer=serialization.loads
 )
 
 # Create session factory
@@ -22,9 +26,39 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 def init_db():
     """Initialize database - create all tables"""
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    add_missing_indexes()
     print("✅ Database initialized successfully")
 
 
+def add_missing_columns():
+    """Add nullable columns introduced after a table was first created
+    
+    create_all() only creates missing tables, so databases created by older
+    versions would otherwise fail on queries that select the new columns.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                print(f"✅ Added column {table.name}.{column.name}")
+
+
+def add_missing_indexes():
+    """Create indexes introduced after a table was first created"""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
 def get_db() -> Generator[Session, None, None]:
     """Dependency to get database session"""
     db = SessionLocal()
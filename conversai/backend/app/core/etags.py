@@ -0,0 +1,26 @@
+"""
+ETag helpers for conditional GETs
+"""
+from typing import Optional
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches etag
+
+    The header may list several tags separated by commas, or be "*".
+    Comparison is weak (RFC 9110): a W/ prefix on either side is ignored.
+    """
+    if not if_none_match:
+        return False
+
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == opaque:
+            return True
+    return False
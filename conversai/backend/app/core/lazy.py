@@ -0,0 +1,65 @@
+"""
+Lazy singletons - Services built on first use instead of at import time
+"""
+from typing import Callable, Dict, Generic, TypeVar
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Construction time of each lazy singleton built so far, in milliseconds
+# Format: {name: ms}
+initialization_times: Dict[str, float] = {}
+
+
+class Lazy(Generic[T]):
+    """Proxy that constructs its service on first attribute access
+
+    Module-level singletons (the LLM client, the request handler, the
+    response formatter, ...) are declared as Lazy(Factory, "name"), so
+    importing their module is cheap and the cost of the constructor (SDK
+    imports, cache connections, key derivation) is paid by the first
+    request that needs it. Attribute reads and writes are forwarded.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str):
+        object.__setattr__(self, "_lazy_factory", factory)
+        object.__setattr__(self, "_lazy_name", name)
+        object.__setattr__(self, "_lazy_instance", None)
+        object.__setattr__(self, "_lazy_lock", threading.Lock())
+
+    def __getattr__(self, attr: str):
+        return getattr(resolve(self), attr)
+
+    def __setattr__(self, attr: str, value):
+        setattr(resolve(self), attr, value)
+
+    def __repr__(self) -> str:
+        state = "initialized" if is_initialized(self) else "pending"
+        return f"<Lazy {self._lazy_name} ({state})>"
+
+
+def resolve(proxy: Lazy[T]) -> T:
+    """Return the proxied service, constructing it if needed"""
+    instance = proxy._lazy_instance
+    if instance is not None:
+        return instance
+
+    with proxy._lazy_lock:
+        instance = proxy._lazy_instance
+        if instance is None:
+            started = time.perf_counter()
+            instance = proxy._lazy_factory()
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            initialization_times[proxy._lazy_name] = elapsed_ms
+            logger.info(f"Initialized {proxy._lazy_name} in {elapsed_ms} ms")
+            object.__setattr__(proxy, "_lazy_instance", instance)
+    return instance
+
+
+def is_initialized(proxy: Lazy) -> bool:
+    """Whether the service behind proxy has been constructed"""
+    return proxy._lazy_instance is not None
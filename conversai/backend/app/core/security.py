@@ -3,10 +3,12 @@ Security utilities for authentication and encryption
 """
 from datetime import datetime, timedelta
 from typing import Optional
+from fastapi import Header, HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from cryptography.fernet import Fernet
 from app.core.config import settings
+from app.core.lazy import Lazy
 import base64
 import hashlib
 
@@ -47,6 +49,47 @@ def decode_access_token(token: str) -> Optional[dict]:
         return None
 
 
+def get_current_user_id(authorization: Optional[str] = Header(None)) -> str:
+    """
+    Dependency resolving the caller's user ID from a Bearer token ("sub"
+    claim). Requests without a token act as DEFAULT_USER_ID.
+    """
+    if not authorization:
+        return settings.DEFAULT_USER_ID
+    
+    scheme, _, token = authorization.partition(" ")
+    payload = decode_access_token(token) if scheme.lower() == "bearer" else None
+    if not payload or not payload.get("sub"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return payload["sub"]
+
+
+def require_admin(authorization: Optional[str] = Header(None)) -> str:
+    """
+    Dependency for the admin endpoints: a Bearer token whose user is listed
+    in ADMIN_USER_IDS (requests without a token are rejected, not treated
+    as DEFAULT_USER_ID)
+    """
+    if not authorization:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    
+    user_id = get_current_user_id(authorization)
+    if user_id not in settings.admin_user_ids_list:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return user_id
+
+
 class EncryptionService:
     """Service for encrypting/decrypting sensitive data like API keys"""
     
@@ -74,5 +117,5 @@ class EncryptionService:
         return decrypted.decode()
 
 
-# Global encryption service instance
-encryption_service = EncryptionService()
+# Global encryption service instance (constructed on first use)
+encryption_service: EncryptionService = Lazy(EncryptionService, "encryption_service")
@@ -0,0 +1,85 @@
+"""
+JSON serialization - orjson when installed, the standard library otherwise
+
+Both codecs produce compact output (no whitespace, UTF-8, not ASCII-escaped)
+and the fallback writes datetimes and enums the way orjson does. The bytes
+are still not guaranteed to be identical: float exponents differ ("1e-07"
+vs "1e-7"), for example. Don't derive keys or hashes that other workers
+must reproduce from dumps(); request cache keys use the standard library.
+"""
+from typing import Any, Callable, Optional, Union
+from datetime import date, datetime, time
+from enum import Enum
+import functools
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional dependency, several times faster than json
+    orjson = None
+
+
+def _default(value: Any) -> str:
+    """Fallback for types JSON can't represent (datetimes, Decimals, ...)"""
+    return str(value)
+
+
+def _orjson_native(value: Any, default: Optional[Callable[[Any], Any]]) -> Any:
+    """Standard library fallback for the types orjson serializes natively"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if default is None:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return default(value)
+
+
+def dumps(
+    value: Any,
+    sort_keys: bool = False,
+    indent: bool = False,
+    default: Optional[Callable[[Any], Any]] = _default
+) -> bytes:
+    """Serialize value to UTF-8 JSON bytes (indent=True for 2-space indentation)"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(value, default=default, option=option)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits, which the stdlib handles
+            pass
+
+    return json.dumps(
+        value,
+        sort_keys=sort_keys,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+        ensure_ascii=False,
+        default=functools.partial(_orjson_native, default=default)
+    ).encode()
+
+
+def dumps_str(
+    value: Any,
+    sort_keys: bool = False,
+    indent: bool = False,
+    default: Optional[Callable[[Any], Any]] = _default
+) -> str:
+    """Serialize value to a JSON string"""
+    return dumps(value, sort_keys=sort_keys, indent=indent, default=default).decode()
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Deserialize JSON bytes or text"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Raised by loads() on invalid input (orjson's error subclasses it)
+JSONDecodeError = json.JSONDecodeError
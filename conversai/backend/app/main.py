@@ -1,11 +1,26 @@
 """
 Main FastAPI application for ConversAI
 """
+import time
+
+# Taken before the other imports so the startup profile includes them
+IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from app.core.config import settings
-from app.core.database import init_db
-from app.api import chat, api_management
+from app.core import serialization
+from app.core.database import init_db, SessionLocal
+from app.core.cache import close_cache_backends
+from app.core.lazy import is_initialized
+from app.core.startup import startup_profile
+from app.api import chat, api_management, admin
+from app.services.api_handler import request_handler
+from app.services.api_mapper import APIMapper
+from app.services.retention import retention_service
+from app.services.http_client import shared_http_client
+from app.services.warmup import warmup_service
 import logging
 
 # Configure logging
@@ -22,7 +37,9 @@ app = FastAPI(
     description="Natural Language Chatbot for Seamless API Interaction",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    # orjson renders responses several times faster when it is installed
+    default_response_class=ORJSONResponse if serialization.orjson else JSONResponse
 )
 
 # Configure CORS
@@ -32,19 +49,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 
 # Include routers
 app.include_router(chat.router, prefix="/api")
 app.include_router(api_management.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
+
+startup_profile.record("imports", time.perf_counter() - IMPORT_STARTED)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and load system APIs on startup"""
     logger.info("Starting ConversAI...")
-    init_db()
+    with startup_profile.phase("database"):
+        init_db()
+    with startup_profile.phase("system_apis"):
+        db = SessionLocal()
+        try:
+            APIMapper(db)
+        finally:
+            db.close()
+    if settings.PREFETCH_ENABLED:
+        # Builds the request handler (and its response cache) ahead of the first request
+        with startup_profile.phase("prefetcher"):
+            request_handler.prefetcher.start()
+    if settings.RETENTION_ENABLED:
+        with startup_profile.phase("retention"):
+            retention_service.start()
+    if settings.WARMUP_ENABLED:
+        # Runs in the background; /health/ready reports 503 until it finishes
+        warmup_service.start()
+    startup_profile.finish()
     logger.info("✅ ConversAI is ready!")
 
 
@@ -52,6 +91,12 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down ConversAI...")
+    if is_initialized(request_handler):
+        await request_handler.prefetcher.stop()
+    await retention_service.stop()
+    await warmup_service.stop()
+    await shared_http_client.close()
+    close_cache_backends()
 
 
 @app.get("/")
@@ -74,6 +119,15 @@ async def health_check():
     }
 
 
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness for load balancers: 503 until startup warmup has finished"""
+    status = warmup_service.get_status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **status})
+    return {"status": "ready", **status}
+
+
 @app.get("/api/info")
 async def api_info():
     """API information"""
@@ -1,7 +1,7 @@
 """
 Database models for ConversAI
 """
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, JSON, ForeignKey, Float
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, JSON, ForeignKey, Float, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -36,6 +36,10 @@ class User(Base):
 class APIRegistry(Base):
     """API Registry model for storing custom and pre-configured APIs"""
     __tablename__ = "api_registry"
+    __table_args__ = (
+        # Per-user registry scoping (routing shards, listings)
+        Index("ix_api_registry_user_active", "user_id", "is_active"),
+    )
     
     api_id = Column(String, primary_key=True, default=generate_uuid)
     user_id = Column(String, ForeignKey("users.user_id"), nullable=True)
@@ -51,6 +55,7 @@ class APIRegistry(Base):
     response_template = Column(Text, nullable=True)
     rate_limit = Column(JSON, nullable=True)
     error_messages = Column(JSON, nullable=True)
+    response_config = Column(JSON, nullable=True)  # Response handling options, e.g. negative_ttl
     is_active = Column(Boolean, default=True)
     is_system = Column(Boolean, default=False)  # System pre-configured APIs
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -79,6 +84,10 @@ class Conversation(Base):
 class Message(Base):
     """Message model"""
     __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset pagination of a session's history: (created_at, message_id) within a session
+        Index("ix_messages_session_created", "session_id", "created_at", "message_id"),
+    )
     
     message_id = Column(String, primary_key=True, default=generate_uuid)
     session_id = Column(String, ForeignKey("conversations.session_id"), nullable=False)
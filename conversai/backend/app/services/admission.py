@@ -0,0 +1,95 @@
+"""
+Admission Control - Bounded concurrency and load shedding for chat turns
+"""
+from typing import Dict, Any, Optional
+from contextlib import asynccontextmanager
+from app.core.config import settings
+from app.services.scheduler import PriorityScheduler, current_priority
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Priority classes a chat client may ask for (admin is for API tests and maintenance)
+CHAT_PRIORITIES = ("interactive", "batch")
+
+
+class AdmissionRejected(Exception):
+    """A chat turn was shed: the wait queue is full or its queue deadline passed"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason}), retry in {retry_after} s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController(PriorityScheduler):
+    """Global limit on chat turns in progress, with a bounded wait queue
+
+    At most CHAT_MAX_CONCURRENT turns run at once (each holds a DB session,
+    an LLM call and an upstream call), split between the priority classes
+    like the other lanes. Up to CHAT_QUEUE_SIZE more wait for a slot, each
+    for at most CHAT_QUEUE_TIMEOUT_SECONDS; anything beyond that is rejected
+    at once. Under overload the admitted turns keep their normal latency
+    and the excess fails fast with a Retry-After, instead of every request
+    slowing down until it times out.
+    """
+
+    def __init__(self):
+        super().__init__("chat", "CHAT_MAX_CONCURRENT", classes=CHAT_PRIORITIES)
+        self.shed: Dict[str, Dict[str, int]] = {
+            priority: {"queue_full": 0, "queue_timeout": 0} for priority in CHAT_PRIORITIES
+        }
+        # Moving average of turn duration, for the Retry-After estimate
+        self.service_seconds: Optional[float] = None
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the duration of the block (raises AdmissionRejected)"""
+        priority = current_priority.get()
+        if not settings.CHAT_ADMISSION_ENABLED:
+            yield
+            return
+
+        immediate = not self._has_waiters(priority) and self._can_grant(priority)
+        if not immediate and self.queue_depth() >= settings.CHAT_QUEUE_SIZE:
+            self.shed[priority]["queue_full"] += 1
+            raise AdmissionRejected("queue_full", self.retry_after())
+
+        await self.acquire(priority, timeout=settings.CHAT_QUEUE_TIMEOUT_SECONDS)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.service_seconds = elapsed if self.service_seconds is None else 0.9 * self.service_seconds + 0.1 * elapsed
+            self.release(priority)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog has likely drained"""
+        backlog = (self.queue_depth() + 1) / self.capacity
+        return min(max(1, math.ceil(backlog * (self.service_seconds or 1.0))), 60)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        for priority in CHAT_PRIORITIES:
+            stats["classes"][priority]["shed"] = dict(self.shed[priority])
+        return {
+            "enabled": settings.CHAT_ADMISSION_ENABLED,
+            "queue_size": settings.CHAT_QUEUE_SIZE,
+            "queue_timeout_seconds": settings.CHAT_QUEUE_TIMEOUT_SECONDS,
+            **stats,
+            "shed_total": sum(sum(counts.values()) for counts in self.shed.values()),
+            "avg_turn_ms": round(self.service_seconds * 1000, 1) if self.service_seconds is not None else None,
+            "retry_after_seconds": self.retry_after()
+        }
+
+    def _timeout_error(self, priority: str) -> Exception:
+        self.shed[priority]["queue_timeout"] += 1
+        return AdmissionRejected("queue_timeout", self.retry_after())
+
+
+# Global admission controller instance (chat turns)
+admission_controller = AdmissionController()
@@ -3,11 +3,23 @@ API Request Handler - Sends requests to external APIs with caching and error han
 """
 import httpx
 from typing import Dict, Any, Optional
-from cachetools import TTLCache
 import hashlib
 import json
 import logging
+from app.core.cache import create_cache_backend
 from app.core.config import settings
+from app.core import serialization
+from app.core.lazy import Lazy
+from app.services.cache_stats import CacheStatsCollector
+from app.services.payload_projector import PayloadProjection, RESULT_LIST_FIELDS
+from app.services.http_client import shared_http_client
+from app.services.prefetcher import HotKeyPrefetcher
+from app.services.scheduler import upstream_scheduler
+
+try:
+    import ijson
+except ImportError:  # Optional dependency for incremental JSON parsing
+    ijson = None
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +28,13 @@ class APIRequestHandler:
     """Handle API requests with retry logic, caching, and error handling"""
     
     def __init__(self):
-        # In-memory cache (alternative to Redis for simplicity)
-        # Format: {cache_key: response_data}
-        self.cache = TTLCache(maxsize=1000, ttl=300)  # 1000 items, 5 min default TTL
+        # Response cache (in-process, Redis or SQLite depending on CACHE_BACKEND)
+        # Format: {"api_id:request_hash": response_data}
+        self.cache = create_cache_backend("response", default_ttl=settings.CACHE_TTL_DEFAULT)
+        
+        # Hit/miss/eviction counters for the admin API
+        self.stats = CacheStatsCollector()
+        self.cache.set_listener(self.stats.record_removal)
         
         # Cache TTL by category
         self.cache_ttls = {
@@ -27,12 +43,20 @@ class APIRequestHandler:
             "news": settings.CACHE_TTL_NEWS,
             "default": settings.CACHE_TTL_DEFAULT
         }
+        
+        # Keeps the hottest keys warm by refreshing them shortly before expiry
+        self.prefetcher = HotKeyPrefetcher(self)
     
     async def send_request(
         self, 
         request_config: Dict[str, Any],
         category: str = "default",
-        use_cache: bool = True
+        use_cache: bool = True,
+        api_id: Optional[str] = None,
+        rate_limit: Optional[Dict[str, Any]] = None,
+        response_config: Optional[Dict[str, Any]] = None,
+        projection: Optional[PayloadProjection] = None,
+        keep_raw: bool = False
     ) -> Dict[str, Any]:
         """
         Send an HTTP request to an API
@@ -41,37 +65,39 @@ class APIRequestHandler:
             request_config: Request configuration (url, method, headers, params)
             category: API category for cache TTL
             use_cache: Whether to use caching
+            api_id: ID of the API being called (used by the prefetcher)
+            rate_limit: The API's rate_limit config (used by the prefetcher)
+            response_config: The API's response_config (e.g. negative_ttl)
+            projection: Fields to keep from the payload before caching/returning it
+            keep_raw: Return the raw upstream payload (skips projection)
         
         Returns:
             API response data or error dict
         """
         # Generate cache key
-        cache_key = self._generate_cache_key(request_config)
+        cache_key = self._generate_cache_key(request_config, api_id)
         
-        # Check cache
-        if use_cache and cache_key in self.cache:
-            logger.info(f"Cache hit for: {cache_key[:20]}...")
-            cached_data = self.cache[cache_key]
-            cached_data["_cached"] = True
-            return cached_data
+        if use_cache:
+            # Count the request so hot keys can be refreshed before they expire
+            self.prefetcher.record(cache_key, request_config, category, api_id, rate_limit, response_config, projection)
+            
+            # Check cache
+            cached_data = await self.cache.aget(cache_key)
+            stats_key = api_id or "adhoc"
+            label = f"{request_config.get('method', 'GET')} {request_config.get('url', '')}"
+            if cached_data is not None:
+                logger.info(f"Cache hit for: {cache_key[:40]}...")
+                self.stats.record_hit(cache_key, stats_key, category, label)
+                cached_data["_cached"] = True
+                return cached_data
+            self.stats.record_miss(cache_key, stats_key, category, label)
         
         # Send request
         try:
-            response_data = await self._make_request(request_config)
-            
-            # Wrap list responses in a dictionary for consistency
-            if isinstance(response_data, list):
-                response_data = {"data": response_data, "_cached": False}
-            else:
-                response_data["_cached"] = False
-            
-            # Cache successful response
-            if use_cache and "error" not in response_data:
-                ttl = self.cache_ttls.get(category, self.cache_ttls["default"])
-                # Create a new cache with specific TTL for this entry
-                self.cache[cache_key] = response_data
-            
-            return response_data
+            return await self._fetch(
+                cache_key, request_config, category, use_cache, response_config,
+                projection=None if keep_raw else projection
+            )
             
         except Exception as e:
             logger.error(f"API request error: {e}", exc_info=True)
@@ -81,69 +107,219 @@ class APIRequestHandler:
                 "_cached": False
             }
     
-    async def _make_request(self, config: Dict[str, Any]) -> Dict[str, Any]:
-        """Make the actual HTTP request"""
+    async def refresh(
+        self,
+        cache_key: str,
+        request_config: Dict[str, Any],
+        category: str = "default",
+        response_config: Optional[Dict[str, Any]] = None,
+        projection: Optional[PayloadProjection] = None
+    ) -> bool:
+        """Re-fetch a cached request ahead of expiry. Returns True if the cache was updated."""
+        response_data = await self._fetch(cache_key, request_config, category, True, response_config, projection)
+        return "error" not in response_data
+    
+    async def _fetch(
+        self,
+        cache_key: str,
+        request_config: Dict[str, Any],
+        category: str,
+        use_cache: bool,
+        response_config: Optional[Dict[str, Any]] = None,
+        projection: Optional[PayloadProjection] = None
+    ) -> Dict[str, Any]:
+        """Call the upstream API and cache successful (projected) and negative responses"""
+        max_bytes = (response_config or {}).get("max_response_bytes")
+        async with upstream_scheduler.slot():
+            response_data = await self._make_request(request_config, projection, max_bytes)
+        
+        # Wrap list responses in a dictionary for consistency
+        if isinstance(response_data, list):
+            response_data = {"data": response_data, "_cached": False}
+        else:
+            response_data["_cached"] = False
+        
+        if not use_cache:
+            if projection and "error" not in response_data:
+                response_data = projection.apply(response_data)
+            return response_data
+        
+        # Cache not-found and empty results briefly so typos don't re-hit upstream
+        if self._is_negative_result(response_data):
+            negative_ttl = self._negative_ttl(response_config)
+            if negative_ttl > 0:
+                response_data["_negative_cached"] = True
+                await self.cache.aset(cache_key, response_data, ttl=negative_ttl)
+                logger.info(f"Negative result cached for {negative_ttl}s: {cache_key[:20]}...")
+            return response_data
+        
+        # Cache successful response, reduced to the fields formatting needs
+        if "error" not in response_data:
+            if projection:
+                response_data = projection.apply(response_data)
+            ttl = self.cache_ttls.get(category, self.cache_ttls["default"])
+            await self.cache.aset(cache_key, response_data, ttl=ttl)
+            self.prefetcher.record_store(cache_key, ttl)
+        
+        return response_data
+    
+    def _is_negative_result(self, response_data: Dict[str, Any]) -> bool:
+        """Check for a 404 or an empty result set"""
+        if response_data.get("status_code") == 404:
+            return True
+        if "error" in response_data:
+            return False
+        
+        # Empty result arrays (e.g. no fixtures on a date, facts API wrapped in "data")
+        for field in RESULT_LIST_FIELDS:
+            if field in response_data and isinstance(response_data[field], list) and len(response_data[field]) == 0:
+                return True
+        
+        # Zero count
+        result_set = response_data.get("resultSet")
+        if isinstance(result_set, dict) and "count" in result_set and result_set["count"] == 0:
+            return True
+        
+        return False
+    
+    def _negative_ttl(self, response_config: Optional[Dict[str, Any]]) -> int:
+        """Negative cache TTL for an API (response_config.negative_ttl overrides the default)"""
+        if response_config and response_config.get("negative_ttl") is not None:
+            return int(response_config["negative_ttl"])
+        return settings.CACHE_TTL_NEGATIVE
+    
+    async def _make_request(
+        self,
+        config: Dict[str, Any],
+        projection: Optional[PayloadProjection] = None,
+        max_bytes: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Make the actual HTTP request, streaming the body up to max_bytes"""
         url = config.get("url")
         method = config.get("method", "GET").upper()
         headers = config.get("headers", {})
         params = config.get("params", {})
         data = config.get("data", {})
+        max_bytes = max_bytes or settings.MAX_RESPONSE_BYTES
         
-        # Set timeout
-        timeout = httpx.Timeout(10.0, connect=5.0)
+        if method not in ("GET", "POST", "PUT", "DELETE"):
+            return {"error": f"Unsupported HTTP method: {method}"}
         
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            try:
-                if method == "GET":
-                    response = await client.get(url, headers=headers, params=params)
-                elif method == "POST":
-                    response = await client.post(url, headers=headers, params=params, json=data)
-                elif method == "PUT":
-                    response = await client.put(url, headers=headers, params=params, json=data)
-                elif method == "DELETE":
-                    response = await client.delete(url, headers=headers, params=params)
-                else:
-                    return {"error": f"Unsupported HTTP method: {method}"}
+        request_kwargs = {"headers": headers, "params": params}
+        if method in ("POST", "PUT"):
+            request_kwargs["json"] = data
+        
+        # Pooled keep-alive connections shared by all requests (see http_client)
+        client = shared_http_client.get()
+        try:
+            async with client.stream(method, url, **request_kwargs) as response:
+                # Refuse oversized bodies up front when the server declares their length
+                declared_length = response.headers.get("content-length", "")
+                if declared_length.isdigit() and int(declared_length) > max_bytes:
+                    return self._too_large_error(url, int(declared_length), max_bytes)
                 
                 # Handle response
                 if response.status_code == 200:
-                    try:
-                        json_data = response.json()
-                        logger.info(f"API response received (status 200): {type(json_data)}")
-                        logger.debug(f"API response data: {json.dumps(json_data, indent=2, default=str)[:500]}")
-                        return json_data
-                    except json.JSONDecodeError:
-                        logger.warning(f"JSON decode error, returning text response")
-                        return {"data": response.text}
+                    return await self._read_json(response, projection, max_bytes)
                 else:
                     error_msg = self._get_error_message(response.status_code)
                     return {
                         "error": error_msg,
                         "status_code": response.status_code,
-                        "detail": response.text[:200]
+                        "detail": await self._read_prefix(response, 200)
                     }
-                    
-            except httpx.TimeoutException:
-                return {"error": "Request timed out", "status": "timeout"}
-            except httpx.ConnectError:
-                return {"error": "Could not connect to API", "status": "connection_error"}
-            except Exception as e:
-                return {"error": f"Request failed: {str(e)}", "status": "error"}
+                
+        except httpx.TimeoutException:
+            return {"error": "Request timed out", "status": "timeout"}
+        except httpx.ConnectError:
+            return {"error": "Could not connect to API", "status": "connection_error"}
+        except Exception as e:
+            return {"error": f"Request failed: {str(e)}", "status": "error"}
     
-    def _generate_cache_key(self, config: Dict[str, Any]) -> str:
-        """Generate a unique cache key for a request"""
-        # Create a string representation of the request
+    async def _read_json(
+        self,
+        response: httpx.Response,
+        projection: Optional[PayloadProjection],
+        max_bytes: int
+    ) -> Any:
+        """
+        Read a JSON body chunk by chunk, aborting past max_bytes
+        
+        With ijson installed and a projection given, the document is parsed
+        incrementally and only the kept subtrees are materialized.
+        """
+        body = bytearray()
+        builder = None
+        if projection and ijson is not None:
+            events = ijson.sendable_list()
+            parser = ijson.parse_coro(events, use_float=True)
+            builder = projection.streaming_builder()
+        
+        async for chunk in response.aiter_bytes():
+            if len(body) + len(chunk) > max_bytes:
+                return self._too_large_error(str(response.url), len(body) + len(chunk), max_bytes)
+            body.extend(chunk)
+            
+            if builder is not None:
+                try:
+                    parser.send(chunk)
+                    builder.feed(events)
+                    del events[:]
+                except ijson.JSONError:
+                    # Not valid JSON; handled by the full parse below
+                    builder = None
+        
+        logger.info(f"API response received (status 200): {len(body)} bytes")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"API response data: {bytes(body[:500]).decode(errors='replace')}")
+        
+        if builder is not None:
+            try:
+                parser.close()
+                builder.feed(events)
+                if builder.done and builder.matched():
+                    return builder.result
+            except ijson.JSONError:
+                pass
+        
+        try:
+            return serialization.loads(body)
+        except (serialization.JSONDecodeError, UnicodeDecodeError):
+            logger.warning(f"JSON decode error, returning text response")
+            return {"data": body.decode(response.encoding or "utf-8", errors="replace")}
+    
+    async def _read_prefix(self, response: httpx.Response, limit: int) -> str:
+        """Read at most limit bytes of a body (e.g. an error detail) and stop"""
+        prefix = bytearray()
+        async for chunk in response.aiter_bytes():
+            prefix.extend(chunk)
+            if len(prefix) >= limit:
+                break
+        return prefix[:limit].decode(response.encoding or "utf-8", errors="replace")
+    
+    def _too_large_error(self, url: str, size: int, max_bytes: int) -> Dict[str, Any]:
+        logger.warning(f"Aborted response from {url}: more than {max_bytes} bytes ({size}+)")
+        return {
+            "error": "The API response was too large to process.",
+            "status": "too_large",
+            "detail": f"Response exceeded {max_bytes} bytes"
+        }
+    
+    def _generate_cache_key(self, config: Dict[str, Any], api_id: Optional[str] = None) -> str:
+        """Generate a unique cache key for a request, prefixed with the API ID"""
+        # Create a string representation of the request (with the standard library,
+        # so the key doesn't depend on whether a worker has orjson)
         key_parts = [
             config.get("url", ""),
             config.get("method", "GET"),
-            json.dumps(config.get("params", {}), sort_keys=True),
-            json.dumps(config.get("data", {}), sort_keys=True)
+            json.dumps(config.get("params", {}), sort_keys=True, default=str),
+            json.dumps(config.get("data", {}), sort_keys=True, default=str)
         ]
         
         key_string = "|".join(key_parts)
         
-        # Hash it for shorter key
-        return hashlib.md5(key_string.encode()).hexdigest()
+        # Hash it for shorter key; the prefix allows per-API stats and invalidation
+        return f"{api_id or 'adhoc'}:{hashlib.md5(key_string.encode()).hexdigest()}"
     
     def _get_error_message(self, status_code: int) -> str:
         """Get user-friendly error message for HTTP status code"""
@@ -161,19 +337,35 @@ class APIRequestHandler:
         
         return error_messages.get(status_code, f"API returned status code: {status_code}")
     
-    def clear_cache(self):
+    async def clear_cache(self):
         """Clear all cached data"""
-        self.cache.clear()
+        await self.cache.aclear()
         logger.info("Cache cleared")
     
-    def get_cache_stats(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        return {
-            "size": len(self.cache),
-            "max_size": self.cache.maxsize,
-            "ttl": self.cache.ttl
-        }
+    async def invalidate(self, api_ids: Optional[list] = None, prefix: Optional[str] = None) -> int:
+        """
+        Remove cached responses for the given APIs and/or keys starting with prefix
+        
+        Returns:
+            Number of entries removed (from the local tier for tiered caches)
+        """
+        removed = 0
+        for api_id in api_ids or []:
+            removed += await self.cache.adelete_prefix(f"{api_id}:")
+        if prefix:
+            removed += await self.cache.adelete_prefix(prefix)
+        logger.info(f"Invalidated {removed} cache entries (api_ids={api_ids}, prefix={prefix})")
+        return removed
+    
+    async def get_cache_stats(self, top_n: int = 10) -> Dict[str, Any]:
+        """Get cache statistics: hit ratios, evictions, expirations, bytes held and hottest keys"""
+        usage = await self.cache.run(self.cache.usage_by_prefix)
+        stats = self.stats.snapshot(usage, top_n=top_n)
+        stats["backend"] = await self.cache.run(self.cache.stats)
+        stats["ttls"] = self.cache_ttls
+        stats["prefetcher"] = self.prefetcher.get_stats()
+        return stats
 
 
-# Global request handler instance
-request_handler = APIRequestHandler()
+# Global request handler instance (constructed on first use)
+request_handler: APIRequestHandler = Lazy(APIRequestHandler, "request_handler")
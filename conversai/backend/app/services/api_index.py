@@ -0,0 +1,314 @@
+"""
+API Index - Hashed n-gram vector index for routing queries to registered APIs
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.database import APIRegistry
+import numpy as np
+import logging
+import re
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+# Relative weight of each field in an API's vector
+FIELD_WEIGHTS = {
+    "intent_keywords": 2.0,
+    "category": 1.5,
+    "api_name": 1.0,
+    "description": 1.0,
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def text_features(text: str) -> List[str]:
+    """Word unigrams plus character trigrams of each word (so "forecasts" still matches "forecast")"""
+    features = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        features.append(f"w:{word}")
+        padded = f"<{word}>"
+        features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return features
+
+
+def embed(text: str, dimensions: int, weight: float = 1.0, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Signed feature hashing into a dimensions-long vector (not normalized)"""
+    vector = out if out is not None else np.zeros(dimensions, dtype=np.float32)
+    for feature in text_features(text):
+        # crc32 is stable across processes, unlike hash()
+        digest = zlib.crc32(feature.encode())
+        sign = 1.0 if digest & 0x80000000 else -1.0
+        vector[digest % dimensions] += sign * weight
+    return vector
+
+
+def keyword_score(api_keywords: List[str], match_text: str) -> int:
+    """Number of an API's keywords found in the text (the original routing score)"""
+    return sum(1 for keyword in api_keywords if keyword in match_text)
+
+
+class APIVectorIndex:
+    """Row-per-API matrix of normalized hashed n-gram vectors
+
+    Routing is one matrix-vector product for cosine similarity, a top-k
+    selection, then a re-rank of the candidates by keyword hits. Rows are
+    added, replaced and removed in place as the registry changes.
+    """
+
+    def __init__(self, dimensions: int, capacity: int = 16):
+        self.dimensions = dimensions
+        self.lock = threading.Lock()
+        self.matrix = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.size = 0
+        # Row bookkeeping, parallel to the matrix rows
+        self.api_ids: List[str] = []
+        self.keywords: List[List[str]] = []
+        # Format: {api_id: (row, updated_at)}
+        self.rows: Dict[str, Tuple[int, Any]] = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def upsert(self, api: APIRegistry):
+        """Add or replace an API's row (removes it if the API is inactive)"""
+        if not api.is_active:
+            self.remove(api.api_id)
+            return
+
+        vector = self.vectorize(api)
+        keywords = [keyword.lower() for keyword in (api.intent_keywords or [])]
+        with self.lock:
+            existing = self.rows.get(api.api_id)
+            if existing is not None:
+                row = existing[0]
+            else:
+                row = self.size
+                if row == len(self.matrix):
+                    grown = np.zeros((len(self.matrix) * 2, self.dimensions), dtype=np.float32)
+                    grown[:row] = self.matrix[:row]
+                    self.matrix = grown
+                self.api_ids.append(api.api_id)
+                self.keywords.append(keywords)
+                self.size += 1
+            self.matrix[row] = vector
+            self.keywords[row] = keywords
+            self.rows[api.api_id] = (row, api.updated_at)
+
+    def remove(self, api_id: str):
+        """Remove an API's row by moving the last row into its place"""
+        with self.lock:
+            existing = self.rows.pop(api_id, None)
+            if existing is None:
+                return
+            row, last = existing[0], self.size - 1
+            if row != last:
+                moved_id = self.api_ids[last]
+                self.matrix[row] = self.matrix[last]
+                self.api_ids[row] = moved_id
+                self.keywords[row] = self.keywords[last]
+                self.rows[moved_id] = (row, self.rows[moved_id][1])
+            self.matrix[last] = 0
+            self.api_ids.pop()
+            self.keywords.pop()
+            self.size -= 1
+
+    def search(self, text: str, top_k: int) -> List[Tuple[str, float, int]]:
+        """
+        Best APIs for text as (api_id, cosine, keyword hits), ordered by
+        keyword hits then cosine similarity
+        """
+        query = embed(text, self.dimensions)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query /= norm
+
+        match_text = text.lower()
+        with self.lock:
+            if self.size == 0:
+                return []
+            scores = self.matrix[:self.size] @ query
+            k = min(top_k, self.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates = [
+                (self.api_ids[row], float(scores[row]), keyword_score(self.keywords[row], match_text))
+                for row in top
+            ]
+
+        candidates.sort(key=lambda item: (item[2], item[1]), reverse=True)
+        return candidates
+
+    def vectorize(self, api: APIRegistry) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for field, weight in FIELD_WEIGHTS.items():
+            value = getattr(api, field, None)
+            if isinstance(value, list):
+                value = " ".join(str(item) for item in value)
+            if value:
+                embed(str(value), self.dimensions, weight, out=vector)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class RoutingShard:
+    """An APIVectorIndex over one scope of the registry (system APIs or one user's APIs)"""
+
+    def __init__(self, user_id: Optional[str], capacity: int):
+        self.user_id = user_id
+        self.index = APIVectorIndex(settings.ROUTING_INDEX_DIMENSIONS, capacity)
+        self.lock = threading.Lock()
+        self.fingerprint: Optional[Tuple[int, Optional[str]]] = None
+        self.checked_at = 0.0
+        self.last_used = time.time()
+
+    def scope_filter(self):
+        if self.user_id is None:
+            return APIRegistry.is_system == True
+        return and_(APIRegistry.user_id == self.user_id, APIRegistry.is_system == False)
+
+    def ensure_synced(self, db: Session):
+        now = time.time()
+        if self.fingerprint is not None and now - self.checked_at < settings.ROUTING_INDEX_SYNC_SECONDS:
+            return
+
+        with self.lock:
+            if self.fingerprint is not None and now - self.checked_at < settings.ROUTING_INDEX_SYNC_SECONDS:
+                return
+            count, last_updated = db.query(
+                func.count(APIRegistry.api_id), func.max(APIRegistry.updated_at)
+            ).filter(self.scope_filter()).one()
+            fingerprint = (count, str(last_updated) if last_updated else None)
+            if fingerprint != self.fingerprint:
+                self._sync(db)
+                self.fingerprint = fingerprint
+            self.checked_at = now
+
+    def _sync(self, db: Session):
+        """Reload rows that are new or changed, drop rows that are gone or inactive"""
+        started = time.time()
+        current = {
+            row.api_id: row.updated_at
+            for row in db.query(APIRegistry.api_id, APIRegistry.updated_at).filter(
+                self.scope_filter(), APIRegistry.is_active == True
+            )
+        }
+        indexed = {api_id: updated_at for api_id, (_, updated_at) in list(self.index.rows.items())}
+
+        for api_id in indexed.keys() - current.keys():
+            self.index.remove(api_id)
+
+        changed = [api_id for api_id, updated_at in current.items() if indexed.get(api_id, object()) != updated_at]
+        for start in range(0, len(changed), 500):
+            for api in db.query(APIRegistry).filter(APIRegistry.api_id.in_(changed[start:start + 500])):
+                self.index.upsert(api)
+
+        if changed or len(indexed) != len(current):
+            logger.info(
+                f"Routing shard {self.user_id or 'system'} synced: {len(changed)} updated, "
+                f"{len(self.index)} APIs ({(time.time() - started) * 1000:.1f} ms)"
+            )
+
+
+class APIRoutingIndex:
+    """Route over the system APIs plus the caller's own APIs
+
+    The registry is split into shards: one for system APIs, always kept,
+    and one per user, loaded on the user's first query and dropped after
+    ROUTING_SHARD_IDLE_SECONDS without use (or when more than
+    ROUTING_MAX_SHARDS are loaded). Local writes update loaded shards
+    directly; writes from other workers are picked up by comparing each
+    shard's fingerprint at most every ROUTING_INDEX_SYNC_SECONDS and
+    reloading only rows whose updated_at changed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.system_shard = RoutingShard(None, capacity=64)
+        # Format: {user_id: RoutingShard}, least recently used first
+        self.user_shards: "OrderedDict[str, RoutingShard]" = OrderedDict()
+
+    def search(
+        self,
+        db: Session,
+        text: str,
+        user_id: Optional[str] = None,
+        top_k: Optional[int] = None
+    ) -> List[Tuple[str, float, int]]:
+        """Best APIs visible to user_id as (api_id, cosine, keyword hits), best first"""
+        top_k = top_k or settings.ROUTING_TOP_K
+        shards = [self.system_shard]
+        if user_id:
+            shards.append(self._user_shard(user_id))
+
+        candidates: List[Tuple[str, float, int]] = []
+        for shard in shards:
+            shard.ensure_synced(db)
+            candidates.extend(shard.index.search(text, top_k))
+        candidates.sort(key=lambda item: (item[2], item[1]), reverse=True)
+        return candidates[:top_k]
+
+    def upsert(self, api: APIRegistry):
+        """Apply a local write to the API's shard, if that shard is loaded"""
+        shard = self._loaded_shard(api)
+        if shard is not None:
+            shard.index.upsert(api)
+
+    def upsert_many(self, apis: List[APIRegistry]):
+        for api in apis:
+            self.upsert(api)
+
+    def remove(self, api_id: str):
+        with self.lock:
+            shards = [self.system_shard] + list(self.user_shards.values())
+        for shard in shards:
+            shard.index.remove(api_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            user_shards = list(self.user_shards.values())
+        return {
+            "system_apis": len(self.system_shard.index),
+            "user_shards": len(user_shards),
+            "user_apis": sum(len(shard.index) for shard in user_shards),
+            "matrix_bytes": int(
+                self.system_shard.index.matrix.nbytes + sum(shard.index.matrix.nbytes for shard in user_shards)
+            )
+        }
+
+    def _loaded_shard(self, api: APIRegistry) -> Optional[RoutingShard]:
+        if api.is_system:
+            return self.system_shard
+        with self.lock:
+            return self.user_shards.get(api.user_id)
+
+    def _user_shard(self, user_id: str) -> RoutingShard:
+        now = time.time()
+        with self.lock:
+            shard = self.user_shards.get(user_id)
+            if shard is None:
+                shard = RoutingShard(user_id, capacity=4)
+                self.user_shards[user_id] = shard
+            else:
+                self.user_shards.move_to_end(user_id)
+            shard.last_used = now
+
+            # Evict from the least recently used end
+            while self.user_shards:
+                oldest_id, oldest = next(iter(self.user_shards.items()))
+                idle = now - oldest.last_used > settings.ROUTING_SHARD_IDLE_SECONDS
+                if not idle and len(self.user_shards) <= settings.ROUTING_MAX_SHARDS:
+                    break
+                del self.user_shards[oldest_id]
+                logger.info(f"Evicted routing shard for user {oldest_id}")
+        return shard
+
+
+# Global routing index instance
+api_routing_index = APIRoutingIndex()
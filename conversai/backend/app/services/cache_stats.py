@@ -0,0 +1,112 @@
+"""
+Cache Statistics - Hit/miss/eviction counters per API and category
+"""
+from typing import Dict, Any, List, Optional
+from cachetools import LRUCache
+import threading
+
+COUNTERS = ("hits", "misses", "evictions", "expirations")
+
+
+class CacheStatsCollector:
+    """Collect response cache statistics for the admin API
+
+    Cache keys have the form "<api_id>:<hash>", so removals reported by the
+    backend can be attributed to an API and, through it, to a category.
+    """
+
+    def __init__(self, tracked_keys: int = 2000):
+        self.lock = threading.Lock()
+
+        # Format: {api_id: {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}}
+        self.by_api: Dict[str, Dict[str, int]] = {}
+        # Format: {api_id: category}
+        self.api_categories: Dict[str, str] = {}
+        # Request counts per key for the "hottest keys" view
+        # Format: {cache_key: {"api_id", "label", "requests"}}
+        self.key_requests = LRUCache(maxsize=tracked_keys)
+
+    def record_hit(self, cache_key: str, api_id: str, category: str, label: str):
+        self._record(cache_key, api_id, category, label, "hits")
+
+    def record_miss(self, cache_key: str, api_id: str, category: str, label: str):
+        self._record(cache_key, api_id, category, label, "misses")
+
+    def record_removal(self, cache_key: str, reason: str):
+        """Backend listener for evictions and expirations"""
+        counter = "evictions" if reason == "eviction" else "expirations"
+        api_id = cache_key.split(":", 1)[0]
+        with self.lock:
+            self._counters(api_id)[counter] += 1
+
+    def reset(self):
+        with self.lock:
+            self.by_api.clear()
+            self.key_requests.clear()
+
+    def snapshot(self, usage: Dict[str, Dict[str, int]], top_n: int = 10) -> Dict[str, Any]:
+        """Build the stats report, merging in entries/bytes held per API from the backend"""
+        with self.lock:
+            by_api = {api_id: dict(counters) for api_id, counters in self.by_api.items()}
+            categories = dict(self.api_categories)
+            hottest = sorted(
+                ({"key": key, **info} for key, info in self.key_requests.items()),
+                key=lambda item: item["requests"],
+                reverse=True
+            )[:top_n]
+
+        for api_id in usage:
+            by_api.setdefault(api_id, {counter: 0 for counter in COUNTERS})
+        for api_id, counters in by_api.items():
+            held = usage.get(api_id, {})
+            counters["entries"] = held.get("entries", 0)
+            counters["bytes"] = held.get("bytes", 0)
+            counters["hit_ratio"] = self._hit_ratio(counters)
+
+        by_category: Dict[str, Dict[str, Any]] = {}
+        totals = self._empty_totals()
+        for api_id, counters in by_api.items():
+            category = categories.get(api_id, "unknown")
+            bucket = by_category.setdefault(category, self._empty_totals())
+            for field in COUNTERS + ("entries", "bytes"):
+                bucket[field] += counters[field]
+                totals[field] += counters[field]
+        for bucket in list(by_category.values()) + [totals]:
+            bucket["hit_ratio"] = self._hit_ratio(bucket)
+
+        return {
+            "totals": totals,
+            "by_category": by_category,
+            "by_api": by_api,
+            "hottest_keys": hottest
+        }
+
+    def api_ids_for_category(self, category: str) -> List[str]:
+        with self.lock:
+            return [api_id for api_id, api_category in self.api_categories.items() if api_category == category]
+
+    def _record(self, cache_key: str, api_id: str, category: str, label: str, counter: str):
+        with self.lock:
+            self._counters(api_id)[counter] += 1
+            if category:
+                self.api_categories[api_id] = category
+
+            info = self.key_requests.get(cache_key)
+            if info is None:
+                info = {"api_id": api_id, "label": label, "requests": 0}
+                self.key_requests[cache_key] = info
+            info["requests"] += 1
+
+    def _counters(self, api_id: str) -> Dict[str, int]:
+        counters = self.by_api.get(api_id)
+        if counters is None:
+            counters = {counter: 0 for counter in COUNTERS}
+            self.by_api[api_id] = counters
+        return counters
+
+    def _empty_totals(self) -> Dict[str, Any]:
+        return {field: 0 for field in COUNTERS + ("entries", "bytes")}
+
+    def _hit_ratio(self, counters: Dict[str, Any]) -> Optional[float]:
+        lookups = counters["hits"] + counters["misses"]
+        return round(counters["hits"] / lookups, 4) if lookups else None
@@ -0,0 +1,302 @@
+"""
+Chat Pipeline - One chat turn: intent, routing, API call and formatting
+"""
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+from sqlalchemy.orm import Session
+from app.api.schemas import ChatResponse
+from app.core.config import settings
+from app.services.query_processor import QueryProcessor
+from app.services.api_mapper import APIMapper
+from app.services.api_handler import request_handler
+from app.services.response_formatter import response_formatter
+from app.services.payload_projector import payload_projector
+from app.services.context_builder import context_builder, SUMMARY_ENTITY_KEYS
+from app.services.credentials import credential_resolver
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Receives pipeline events ({"type": "stage" | "token", ...}) as they happen
+EventSink = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Intents that mean "no clear new request", e.g. the answer to a clarification question
+GENERIC_INTENTS = ("unknown", "custom", "general")
+
+# Entity a clarification question for each intent asks for, filled by a bare answer like "London"
+CLARIFIED_ENTITIES = {
+    "weather": "location",
+    "crypto": "coin",
+    "news": "keyword",
+    "dictionary": "word",
+    "sports": "team",
+    "score": "team",
+    "match": "team"
+}
+
+# Longest reply (in words) taken as the missing entity itself
+BARE_ANSWER_MAX_WORDS = 4
+
+# Leading words dropped from a bare answer ("in London" -> "London")
+BARE_ANSWER_PREFIXES = ("in", "at", "for", "about", "of", "the")
+
+
+class ChatSessionState:
+    """What a long-lived connection keeps in memory about its session
+
+    Replaces the per-message history query: the last few messages for the
+    intent prompt, the last intent and entities (so follow-ups like "and
+    tomorrow?" keep the city), and a clarification question waiting for
+    its answer.
+    """
+
+    def __init__(self, session_id: str, user_id: str):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.recent_messages: List[Dict[str, str]] = []
+        self.last_intent: Optional[str] = None
+        self.last_entities: Dict[str, Any] = {}
+        # Intent data of the clarification question last asked, if unanswered
+        self.pending_clarification: Optional[Dict[str, Any]] = None
+        # False until the session summary has been seeded from stored history
+        self.history_loaded = False
+
+    def remember(self, role: str, content: str):
+        self.recent_messages.append({"role": role, "content": content})
+        del self.recent_messages[:-settings.CONTEXT_RECENT_MESSAGES]
+
+    def resolve_intent(self, intent_data: Dict[str, Any], message: str = "") -> Dict[str, Any]:
+        """Complete a turn's intent from the pending clarification and the last turn's entities"""
+        intent_data = dict(intent_data)
+        entities = dict(intent_data.get("entities") or {})
+        pending = self.pending_clarification
+        self.pending_clarification = None
+
+        generic = intent_data.get("intent") in GENERIC_INTENTS
+        if pending and (generic or intent_data.get("intent") == pending.get("intent")):
+            # The message answers the question: keep the original intent, add the new entities
+            intent_data["intent"] = pending.get("intent")
+            entities = {**(pending.get("entities") or {}), **entities}
+
+            # The classifier judged the message on its own, so decide again with the merged entities
+            missing = CLARIFIED_ENTITIES.get(intent_data["intent"])
+            if missing and not entities.get(missing):
+                answer = self._bare_answer(message)
+                if answer:
+                    entities[missing] = answer
+            if missing:
+                intent_data["needs_clarification"] = not entities.get(missing)
+            elif generic:
+                intent_data["needs_clarification"] = False
+            if intent_data.get("needs_clarification"):
+                intent_data["clarification_question"] = pending.get("clarification_question") or intent_data.get("clarification_question")
+            else:
+                intent_data["clarification_question"] = ""
+        elif intent_data.get("intent") == self.last_intent:
+            for key in SUMMARY_ENTITY_KEYS:
+                if key not in entities and key in self.last_entities:
+                    entities[key] = self.last_entities[key]
+            # A question about the entity the last turn already had isn't needed
+            missing = CLARIFIED_ENTITIES.get(intent_data.get("intent"))
+            if missing and entities.get(missing) and intent_data.get("needs_clarification"):
+                intent_data["needs_clarification"] = False
+                intent_data["clarification_question"] = ""
+
+        intent_data["entities"] = entities
+        return intent_data
+
+    def _bare_answer(self, message: str) -> Optional[str]:
+        """A short reply taken as the value asked for ("in London?" gives London)"""
+        words = message.strip(" ?.,!").split()
+        while words and words[0].lower() in BARE_ANSWER_PREFIXES:
+            words = words[1:]
+        if not words or len(words) > BARE_ANSWER_MAX_WORDS:
+            return None
+        return " ".join(words).strip(" ?.,!")
+
+    def finish_turn(self, intent_data: Dict[str, Any]):
+        if intent_data.get("needs_clarification"):
+            self.pending_clarification = intent_data
+            return
+        self.last_intent = intent_data.get("intent")
+        self.last_entities = dict(intent_data.get("entities") or {})
+
+
+class ChatPipeline:
+    """Run one chat turn for POST /chat/message and the /chat/ws WebSocket
+
+    With a ChatSessionState the context comes from memory instead of the
+    database. With an event sink, stage events ("understanding",
+    "routing", "fetching", "formatting") are emitted as the turn
+    progresses and the answer is streamed as "token" events.
+
+    The caller folds the turn into the session summary afterwards with
+    await context_builder.record_turn(response.session_id, response.intent,
+    response.api_used).
+    """
+
+    async def run(
+        self,
+        db: Session,
+        user_id: str,
+        message: str,
+        session_id: Optional[str] = None,
+        state: Optional[ChatSessionState] = None,
+        emit: Optional[EventSink] = None
+    ) -> ChatResponse:
+        # Initialize services
+        query_processor = QueryProcessor(db)
+        api_mapper = APIMapper(db, user_id=user_id)
+
+        # Get or create session
+        if state is not None:
+            session_id = state.session_id
+        elif not session_id:
+            session_id = query_processor.create_session(user_id=user_id)
+
+        # Process query and extract intent
+        await self._stage(emit, "understanding")
+        context = await self._context_from_state(query_processor, state) if state is not None else None
+        intent_data = await query_processor.process_query(message, session_id, context=context)
+        if state is not None:
+            sanitized = query_processor.sanitize_input(message)
+            intent_data = state.resolve_intent(intent_data, sanitized)
+            state.remember("user", sanitized)
+
+        # Check if clarification needed
+        if intent_data.get("needs_clarification"):
+            return await self._reply(
+                query_processor, state, emit, session_id, intent_data,
+                intent_data["clarification_question"], metadata=intent_data
+            )
+
+        # Find matching API
+        await self._stage(emit, "routing", intent=intent_data)
+        api = api_mapper.find_matching_api(
+            intent_data["intent"],
+            intent_data.get("entities", {}),
+            message  # Pass the original user query for better keyword matching
+        )
+
+        if not api:
+            error_msg = "I couldn't find an appropriate API for your request. Please try rephrasing or register a custom API."
+            return await self._reply(
+                query_processor, state, emit, session_id, intent_data,
+                error_msg, metadata={"error": "no_api_found"}
+            )
+
+        # Prepare API request (custom API keys are decrypted off the event loop first)
+        await credential_resolver.prime(api)
+        request_config = api_mapper.prepare_api_request(api, intent_data.get("entities", {}))
+
+        if not request_config:
+            error_msg = "Failed to prepare API request. Please check your input parameters."
+            return await self._reply(
+                query_processor, state, emit, session_id, intent_data,
+                error_msg, metadata={"error": "request_preparation_failed"}, api_name=api.api_name
+            )
+
+        # Send API request
+        await self._stage(emit, "fetching", api_used=api.api_name)
+        api_response = await request_handler.send_request(
+            request_config=request_config,
+            category=api.category,
+            api_id=api.api_id,
+            rate_limit=api.rate_limit,
+            response_config=api.response_config,
+            projection=payload_projector.for_api(api)
+        )
+
+        # Format response naturally
+        await self._stage(emit, "formatting")
+        try:
+            if emit is not None:
+                pieces = []
+                async for piece in response_formatter.stream_response(api_response, api, message):
+                    pieces.append(piece)
+                    await emit({"type": "token", "text": piece})
+                formatted_response = "".join(pieces)
+            else:
+                formatted_response = await response_formatter.format_response(
+                    api_data=api_response,
+                    api=api,
+                    query=message,
+                    use_llm=True
+                )
+        except Exception as format_error:
+            logger.error(f"Response formatting error: {format_error}", exc_info=True)
+            logger.error(f"API response data: {api_response}")
+            logger.error(f"API config: {api.api_name}, category: {api.category}")
+            raise
+
+        # Save assistant response
+        metadata = {
+            "intent": intent_data,
+            "api_id": api.api_id,
+            "api_name": api.api_name,
+            "cached": api_response.get("_cached", False),
+            "negative_cached": api_response.get("_negative_cached", False)
+        }
+        return await self._reply(
+            query_processor, state, None, session_id, intent_data, formatted_response,
+            metadata=metadata, api_name=api.api_name, cached=api_response.get("_cached", False)
+        )
+
+    async def _reply(
+        self,
+        query_processor: QueryProcessor,
+        state: Optional[ChatSessionState],
+        emit: Optional[EventSink],
+        session_id: str,
+        intent_data: Dict[str, Any],
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        api_name: Optional[str] = None,
+        cached: bool = False
+    ) -> ChatResponse:
+        """Save the assistant message and build the response (emitting it whole when not streamed)"""
+        query_processor.save_message(
+            session_id=session_id,
+            role="assistant",
+            content=content,
+            metadata=metadata
+        )
+        if state is not None:
+            state.remember("assistant", content)
+            state.finish_turn(intent_data)
+        if emit is not None:
+            await emit({"type": "token", "text": content})
+
+        return ChatResponse(
+            response=content,
+            session_id=session_id,
+            intent=intent_data,
+            api_used=api_name,
+            cached=cached
+        )
+
+    async def _context_from_state(self, query_processor: QueryProcessor, state: ChatSessionState) -> List[Dict[str, str]]:
+        """Intent prompt context from memory; stored history is read only on the first turn"""
+        load_history = None
+        if not state.history_loaded:
+            state.history_loaded = True
+            # Resuming an existing session: seed the recent messages and the summary from the database
+            messages, _ = query_processor.get_history_page(state.session_id, settings.CONTEXT_RECENT_MESSAGES)
+            for msg in messages:
+                state.remember(msg["role"], msg["content"])
+
+            def load_history():
+                history, _ = query_processor.get_history_page(
+                    state.session_id, settings.CONTEXT_SUMMARY_TURNS * 2, include_metadata=True
+                )
+                return history
+
+        return await context_builder.build(state.session_id, state.recent_messages, load_history)
+
+    async def _stage(self, emit: Optional[EventSink], stage: str, **detail):
+        if emit is not None:
+            await emit({"type": "stage", "stage": stage, **detail})
+
+
+# Global chat pipeline instance
+chat_pipeline = ChatPipeline()
@@ -0,0 +1,156 @@
+"""
+Context Builder - Small, bounded conversation context for intent extraction
+"""
+from typing import Callable, Dict, Any, List, Optional
+from app.core.cache import create_cache_backend
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Entities carried over between turns ("what about tomorrow?" keeps the city)
+SUMMARY_ENTITY_KEYS = (
+    "location", "coin", "team", "sport", "keyword", "word",
+    "from_currency", "to_currency", "amount"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+class ConversationContextBuilder:
+    """Keep a rolling summary per session and build token-bounded context
+
+    The summary holds the last value of each entity in SUMMARY_ENTITY_KEYS
+    and one short line per recent turn ("weather(location=Paris) via
+    OpenWeatherMap"). It is updated after each exchange, outside the request,
+    and replaces the long assistant outputs (news lists, JSON blocks) that
+    would otherwise be inlined into the intent prompt.
+
+    A summary rebuilt from stored history for a session older than
+    RETENTION_COMPACT_AFTER_DAYS has turn lines but no entities, because
+    metadata compaction strips intent.entities from old messages.
+    """
+
+    def __init__(self):
+        # Format: {session_id: {"entities": {...}, "turns": [str], "count": int}}
+        self.summaries = create_cache_backend(
+            "conversation_summary",
+            default_ttl=settings.CONTEXT_SUMMARY_TTL,
+            max_bytes=4 * 1024 * 1024
+        )
+
+    async def build(
+        self,
+        session_id: str,
+        recent_messages: List[Dict[str, Any]],
+        load_history: Optional[Callable[[], List[Dict[str, Any]]]] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Context for the intent prompt: the session summary followed by the
+        most recent messages, truncated to fit CONTEXT_TOKEN_BUDGET
+
+        load_history (returning messages with metadata) seeds the summary
+        when none is cached, e.g. after a restart.
+        """
+        summary = await self.summaries.aget(session_id)
+        if summary is None and load_history:
+            history = load_history()
+            if history:
+                summary = self._summarize_history(history)
+                await self.summaries.aset(session_id, summary)
+
+        context: List[Dict[str, str]] = []
+        budget = settings.CONTEXT_TOKEN_BUDGET
+
+        summary_text = self.summary_text(summary)
+        if summary_text:
+            summary_text = self._truncate(summary_text, budget * 4)
+            context.append({"role": "summary", "content": summary_text})
+            budget -= estimate_tokens(summary_text)
+
+        # Newest first, so the latest turn survives when the budget runs out
+        recent: List[Dict[str, str]] = []
+        for msg in reversed(recent_messages[-settings.CONTEXT_RECENT_MESSAGES:]):
+            content = self._truncate(msg["content"], settings.CONTEXT_MESSAGE_MAX_CHARS)
+            cost = estimate_tokens(content)
+            if cost > budget:
+                break
+            recent.append({"role": msg["role"], "content": content})
+            budget -= cost
+
+        context.extend(reversed(recent))
+        return context
+
+    async def record_turn(self, session_id: str, intent_data: Optional[Dict[str, Any]], api_name: Optional[str] = None):
+        """Fold one exchange into the session summary (run as a background task)"""
+        try:
+            summary = await self.summaries.aget(session_id) or self._empty_summary()
+            self._fold(summary, intent_data, api_name)
+            await self.summaries.aset(session_id, summary)
+        except Exception as e:
+            logger.warning(f"Failed to update conversation summary: {e}")
+
+    async def forget(self, session_id: str):
+        """Drop a session's summary"""
+        await self.summaries.adelete(session_id)
+
+    def summary_text(self, summary: Optional[Dict[str, Any]]) -> str:
+        """Render a summary as one or two short lines"""
+        if not summary:
+            return ""
+
+        parts = []
+        if summary["entities"]:
+            entities = ", ".join(f"{key}={value}" for key, value in summary["entities"].items())
+            parts.append(f"Known entities: {entities}.")
+        if summary["turns"]:
+            parts.append(f"Earlier ({summary['count']} turns): {'; '.join(summary['turns'])}.")
+        return " ".join(parts)
+
+    def _summarize_history(self, history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Rebuild a summary from stored messages (assistant replies carry the turn's intent as metadata)"""
+        summary = self._empty_summary()
+        for msg in history:
+            metadata = msg.get("message_metadata") or {}
+            if msg["role"] == "assistant" and isinstance(metadata.get("intent"), dict):
+                self._fold(summary, metadata["intent"], metadata.get("api_name"))
+        return summary
+
+    def _fold(self, summary: Dict[str, Any], intent_data: Optional[Dict[str, Any]], api_name: Optional[str]):
+        if not intent_data:
+            return
+
+        entities = intent_data.get("entities") or {}
+        turn_entities = []
+        for key in SUMMARY_ENTITY_KEYS:
+            value = entities.get(key)
+            if value in (None, "", [], {}):
+                continue
+            value = self._truncate(str(value), 40)
+            # Most recent value last, so rendering lists the freshest entities at the end
+            summary["entities"].pop(key, None)
+            summary["entities"][key] = value
+            turn_entities.append(f"{key}={value}")
+
+        turn = f"{intent_data.get('intent', 'unknown')}({', '.join(turn_entities)})"
+        if api_name:
+            turn += f" via {api_name}"
+        summary["turns"] = (summary["turns"] + [turn])[-settings.CONTEXT_SUMMARY_TURNS:]
+        summary["count"] += 1
+
+    def _empty_summary(self) -> Dict[str, Any]:
+        return {"entities": {}, "turns": [], "count": 0}
+
+    def _truncate(self, text: str, max_chars: int) -> str:
+        text = " ".join(text.split())
+        if len(text) <= max_chars:
+            return text
+        return text[:max(max_chars - 3, 0)].rstrip() + "..."
+
+
+# Global context builder instance
+context_builder = ConversationContextBuilder()
@@ -0,0 +1,123 @@
+"""
+Credentials - Resolves API keys for system and custom APIs
+"""
+from typing import Dict, Any, Optional, Tuple
+from cryptography.fernet import InvalidToken
+from app.core.config import settings
+from app.core.security import encryption_service
+from app.models.database import APIRegistry
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialResolver:
+    """API keys for outgoing requests
+
+    System APIs use keys from settings. Custom APIs carry a Fernet-encrypted
+    auth_config["key"]; it is decrypted off the event loop by prime() before
+    the request is built, and the plaintext is held in a bytearray for
+    CREDENTIAL_CACHE_TTL_SECONDS. A key that fails to decrypt is cached as
+    None for as long, so it isn't retried on every request. Entries are
+    overwritten with zeros when they expire or the API is updated or deleted
+    (copies made by str() for the outgoing request are left to the garbage
+    collector).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Format: {api_id: (updated_at, secret, expires_at)}; secret is None if decryption failed
+        self.secrets: Dict[str, Tuple[Any, Optional[bytearray], float]] = {}
+
+    def system_key(self, api_id: str) -> Optional[str]:
+        """Key for a system API, from settings"""
+        # Map API IDs to environment variable keys
+        key_map = {
+            "weather-openweather": settings.OPENWEATHER_API_KEY,
+            "news-newsapi": settings.NEWSAPI_KEY,
+            "facts-ninja": settings.API_NINJAS_KEY,
+        }
+        return key_map.get(api_id)
+
+    async def prime(self, api: APIRegistry):
+        """Decrypt a custom API's key into the cache, in a worker thread"""
+        self._sweep()
+        if api.is_system or not self._encrypted_key(api) or self._cached(api)[0]:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._decrypt, api)
+
+    def get(self, api: APIRegistry) -> Optional[str]:
+        """Key for an API; custom keys come from the cache filled by prime()"""
+        if api.is_system:
+            return self.system_key(api.api_id)
+        if not self._encrypted_key(api):
+            return None
+
+        # Once prime() has run the entry is there (a failed decrypt included), even
+        # if it expired in between; it is swept by the next prime()
+        found, key = self._cached(api, include_expired=True)
+        if not found:
+            # Not primed (e.g. a caller outside the chat flow); decrypt inline
+            key = self._decrypt(api)
+        return key
+
+    def forget(self, api_id: str):
+        """Zero and drop an API's cached key (after an update or delete)"""
+        with self.lock:
+            entry = self.secrets.pop(api_id, None)
+            if entry is not None:
+                self._zero(entry[1])
+
+    def clear(self):
+        """Zero and drop every cached key"""
+        with self.lock:
+            for entry in self.secrets.values():
+                self._zero(entry[1])
+            self.secrets.clear()
+
+    def _cached(self, api: APIRegistry, include_expired: bool = False) -> Tuple[bool, Optional[str]]:
+        """(found, key); a cached decryption failure is found with key None"""
+        with self.lock:
+            entry = self.secrets.get(api.api_id)
+            # A key cached for an older version of the API is never used
+            if entry is None or entry[0] != api.updated_at or (entry[2] <= time.time() and not include_expired):
+                return False, None
+            return True, entry[1].decode() if entry[1] is not None else None
+
+    def _sweep(self):
+        """Zero and drop expired keys"""
+        now = time.time()
+        with self.lock:
+            for api_id in [api_id for api_id, entry in self.secrets.items() if entry[2] <= now]:
+                self._zero(self.secrets.pop(api_id)[1])
+
+    def _decrypt(self, api: APIRegistry) -> Optional[str]:
+        try:
+            key = encryption_service.decrypt(self._encrypted_key(api))
+        except (InvalidToken, ValueError) as e:
+            logger.warning(f"Could not decrypt the key for API {api.api_id}: {type(e).__name__}")
+            key = None
+
+        expires_at = time.time() + settings.CREDENTIAL_CACHE_TTL_SECONDS
+        with self.lock:
+            previous = self.secrets.get(api.api_id)
+            if previous is not None:
+                self._zero(previous[1])
+            secret = bytearray(key.encode()) if key is not None else None
+            self.secrets[api.api_id] = (api.updated_at, secret, expires_at)
+        return key
+
+    def _encrypted_key(self, api: APIRegistry) -> Optional[str]:
+        return (api.auth_config or {}).get("key") or None
+
+    def _zero(self, secret: Optional[bytearray]):
+        if secret is not None:
+            secret[:] = bytes(len(secret))
+
+
+# Global credential resolver instance
+credential_resolver = CredentialResolver()
@@ -0,0 +1,162 @@
+"""
+HTTP Client - Shared connection pool for upstream API calls, with cached DNS
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from httpx._utils import get_environment_proxies
+from app.core.config import settings
+import asyncio
+import httpcore
+import httpx
+import ipaddress
+import logging
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CachingResolver:
+    """getaddrinfo results per (host, port), kept for DNS_CACHE_TTL_SECONDS"""
+
+    def __init__(self):
+        # Format: {(host, port): (addresses, expires_at)}
+        self.entries: Dict[Tuple[str, int], Tuple[List[str], float]] = {}
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        """Addresses for host, from the cache when fresh (raises OSError on failure)"""
+        if self._is_ip(host):
+            return [host]
+
+        key = (host, port)
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self.entries[key] = (addresses, time.time() + settings.DNS_CACHE_TTL_SECONDS)
+        return addresses
+
+    def forget(self, host: str, port: int):
+        self.entries.pop((host, port), None)
+
+    def cached_hosts(self) -> List[str]:
+        now = time.time()
+        return sorted({host for (host, _), (_, expires_at) in self.entries.items() if expires_at > now})
+
+    def _is_ip(self, host: str) -> bool:
+        try:
+            ipaddress.ip_address(host.strip("[]"))
+            return True
+        except ValueError:
+            return False
+
+
+class ResolvingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """httpcore network backend that connects through the CachingResolver
+
+    Only the TCP connect uses the resolved address; TLS still verifies and
+    sends SNI for the original hostname.
+    """
+
+    def __init__(self, resolver: CachingResolver):
+        self.resolver = resolver
+        self.backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options=None
+    ) -> httpcore.AsyncNetworkStream:
+        try:
+            addresses = await self.resolver.resolve(host, port)
+        except OSError:
+            # Let the default backend raise the usual ConnectError
+            return await self.backend.connect_tcp(host, port, timeout, local_address, socket_options)
+
+        last_error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self.backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        # Every cached address failed; resolve again next time
+        self.resolver.forget(host, port)
+        raise last_error
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None):
+        return await self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float):
+        await self.backend.sleep(seconds)
+
+
+class ResolvingTransport(httpx.AsyncHTTPTransport):
+    """httpx's own transport, with its pool connecting through the CachingResolver"""
+
+    def __init__(self, resolver: CachingResolver, **kwargs):
+        super().__init__(**kwargs)
+        self._pool._network_backend = ResolvingNetworkBackend(resolver)
+
+
+class SharedHTTPClient:
+    """One pooled httpx.AsyncClient per event loop
+
+    Requests to the same host reuse keep-alive connections instead of paying
+    DNS, TCP and TLS setup on every call. The client is bound to the loop it
+    was created on; a different loop (e.g. a new asyncio.run) gets a new one.
+    """
+
+    def __init__(self):
+        self.resolver = CachingResolver()
+        self.client: Optional[httpx.AsyncClient] = None
+        self.pool: Optional[httpcore.AsyncConnectionPool] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.loop is not loop:
+            self.client = self._create_client()
+            self.loop = loop
+        return self.client
+
+    async def close(self):
+        if self.client is not None and self.loop is asyncio.get_running_loop():
+            await self.client.aclose()
+        self.client = None
+        self.pool = None
+        self.loop = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        connections = []
+        if self.pool is not None:
+            connections = [str(connection) for connection in self.pool.connections]
+        return {
+            "dns_cached_hosts": self.resolver.cached_hosts(),
+            "pooled_connections": connections
+        }
+
+    def _create_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        )
+        transport = ResolvingTransport(self.resolver, limits=limits)
+        self.pool = transport._pool
+
+        # A custom transport turns off httpx's HTTP(S)_PROXY / NO_PROXY handling, so mount
+        # the environment proxies the way httpx would (None routes a NO_PROXY host directly)
+        mounts = {
+            pattern: httpx.AsyncHTTPTransport(proxy=httpx.Proxy(url), limits=limits) if url else None
+            for pattern, url in get_environment_proxies().items()
+        }
+        return httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=5.0), transport=transport, mounts=mounts)
+
+
+# Global shared HTTP client instance
+shared_http_client = SharedHTTPClient()
@@ -0,0 +1,122 @@
+"""
+Intent Batcher - Classifies concurrent chat queries with one LLM call
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from app.core.config import settings
+from app.services.llm_service import llm_client
+from app.services.scheduler import llm_scheduler, priority_lane, current_priority, PRIORITY_CLASSES
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IntentBatcher:
+    """Micro-batching in front of LLMClient.extract_intent
+
+    While an intent call is already in flight, new queries wait up to
+    INTENT_BATCH_WINDOW_MS (or until INTENT_BATCH_MAX_SIZE have gathered)
+    and are classified together in one completion returning a JSON array.
+    Items the batched call fails to classify, or all of them if it fails,
+    are retried one by one with extract_intent. A query arriving when
+    nothing is in flight is sent on its own right away, so light traffic
+    pays no batching delay.
+    """
+
+    def __init__(self):
+        # Format: [(query, context, priority, future)]
+        self.pending: List[Tuple[str, Optional[list], str, asyncio.Future]] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.in_flight = 0
+        # Running batch tasks (referenced so they aren't garbage collected mid-flight)
+        self.tasks = set()
+        self.stats = {"single_calls": 0, "batches": 0, "batched_queries": 0, "fallbacks": 0, "failed_batches": 0}
+
+    async def classify(self, query: str, context: Optional[list] = None) -> Dict[str, Any]:
+        """Intent of one query (same result shape as extract_intent)"""
+        if not settings.INTENT_BATCH_ENABLED or llm_client.client is None or (self.in_flight == 0 and not self.pending):
+            return await self._classify_one(query, context)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((query, context, current_priority.get(), future))
+        if len(self.pending) >= settings.INTENT_BATCH_MAX_SIZE:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(settings.INTENT_BATCH_WINDOW_MS / 1000, self._flush)
+        return await future
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.INTENT_BATCH_ENABLED,
+            "window_ms": settings.INTENT_BATCH_WINDOW_MS,
+            "max_size": settings.INTENT_BATCH_MAX_SIZE,
+            "in_flight": self.in_flight,
+            "pending": len(self.pending),
+            **self.stats,
+            "avg_batch_size": round(self.stats["batched_queries"] / self.stats["batches"], 2) if self.stats["batches"] else None
+        }
+
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        items, self.pending = self.pending, []
+        if items:
+            task = asyncio.get_running_loop().create_task(self._run_batch(items))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run_batch(self, items: List[Tuple[str, Optional[list], str, asyncio.Future]]):
+        # The batch runs in the most interactive lane among its callers
+        priority = min((item[2] for item in items), key=PRIORITY_CLASSES.index)
+        with priority_lane(priority):
+            if len(items) == 1:
+                results: List[Optional[Dict[str, Any]]] = [None]
+            else:
+                results = await self._classify_batch(items)
+
+            # Anything the batch didn't classify goes through the single-query path
+            missing = [index for index, result in enumerate(results) if result is None]
+            if len(items) > 1:
+                self.stats["fallbacks"] += len(missing)
+            retried = await asyncio.gather(
+                *(self._classify_one(items[index][0], items[index][1]) for index in missing),
+                return_exceptions=True
+            )
+            for index, result in zip(missing, retried):
+                results[index] = result
+
+        for (_, _, _, future), result in zip(items, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _classify_batch(self, items) -> List[Optional[Dict[str, Any]]]:
+        self.in_flight += 1
+        try:
+            results = await llm_scheduler.call(llm_client.extract_intents_batch, [(query, context) for query, context, _, _ in items])
+            self.stats["batches"] += 1
+            self.stats["batched_queries"] += len(items)
+            return results
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            logger.warning(f"Batched intent classification of {len(items)} queries failed: {e}")
+            return [None] * len(items)
+        finally:
+            self.in_flight -= 1
+
+    async def _classify_one(self, query: str, context: Optional[list]) -> Dict[str, Any]:
+        self.in_flight += 1
+        try:
+            self.stats["single_calls"] += 1
+            return await llm_scheduler.call(llm_client.extract_intent, query, context)
+        finally:
+            self.in_flight -= 1
+
+
+# Global intent batcher instance
+intent_batcher = IntentBatcher()
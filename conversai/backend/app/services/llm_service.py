@@ -1,9 +1,10 @@
 """
 LLM Client for intent extraction and response generation using Groq API (FREE)
 """
-from groq import Groq
 from app.core.config import settings
-from typing import Optional, Dict, Any
+from app.core.lazy import Lazy
+from app.core import serialization
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 from datetime import datetime, timedelta
 import json
 import re
@@ -12,6 +13,42 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# JSON shape of one classified query (shared by the single and batched prompts)
+INTENT_SCHEMA = """{
+  "intent": "weather|crypto|news|dictionary|exchange|fact|wikipedia|github|sports|score|match|custom",
+  "confidence": 0.0-1.0,
+  "entities": {
+    "location": "city name if mentioned",
+    "coin": "cryptocurrency if mentioned (bitcoin, ethereum, etc)",
+    "keyword": "search term or topic",
+    "date": "date if mentioned (today, tomorrow, or YYYY-MM-DD)",
+    "sport": "sport type if mentioned (Soccer, Basketball, etc)",
+    "team": "team name if mentioned",
+    "from_currency": "source currency for exchange",
+    "to_currency": "target currency for exchange",
+    "amount": "amount to convert",
+    "word": "word to define",
+    "parameters": {}
+  },
+  "needs_clarification": true|false,
+  "clarification_question": "question to ask if clarification needed"
+}"""
+
+INTENT_DESCRIPTIONS = """Available intents:
+- weather: Weather information for a location
+- crypto: Cryptocurrency prices (bitcoin, ethereum, etc)
+- news: News articles on a topic
+- dictionary: Word definitions
+- exchange: Currency exchange rates
+- fact: Random interesting facts
+- wikipedia: Wikipedia information
+- github: GitHub repository information
+- sports: Information about sports teams
+- score: Live scores or match results
+- match: Match information or fixtures
+- custom: Other API queries"""
+
+
 class LLMClient:
     """Client for interacting with Groq's free LLM API"""
     
@@ -20,6 +57,8 @@ class LLMClient:
             logger.warning("GROQ_API_KEY not set. LLM features will be limited.")
             self.client = None
         else:
+            # The SDK takes a few hundred ms to import, so only load it when used
+            from groq import Groq
             self.client = Groq(api_key=settings.GROQ_API_KEY)
         self.model = settings.GROQ_MODEL
     
@@ -39,50 +78,15 @@ class LLMClient:
         if not self.client:
             return self._fallback_intent_extraction(query)
         
-        # Build context string
-        context_str = ""
-        if context:
-            context_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in context[-3:]])
-        
         prompt = f"""You are an intent classifier for an API interaction system.
 Analyze the user query and extract the following in JSON format:
 
-{{
-  "intent": "weather|crypto|news|dictionary|exchange|fact|wikipedia|github|sports|score|match|custom",
-  "confidence": 0.0-1.0,
-  "entities": {{
-    "location": "city name if mentioned",
-    "coin": "cryptocurrency if mentioned (bitcoin, ethereum, etc)",
-    "keyword": "search term or topic",
-    "date": "date if mentioned (today, tomorrow, or YYYY-MM-DD)",
-    "sport": "sport type if mentioned (Soccer, Basketball, etc)",
-    "team": "team name if mentioned",
-    "from_currency": "source currency for exchange",
-    "to_currency": "target currency for exchange",
-    "amount": "amount to convert",
-    "word": "word to define",
-    "parameters": {{}}
-  }},
-  "needs_clarification": true|false,
-  "clarification_question": "question to ask if clarification needed"
-}}
+{INTENT_SCHEMA}
 
-Available intents:
-- weather: Weather information for a location
-- crypto: Cryptocurrency prices (bitcoin, ethereum, etc)
-- news: News articles on a topic
-- dictionary: Word definitions
-- exchange: Currency exchange rates
-- fact: Random interesting facts
-- wikipedia: Wikipedia information
-- github: GitHub repository information
-- sports: Information about sports teams
-- score: Live scores or match results
-- match: Match information or fixtures
-- custom: Other API queries
+{INTENT_DESCRIPTIONS}
 
 Recent conversation context:
-{context_str}
+{self._context_text(context)}
 
 User Query: {query}
 
@@ -99,21 +103,7 @@ Return ONLY valid JSON, no explanation."""
             result_text = response.choices[0].message.content.strip()
             
             # Parse JSON response
-            result = json.loads(result_text)
-            
-            # Validate and set defaults
-            result.setdefault("confidence", 0.7)
-            result.setdefault("needs_clarification", False)
-            result.setdefault("clarification_question", "")
-            result.setdefault("entities", {})
-            
-            # Extract date from the original query if not already present
-            if "date" not in result["entities"] or not result["entities"]["date"]:
-                extracted_date = self._extract_date_from_query(query)
-                if extracted_date:
-                    result["entities"]["date"] = extracted_date
-            
-            return result
+            return self._complete_intent(json.loads(result_text), query)
             
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse LLM response: {e}")
@@ -122,6 +112,81 @@ Return ONLY valid JSON, no explanation."""
             logger.error(f"LLM intent extraction error: {e}")
             return self._fallback_intent_extraction(query)
     
+    def extract_intents_batch(self, items: List[Tuple[str, Optional[list]]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Classify several (query, context) pairs with one completion
+        
+        Returns one intent per item, in order, or None for an item the
+        response did not classify (the caller retries those one by one).
+        Raises when the call itself fails.
+        """
+        if not self.client:
+            return [None] * len(items)
+        
+        queries = "\n\n".join(
+            f"""### Query {index}
+Recent conversation context:
+{self._context_text(context)}
+
+User Query: {query}"""
+            for index, (query, context) in enumerate(items)
+        )
+        prompt = f"""You are an intent classifier for an API interaction system.
+Classify each of the {len(items)} user queries below independently (their contexts are unrelated).
+For each one, extract the following in JSON format, adding "index" (the query number):
+
+{INTENT_SCHEMA}
+
+{INTENT_DESCRIPTIONS}
+
+{queries}
+
+Return ONLY a valid JSON array with one object per query, no explanation."""
+
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=min(400 * len(items), 4000)
+        )
+        parsed = json.loads(response.choices[0].message.content.strip())
+        if isinstance(parsed, dict):
+            # Some models wrap the array in an object
+            parsed = next((value for value in parsed.values() if isinstance(value, list)), [])
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        for position, result in enumerate(parsed if isinstance(parsed, list) else []):
+            if not isinstance(result, dict) or not isinstance(result.get("intent"), str):
+                continue
+            if not isinstance(result.get("entities", {}), dict):
+                continue
+            index = result.pop("index", position)
+            if isinstance(index, int) and 0 <= index < len(items) and results[index] is None:
+                results[index] = self._complete_intent(result, items[index][0])
+        return results
+    
+    def _context_text(self, context: Optional[list]) -> str:
+        """Context messages as prompt lines (already summarized and bounded by the context builder)"""
+        if not context:
+            return ""
+        return "\n".join([f"{msg['role']}: {msg['content']}" for msg in context])
+    
+    def _complete_intent(self, result: Dict[str, Any], query: str) -> Dict[str, Any]:
+        """Fill defaults into a classified intent"""
+        # Validate and set defaults
+        result.setdefault("confidence", 0.7)
+        result.setdefault("needs_clarification", False)
+        result.setdefault("clarification_question", "")
+        result.setdefault("entities", {})
+        
+        # Extract date from the original query if not already present
+        if "date" not in result["entities"] or not result["entities"]["date"]:
+            extracted_date = self._extract_date_from_query(query)
+            if extracted_date:
+                result["entities"]["date"] = extracted_date
+        
+        return result
+    
     def _fallback_intent_extraction(self, query: str) -> Dict[str, Any]:
         """Rule-based fallback when LLM is unavailable"""
         query_lower = query.lower()
@@ -233,20 +298,10 @@ Return ONLY valid JSON, no explanation."""
         if not self.client:
             return self._format_simple_response(api_data, api_name)
         
-        prompt = f"""Convert this API response into a natural, conversational answer.
-
-User Question: {query}
-API Response: {json.dumps(api_data, indent=2)}
-Data Source: {api_name}
-
-Generate a concise, friendly response (2-3 sentences max).
-Do not make up information. Only use data from the API response.
-If there's an error, explain it clearly."""
-
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+                messages=[{"role": "user", "content": self._natural_response_prompt(api_data, query, api_name)}],
                 temperature=0.7,
                 max_tokens=300
             )
@@ -257,11 +312,42 @@ If there's an error, explain it clearly."""
             logger.error(f"LLM response generation error: {e}")
             return self._format_simple_response(api_data, api_name)
     
+    def stream_natural_response(self, api_data: dict, query: str, api_name: str) -> Iterator[str]:
+        """
+        Like generate_natural_response, but yields the text as the LLM
+        generates it (blocking; run it in a worker thread). Errors propagate.
+        """
+        if not self.client:
+            yield self._format_simple_response(api_data, api_name)
+            return
+        
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": self._natural_response_prompt(api_data, query, api_name)}],
+            temperature=0.7,
+            max_tokens=300,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def _natural_response_prompt(self, api_data: dict, query: str, api_name: str) -> str:
+        return f"""Convert this API response into a natural, conversational answer.
+
+User Question: {query}
+API Response: {serialization.dumps_str(api_data)}
+Data Source: {api_name}
+
+Generate a concise, friendly response (2-3 sentences max).
+Do not make up information. Only use data from the API response.
+If there's an error, explain it clearly."""
+    
     def _format_simple_response(self, data: dict, api_name: str) -> str:
         """Simple fallback response formatting"""
         if "error" in data:
             return f"I encountered an error: {data['error']}"
-        return f"Here's the data from {api_name}: {json.dumps(data, indent=2)}"
+        return f"Here's the data from {api_name}: {serialization.dumps_str(data, indent=True)}"
     
     def _extract_date_from_query(self, query: str) -> Optional[str]:
         """Extract date from natural language in the query"""
@@ -303,5 +389,5 @@ If there's an error, explain it clearly."""
         return None
 
 
-# Global LLM client instance
-llm_client = LLMClient()
+# Global LLM client instance (constructed on first use)
+llm_client: LLMClient = Lazy(LLMClient, "llm_client")
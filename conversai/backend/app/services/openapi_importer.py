@@ -0,0 +1,267 @@
+"""
+OpenAPI Importer - Turns OpenAPI 3 documents or APICreate arrays into registry entries
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from pydantic import ValidationError
+from app.api.schemas import APICreate
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+HTTP_METHODS = ("get", "post", "put", "delete")
+
+# Words that make poor intent keywords
+KEYWORD_STOPWORDS = {
+    "a", "an", "and", "by", "for", "from", "get", "in", "list", "of", "on", "or",
+    "post", "put", "delete", "the", "to", "with", "api", "v1", "v2", "v3", "id"
+}
+
+MAX_KEYWORDS = 10
+MAX_MAPPING_FIELDS = 10
+MAX_SCHEMA_DEPTH = 3
+
+
+class ImportValidationError(Exception):
+    """Raised when an import document can't be used; carries per-entry errors"""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} invalid entries")
+        self.errors = errors
+
+
+class OpenAPIImporter:
+    """Derive APICreate entries from an import document
+
+    Accepts either an OpenAPI 3 document (one entry per GET/POST/PUT/DELETE
+    operation) or a JSON array of APICreate objects. For OpenAPI operations,
+    parameters, intent keywords, a response mapping and API key auth are
+    derived from the spec. Everything is validated before anything is
+    returned, so a bad entry never leaves a partial import behind.
+    """
+
+    def parse(self, document: Any) -> List[APICreate]:
+        """Return validated entries, or raise ImportValidationError listing every invalid one"""
+        if isinstance(document, list):
+            candidates = [(f"[{index}]", item) for index, item in enumerate(document)]
+        elif isinstance(document, dict) and str(document.get("openapi", "")).startswith("3"):
+            candidates = self._from_openapi(document)
+        else:
+            raise ImportValidationError([{
+                "entry": None,
+                "error": "Expected an OpenAPI 3 document or a JSON array of APIs"
+            }])
+
+        entries: List[APICreate] = []
+        errors: List[Dict[str, Any]] = []
+        for locator, candidate in candidates:
+            if isinstance(candidate, Exception):
+                errors.append({"entry": locator, "error": f"Could not derive entry: {candidate}"})
+                continue
+            if not isinstance(candidate, dict):
+                errors.append({"entry": locator, "error": "Entry must be an object"})
+                continue
+            try:
+                entries.append(APICreate(**candidate))
+            except ValidationError as e:
+                errors.append({
+                    "entry": locator,
+                    "error": "; ".join(
+                        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+                    )
+                })
+
+        if errors:
+            raise ImportValidationError(errors)
+        if not entries:
+            raise ImportValidationError([{"entry": None, "error": "No APIs found in document"}])
+        return entries
+
+    def _from_openapi(self, spec: Dict[str, Any]) -> List[Tuple[str, Any]]:
+        """(locator, entry) per operation; the entry is the exception when derivation failed"""
+        info = spec.get("info") or {}
+        title = info.get("title") or "Imported API"
+        base_url = self._base_url(spec)
+        auth_config = self._auth_config(spec)
+
+        candidates = []
+        for path, path_item in (spec.get("paths") or {}).items():
+            if not isinstance(path_item, dict):
+                continue
+            shared_params = path_item.get("parameters") or []
+            for method in HTTP_METHODS:
+                operation = path_item.get(method)
+                if not isinstance(operation, dict):
+                    continue
+                locator = f"{method.upper()} {path}"
+                try:
+                    candidates.append((locator, self._operation_entry(
+                        spec, title, base_url, auth_config, path, method, operation, shared_params
+                    )))
+                except Exception as e:
+                    candidates.append((locator, e))
+                    logger.warning(f"Could not derive {locator}: {e}")
+        return candidates
+
+    def _operation_entry(
+        self,
+        spec: Dict[str, Any],
+        title: str,
+        base_url: str,
+        auth_config: Optional[Dict[str, Any]],
+        path: str,
+        method: str,
+        operation: Dict[str, Any],
+        shared_params: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        summary = operation.get("summary") or operation.get("operationId") or f"{method.upper()} {path}"
+        tags = operation.get("tags") or []
+
+        return {
+            "api_name": f"{title} - {summary}"[:255],
+            "description": operation.get("description") or summary,
+            "intent_keywords": self._keywords(tags, operation.get("operationId"), summary, path),
+            "category": (tags[0] if tags else title).lower()[:50],
+            "endpoint": base_url + path,
+            "method": method.upper(),
+            "auth_config": auth_config,
+            "parameters": self._parameters(spec, shared_params + (operation.get("parameters") or []), auth_config),
+            "response_mapping": self._response_mapping(spec, operation) or None,
+        }
+
+    def _base_url(self, spec: Dict[str, Any]) -> str:
+        servers = spec.get("servers") or [{}]
+        server = servers[0] if isinstance(servers[0], dict) else {}
+        url = server.get("url", "")
+        for name, variable in (server.get("variables") or {}).items():
+            url = url.replace(f"{{{name}}}", str(variable.get("default", "")))
+        return url.rstrip("/")
+
+    def _auth_config(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """API key auth from the first apiKey security scheme in query or header"""
+        schemes = (spec.get("components") or {}).get("securitySchemes") or {}
+        for scheme in schemes.values():
+            scheme = self._resolve(spec, scheme)
+            if scheme.get("type") == "apiKey" and scheme.get("in") in ("query", "header"):
+                return {"type": "api_key", "param_name": scheme.get("name"), "param_location": scheme["in"]}
+        return {"type": "none"}
+
+    def _parameters(
+        self,
+        spec: Dict[str, Any],
+        raw_params: List[Dict[str, Any]],
+        auth_config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Map OpenAPI parameters to the registry's {"required": [...], "optional": [...]} format"""
+        required: List[Dict[str, Any]] = []
+        optional: List[Dict[str, Any]] = []
+        seen = set()
+        # Operation-level parameters override path-level ones with the same name
+        for raw in reversed(raw_params):
+            param = self._resolve(spec, raw)
+            name, location = param.get("name"), param.get("in")
+            if not name or location not in ("query", "path") or name in seen:
+                continue
+            if name == auth_config.get("param_name"):
+                continue
+            seen.add(name)
+
+            schema = self._resolve(spec, param.get("schema") or {})
+            entry: Dict[str, Any] = {"name": name, "type": schema.get("type", "string")}
+            if param.get("description"):
+                entry["description"] = param["description"]
+            if location == "path":
+                entry["in_path"] = True
+            if "default" in schema:
+                entry["default"] = schema["default"]
+            if schema.get("enum"):
+                entry["allowed_values"] = schema["enum"]
+
+            if location == "path" or param.get("required"):
+                required.insert(0, entry)
+            else:
+                optional.insert(0, entry)
+        return {"required": required, "optional": optional}
+
+    def _keywords(self, tags: List[str], operation_id: Optional[str], summary: str, path: str) -> List[str]:
+        """Keyword candidates from tags, the operation ID, the summary and literal path segments"""
+        words: List[str] = []
+        for text in list(tags) + [operation_id or "", summary]:
+            # Split camelCase and snake_case identifiers
+            text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+            words.extend(re.findall(r"[a-z][a-z0-9]+", text.lower()))
+        for segment in path.split("/"):
+            if segment and not segment.startswith("{"):
+                words.extend(re.findall(r"[a-z][a-z0-9]+", segment.lower()))
+
+        keywords = []
+        for word in words:
+            if word not in KEYWORD_STOPWORDS and word not in keywords:
+                keywords.append(word)
+        return keywords[:MAX_KEYWORDS]
+
+    def _response_mapping(self, spec: Dict[str, Any], operation: Dict[str, Any]) -> Dict[str, str]:
+        """Scalar fields of the success response schema, as {field: "path.to[0].field"}"""
+        responses = operation.get("responses") or {}
+        response = responses.get("200") or responses.get("201") or responses.get("default")
+        if not response:
+            return {}
+        content = (self._resolve(spec, response).get("content") or {}).get("application/json") or {}
+        schema = content.get("schema")
+        if not schema:
+            return {}
+
+        mapping: Dict[str, str] = {}
+        self._collect_fields(spec, schema, "", mapping, 0, set())
+        return mapping
+
+    def _collect_fields(
+        self,
+        spec: Dict[str, Any],
+        schema: Dict[str, Any],
+        prefix: str,
+        mapping: Dict[str, str],
+        depth: int,
+        seen_refs: set
+    ):
+        if len(mapping) >= MAX_MAPPING_FIELDS or depth > MAX_SCHEMA_DEPTH:
+            return
+        ref = schema.get("$ref")
+        if ref:
+            if ref in seen_refs:
+                return
+            seen_refs = seen_refs | {ref}
+            schema = self._resolve(spec, schema)
+
+        if schema.get("type") == "array" or "items" in schema:
+            # Top-level arrays are wrapped as {"data": [...]} by the request handler
+            items_prefix = f"{prefix}[0]" if prefix else "data[0]"
+            self._collect_fields(spec, schema.get("items") or {}, items_prefix, mapping, depth + 1, seen_refs)
+            return
+
+        for name, child in (schema.get("properties") or {}).items():
+            path = f"{prefix}.{name}" if prefix else name
+            resolved = self._resolve(spec, child)
+            if resolved.get("type") in ("object", "array") or "properties" in resolved or "items" in resolved:
+                self._collect_fields(spec, child, path, mapping, depth + 1, seen_refs)
+            elif name not in mapping:
+                mapping[name] = path
+            if len(mapping) >= MAX_MAPPING_FIELDS:
+                return
+
+    def _resolve(self, spec: Dict[str, Any], node: Any) -> Dict[str, Any]:
+        """Follow a local "#/..." $ref (one level at a time, cycles stop at the caller)"""
+        if not isinstance(node, dict):
+            return {}
+        ref = node.get("$ref")
+        if not ref or not ref.startswith("#/"):
+            return node
+        target: Any = spec
+        for part in ref[2:].split("/"):
+            target = target.get(part.replace("~1", "/").replace("~0", "~")) if isinstance(target, dict) else None
+        return target if isinstance(target, dict) else {}
+
+
+# Global importer instance
+openapi_importer = OpenAPIImporter()
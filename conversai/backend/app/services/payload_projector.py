@@ -0,0 +1,320 @@
+"""
+Payload Projector - Reduces upstream JSON payloads to the fields we actually use
+"""
+from typing import Dict, Any, List, Optional, Union
+from cachetools import LRUCache
+from app.models.database import APIRegistry
+from app.core.config import settings
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+# Fields read by the category formatters in ResponseFormatter
+# "[*]" keeps every element of an array (up to the array limit).
+# None keeps the whole payload (e.g. CoinGecko's coin-keyed responses).
+CATEGORY_KEEP_PATHS: Dict[str, Optional[List[str]]] = {
+    "weather": [
+        "name", "main.temp", "main.feels_like", "main.humidity",
+        "weather[*].description", "wind.speed", "sys.country"
+    ],
+    "cryptocurrency": None,
+    "news": [
+        "articles[*].title", "articles[*].description", "articles[*].source.name",
+        "articles[*].url", "articles[*].publishedAt"
+    ],
+    "dictionary": [
+        "data[*].word", "data[*].phonetic", "data[*].meanings[*].partOfSpeech",
+        "data[*].meanings[*].definitions[*].definition", "data[*].meanings[*].definitions[*].example"
+    ],
+    "finance": ["base", "rates", "date"],
+    "entertainment": ["data[*].fact"],
+    "knowledge": ["title", "extract", "content_urls.desktop.page"],
+    "development": ["name", "description", "stargazers_count", "language", "html_url"],
+}
+
+# Top-level result lists whose emptiness marks a negative result (see
+# RequestHandler._is_negative_result); kept as [] when empty even if not on a keep-path
+RESULT_LIST_FIELDS = ("matches", "data", "articles", "results")
+
+WILDCARD = "*"
+
+PathToken = Union[str, int]
+
+
+class PayloadProjection:
+    """A compiled set of keep-paths applied to a JSON payload
+
+    Paths use the same syntax as response_mapping ("main.temp",
+    "weather[0].description") plus "[*]" for every array element. Every
+    array is cut to array_limit elements, whether kept whole or walked into.
+    """
+
+    def __init__(self, paths: Optional[List[str]], array_limit: int):
+        self.array_limit = array_limit
+        # Trie of path tokens; an empty dict marks "keep this whole subtree"
+        # None means no field selection (only array limits apply)
+        self.trie: Optional[Dict[PathToken, Any]] = None
+        if paths:
+            self.trie = {}
+            for path in paths:
+                self._add_path(path)
+
+    def apply(self, data: Any) -> Any:
+        """Return a compact copy of data containing only the kept fields"""
+        if self.trie is None or not isinstance(data, dict):
+            return self._limit(data)
+
+        projected = self._project(data, self.trie)
+        for field in RESULT_LIST_FIELDS:
+            if data.get(field) == [] and field not in projected:
+                projected[field] = []
+        # Underscore fields are our own metadata (e.g. _cached), never upstream data
+        for key, value in data.items():
+            if key.startswith("_"):
+                projected[key] = value
+
+        # If none of the paths matched, the upstream format probably changed;
+        # keep the (array-limited) payload rather than caching an empty one
+        if not any(not key.startswith("_") for key in projected):
+            logger.warning("Payload projection matched no fields, keeping full payload")
+            return self._limit(data)
+        return projected
+
+    def _add_path(self, path: str):
+        tokens = self.parse_path(path)
+        if not tokens:
+            return
+        node = self.trie
+        for token in tokens:
+            child = node.get(token)
+            if child is None:
+                child = node[token] = {}
+            elif not child:
+                # An ancestor is already kept whole
+                return
+            node = child
+        # Keep the whole subtree at the end of the path
+        node.clear()
+
+    @staticmethod
+    def parse_path(path: str) -> List[PathToken]:
+        """Split "data.items[0].name" into ["data", "items", 0, "name"]"""
+        tokens: List[PathToken] = []
+        for part in re.split(r'\.(?![^\[]*\])', path):
+            match = re.match(r'^(\w*)((?:\[(?:\d+|\*)?\])*)$', part)
+            if not match:
+                if part:
+                    tokens.append(part)
+                continue
+            key, indices = match.groups()
+            if key:
+                tokens.append(key)
+            for index in re.findall(r'\[(\d+|\*)?\]', indices):
+                tokens.append(int(index) if index.isdigit() else WILDCARD)
+        return tokens
+
+    def _project(self, data: Any, node: Dict[PathToken, Any]) -> Any:
+        if not node:
+            return self._limit(data)
+
+        if isinstance(data, dict):
+            result = {}
+            for token, child in node.items():
+                if isinstance(token, str) and token != WILDCARD and token in data:
+                    result[token] = self._project(data[token], child)
+            return result
+
+        if isinstance(data, list):
+            wildcard = node.get(WILDCARD)
+            indices = [token for token in node if isinstance(token, int)]
+            length = max([index + 1 for index in indices], default=0)
+            if wildcard is not None:
+                length = max(length, self.array_limit)
+            length = min(len(data), length)
+            result = []
+            for position in range(length):
+                child = node.get(position)
+                if wildcard is not None and position < self.array_limit:
+                    child = wildcard if child is None else self._merge(wildcard, child)
+                # Keep positions stable so "[2].name" still points at the right element
+                result.append(self._project(data[position], child) if child is not None else None)
+            while result and result[-1] is None:
+                result.pop()
+            return result
+
+        return data
+
+    def _merge(self, first: Dict[PathToken, Any], second: Dict[PathToken, Any]) -> Dict[PathToken, Any]:
+        if not first or not second:
+            return {}
+        merged = dict(first)
+        for token, child in second.items():
+            merged[token] = self._merge(merged[token], child) if token in merged else child
+        return merged
+
+    def _limit(self, data: Any) -> Any:
+        """Cut every array in data to array_limit elements"""
+        if isinstance(data, dict):
+            return {key: self._limit(value) for key, value in data.items()}
+        if isinstance(data, list):
+            return [self._limit(item) for item in data[:self.array_limit]]
+        return data
+
+    def child_node(self, node: Optional[Dict[PathToken, Any]], token: PathToken) -> Optional[Dict[PathToken, Any]]:
+        """Trie node for a child of node (None if the child is not kept)"""
+        if node is None:
+            return None
+        if not node:
+            # Inside a subtree kept whole: only array limits apply
+            return {} if not isinstance(token, int) or token < self.array_limit else None
+        if isinstance(token, int):
+            child = node.get(token)
+            wildcard = node.get(WILDCARD)
+            if wildcard is not None and token < self.array_limit:
+                child = wildcard if child is None else self._merge(wildcard, child)
+            return child
+        return node.get(token)
+
+    def streaming_builder(self) -> "StreamingProjectionBuilder":
+        """Builder that materializes only the kept subtrees from ijson parse events"""
+        return StreamingProjectionBuilder(self)
+
+
+class StreamingProjectionBuilder:
+    """Build a projected payload from (prefix, event, value) parse events
+
+    Used with ijson so that large upstream documents are projected while they
+    are parsed, without materializing the fields that are dropped. A top-level
+    array is treated as the "data" field, matching how list responses are
+    wrapped by the request handler.
+    """
+
+    def __init__(self, projection: PayloadProjection):
+        self.projection = projection
+        self.root_node = {} if projection.trie is None else projection.trie
+        # Frames of [container, trie node, pending key or next index]; container is
+        # None while inside a dropped subtree
+        self.stack: List[list] = []
+        self.result: Any = None
+        self.done = False
+
+    def feed(self, events) -> None:
+        for _, event, value in events:
+            if event == "map_key":
+                self.stack[-1][2] = value
+            elif event in ("start_map", "start_array"):
+                node = self._position_node()
+                if not self.stack and event == "start_array" and self.projection.trie is not None:
+                    # Top-level array: paths address it as "data[...]"
+                    node = self.projection.child_node(node, "data")
+                container = None
+                if node is not None:
+                    container = {} if event == "start_map" else []
+                elif event == "start_array" and self._at_result_list():
+                    # Dropped, but counted so an empty result list is still kept
+                    container = []
+                self.stack.append([container, node, None if event == "start_map" else 0])
+            elif event in ("end_map", "end_array"):
+                container, node, position = self.stack.pop()
+                if node is None and container is not None:
+                    if position == 0:
+                        self._attach([], {})
+                    continue
+                if isinstance(container, list):
+                    while container and container[-1] is None and node:
+                        container.pop()
+                self._attach(container, node)
+            else:
+                node = self._position_node()
+                self._attach(value, node)
+
+    def matched(self) -> bool:
+        """Whether any kept field was found"""
+        if isinstance(self.result, dict):
+            return bool(self.result) or self.projection.trie is None
+        return self.result is not None
+
+    def _at_result_list(self) -> bool:
+        """Whether the value starting now is one of the top-level RESULT_LIST_FIELDS"""
+        return (
+            len(self.stack) == 1 and isinstance(self.stack[0][0], dict)
+            and self.stack[0][2] in RESULT_LIST_FIELDS
+        )
+
+    def _position_node(self) -> Optional[Dict[PathToken, Any]]:
+        """Trie node for the value that starts at the current position"""
+        if not self.stack:
+            return self.root_node
+        container, node, position = self.stack[-1]
+        if container is None:
+            return None
+        return self.projection.child_node(node, position)
+
+    def _attach(self, value: Any, node: Optional[Dict[PathToken, Any]]):
+        if not self.stack:
+            self.result = value if node is not None else None
+            self.done = True
+            return
+        frame = self.stack[-1]
+        container = frame[0]
+        if isinstance(container, list):
+            position = frame[2]
+            frame[2] = position + 1
+            if container is not None and node is not None:
+                # Keep positions stable so "[2].name" still points at the right element
+                container.extend([None] * (position - len(container)))
+                container.append(value)
+        elif container is not None and node is not None:
+            container[frame[2]] = value
+
+
+class PayloadProjector:
+    """Build (and cache) the projection for each registered API"""
+
+    def __init__(self):
+        # Format: {(api_id, updated_at): PayloadProjection}
+        self.projections = LRUCache(maxsize=1000)
+
+    def for_api(self, api: APIRegistry) -> Optional[PayloadProjection]:
+        """
+        Projection driven by the API's response_mapping, its category formatter
+        and response_config ("keep_paths", "array_limit", "project": false to disable)
+        """
+        if not settings.PROJECTION_ENABLED:
+            return None
+
+        cache_key = (api.api_id, api.updated_at)
+        projection = self.projections.get(cache_key)
+        if projection is None:
+            projection = self._build(api)
+            self.projections[cache_key] = projection
+        return projection
+
+    def _build(self, api: APIRegistry) -> Optional[PayloadProjection]:
+        config = api.response_config or {}
+        if config.get("project") is False:
+            return None
+
+        array_limit = int(config.get("array_limit") or settings.PROJECTION_ARRAY_LIMIT)
+
+        category_paths = CATEGORY_KEEP_PATHS.get(api.category, [])
+        if category_paths is None:
+            # Formatter needs the whole payload
+            return PayloadProjection(None, array_limit)
+
+        paths = list(category_paths)
+        if api.response_mapping:
+            paths.extend(path for path in api.response_mapping.values() if isinstance(path, str))
+        paths.extend(config.get("keep_paths") or [])
+        if paths:
+            # Needed to detect empty results for negative caching
+            paths.append("resultSet.count")
+
+        # Without any known paths (e.g. custom APIs with no mapping) only array limits apply
+        return PayloadProjection(paths or None, array_limit)
+
+
+# Global projector instance
+payload_projector = PayloadProjector()
@@ -0,0 +1,223 @@
+"""
+Hot Key Prefetcher - Refreshes the most requested cache keys before they expire
+"""
+from typing import Dict, Any, List, Optional
+from collections import deque
+from cachetools import LRUCache
+from app.core.cache import create_cache_backend
+from app.core.config import settings
+from app.services.scheduler import priority_lane
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Length in seconds of each rate_limit window
+RATE_LIMIT_PERIODS = {
+    "requests_per_second": 1,
+    "requests_per_minute": 60,
+    "requests_per_hour": 3600,
+    "requests_per_day": 86400,
+    "requests_per_month": 2592000
+}
+
+
+class HotKeyPrefetcher:
+    """Learn the hottest cache keys from request counts and keep them warm
+
+    Every worker runs a prefetcher. With a shared cache backend (redis or
+    sqlite) they coordinate through leases stored in that backend: one
+    worker at a time refreshes a given key, and the per-API rate limit
+    share is spent by one worker per interval, not once per worker. The
+    others adopt the refreshed expiry instead of refreshing again.
+    PREFETCH_BUDGET_PER_MINUTE stays a per-worker cap.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+
+        # Request statistics per cache key, bounded so cold keys fall out
+        # Format: {cache_key: {"config", "category", "api_id", "rate_limit", "response_config", "projection", "score", "expires_at"}}
+        self.keys = LRUCache(maxsize=settings.PREFETCH_TRACKED_KEYS)
+
+        # Upstream calls made by this worker's prefetcher, for the global budget
+        self.recent_refreshes = deque()
+
+        # Refresh leases: "key:<cache_key>" (value: the refreshed entry's expiry,
+        # 0 while in progress) and "api:<api_id>" (held for the rate limit interval)
+        self.leases = create_cache_backend("prefetch_lease", default_ttl=settings.PREFETCH_LEAD_SECONDS, max_bytes=1024 * 1024)
+
+        self.refresh_count = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def record(
+        self,
+        cache_key: str,
+        request_config: Dict[str, Any],
+        category: str,
+        api_id: Optional[str],
+        rate_limit: Optional[Dict[str, Any]],
+        response_config: Optional[Dict[str, Any]] = None,
+        projection: Any = None
+    ):
+        """Count a cacheable request"""
+        entry = self.keys.get(cache_key)
+        if entry is None:
+            entry = {
+                "config": request_config,
+                "category": category,
+                "api_id": api_id,
+                "rate_limit": rate_limit,
+                "response_config": response_config,
+                "projection": projection,
+                "score": 0.0,
+                "expires_at": None
+            }
+            self.keys[cache_key] = entry
+        entry["score"] += 1
+
+    def record_store(self, cache_key: str, ttl: int):
+        """Note when a tracked key was (re)cached so it can be refreshed before expiry"""
+        entry = self.keys.get(cache_key)
+        if entry is not None:
+            entry["expires_at"] = time.time() + ttl
+
+    def hot_keys(self) -> List[str]:
+        """Keys requested often enough to be worth keeping warm, hottest first"""
+        candidates = [
+            (entry["score"], key) for key, entry in list(self.keys.items())
+            if entry["score"] >= settings.PREFETCH_MIN_SCORE
+        ]
+        candidates.sort(reverse=True)
+        return [key for _, key in candidates[:settings.PREFETCH_MAX_KEYS]]
+
+    def start(self):
+        """Start the background refresh loop"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+            logger.info("Hot key prefetcher started")
+
+    async def stop(self):
+        """Stop the background refresh loop"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.PREFETCH_INTERVAL_SECONDS)
+            try:
+                # Speculative refreshes never take capacity reserved for live chats
+                with priority_lane("batch"):
+                    await self.refresh_due()
+            except Exception as e:
+                logger.error(f"Prefetch cycle failed: {e}", exc_info=True)
+
+    async def refresh_due(self) -> int:
+        """Refresh hot keys that expire within the lead time. Returns refreshes made."""
+        now = time.time()
+        due = []
+        for key in self.hot_keys():
+            entry = self.keys.get(key)
+            if entry and entry["expires_at"] and entry["expires_at"] - now <= settings.PREFETCH_LEAD_SECONDS:
+                due.append((entry["expires_at"], key, entry))
+
+        # Soonest expiry first, so the budget goes where a miss is closest
+        due.sort(key=lambda item: item[0])
+
+        refreshed = 0
+        for _, key, entry in due:
+            if not self._within_budget(time.time()) or not await self._claim(key, entry):
+                continue
+
+            self._consume_budget(time.time())
+            try:
+                if await self.handler.refresh(
+                    key, entry["config"], entry["category"], entry["response_config"], entry["projection"]
+                ):
+                    refreshed += 1
+                    # Hold the key until it is due again, telling other workers the new expiry
+                    lease_ttl = max(entry["expires_at"] - time.time() - settings.PREFETCH_LEAD_SECONDS, 1)
+                    await self.leases.aset(f"key:{key}", entry["expires_at"], ttl=lease_ttl)
+                else:
+                    await self.leases.adelete(f"key:{key}")
+            except Exception as e:
+                logger.warning(f"Prefetch refresh failed for {key[:20]}...: {e}")
+                await self.leases.adelete(f"key:{key}")
+
+        self._decay()
+
+        if refreshed:
+            self.refresh_count += refreshed
+            logger.info(f"Prefetched {refreshed} hot keys")
+        return refreshed
+
+    def _within_budget(self, now: float) -> bool:
+        """Check this worker's upstream budget"""
+        while self.recent_refreshes and now - self.recent_refreshes[0] > 60:
+            self.recent_refreshes.popleft()
+        return len(self.recent_refreshes) < settings.PREFETCH_BUDGET_PER_MINUTE
+
+    def _consume_budget(self, now: float):
+        self.recent_refreshes.append(now)
+
+    async def _claim(self, key: str, entry: Dict[str, Any]) -> bool:
+        """Take the key's refresh lease, then the API's rate limit lease"""
+        key_lease = f"key:{key}"
+        if not await self.leases.run(self.leases.add, key_lease, 0, settings.PREFETCH_LEAD_SECONDS):
+            # Another worker is refreshing (or has refreshed) the key: follow its expiry
+            expires_at = await self.leases.aget(key_lease)
+            if expires_at:
+                entry["expires_at"] = expires_at
+            return False
+
+        api_id = entry["api_id"]
+        interval = self._min_interval(entry["rate_limit"])
+        if interval == float("inf"):
+            await self.leases.adelete(key_lease)
+            return False
+        if api_id and interval and not await self.leases.run(self.leases.add, f"api:{api_id}", 0, interval):
+            await self.leases.adelete(key_lease)
+            return False
+
+        return True
+
+    def _min_interval(self, rate_limit: Optional[Dict[str, Any]]) -> float:
+        """Minimum seconds between prefetches so they use at most a share of the API's rate limit"""
+        if not rate_limit:
+            return 0.0
+
+        interval = 0.0
+        for limit_name, period in RATE_LIMIT_PERIODS.items():
+            limit = rate_limit.get(limit_name)
+            try:
+                limit = float(limit)
+            except (TypeError, ValueError):
+                continue
+            if limit > 0:
+                allowed = limit * settings.PREFETCH_RATE_LIMIT_SHARE
+                interval = max(interval, period / allowed if allowed > 0 else float("inf"))
+        return interval
+
+    def _decay(self):
+        """Age request counts so the hot set follows current traffic"""
+        for key, entry in list(self.keys.items()):
+            entry["score"] *= settings.PREFETCH_SCORE_DECAY
+            if entry["score"] < 0.01:
+                self.keys.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prefetcher statistics"""
+        return {
+            "running": self.task is not None,
+            "tracked_keys": len(self.keys),
+            "hot_keys": len(self.hot_keys()),
+            "refreshes": self.refresh_count,
+            "refreshes_last_minute": len(self.recent_refreshes)
+        }
@@ -1,10 +1,17 @@
 """
 Query Processor - Handles user input, context management, and intent extraction
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from app.services.llm_service import llm_client
+from app.services.context_builder import context_builder
+from app.services.intent_batcher import intent_batcher
+from app.core.config import settings
 from app.models.database import Message, Conversation
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
+from datetime import datetime
+import base64
+import binascii
 import logging
 import re
 
@@ -18,10 +25,15 @@ class QueryProcessor:
         self.db = db
         self.llm = llm_client
     
-    def process_query(self, user_input: str, session_id: str) -> Dict[str, Any]:
+    async def process_query(
+        self,
+        user_input: str,
+        session_id: str,
+        context: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
         """
         Process a user query:
-        1. Retrieve conversation context
+        1. Retrieve conversation context (unless the caller already has it)
         2. Sanitize input
         3. Extract intent using LLM
         4. Return structured intent object
@@ -30,10 +42,12 @@ class QueryProcessor:
         sanitized_input = self.sanitize_input(user_input)
         
         # Get conversation context
-        context = self.get_conversation_context(session_id)
+        if context is None:
+            context = await self.get_conversation_context(session_id)
         
-        # Extract intent using LLM
-        intent_data = self.llm.extract_intent(sanitized_input, context)
+        # Extract intent using LLM (off the event loop, in the caller's priority lane,
+        # batched with concurrent queries when INTENT_BATCH_ENABLED)
+        intent_data = await intent_batcher.classify(sanitized_input, context)
         
         # Save user message
         self.save_message(session_id, "user", sanitized_input, intent_data)
@@ -60,33 +74,69 @@ class QueryProcessor:
         
         return sanitized.strip()
     
-    def get_conversation_context(self, session_id: str, limit: int = 5) -> List[Dict[str, str]]:
+    async def get_conversation_context(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
         """
-        Retrieve recent conversation context for better intent understanding
+        Retrieve conversation context for better intent understanding:
+        the session's rolling summary plus the last few messages, bounded
+        by CONTEXT_TOKEN_BUDGET
         """
         try:
-            messages = self.db.query(Message).filter(
-                Message.session_id == session_id
-            ).order_by(
-                Message.created_at.desc()
-            ).limit(limit).all()
+            messages, _ = self.get_history_page(session_id, limit or settings.CONTEXT_RECENT_MESSAGES)
             
-            # Reverse to get chronological order
-            messages = list(reversed(messages))
+            def load_history():
+                history, _ = self.get_history_page(
+                    session_id, settings.CONTEXT_SUMMARY_TURNS * 2, include_metadata=True
+                )
+                return history
             
-            context = []
-            for msg in messages:
-                context.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
-            
-            return context
+            return await context_builder.build(session_id, messages, load_history)
             
         except Exception as e:
             logger.error(f"Error retrieving context: {e}")
             return []
     
+    def get_history_page(
+        self,
+        session_id: str,
+        limit: int,
+        before: Optional[str] = None,
+        include_metadata: bool = False
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Get one page of a session's messages in chronological order
+        
+        Pages are read newest first by keyset on (created_at, message_id), so
+        every page costs one index range scan whatever the session length.
+        Returns the messages and a cursor for the next (older) page, if any.
+        """
+        columns = [Message.message_id, Message.role, Message.content, Message.created_at]
+        if include_metadata:
+            columns.append(Message.message_metadata)
+        
+        query = self.db.query(*columns).filter(Message.session_id == session_id)
+        if before:
+            created_at, message_id = decode_history_cursor(before)
+            query = query.filter(or_(
+                Message.created_at < created_at,
+                and_(Message.created_at == created_at, Message.message_id < message_id)
+            ))
+        
+        # One extra row tells whether an older page exists
+        rows = query.order_by(
+            Message.created_at.desc(),
+            Message.message_id.desc()
+        ).limit(limit + 1).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            oldest = rows[-1]
+            next_cursor = encode_history_cursor(oldest.created_at, oldest.message_id)
+        
+        # Reverse for chronological order
+        messages = [dict(row._mapping) for row in reversed(rows)]
+        return messages, next_cursor
+    
     def save_message(self, session_id: str, role: str, content: str, metadata: Optional[Dict] = None):
         """Save a message to the database"""
         try:
@@ -141,3 +191,19 @@ class QueryProcessor:
         except Exception as e:
             logger.error(f"Error ending session: {e}")
             self.db.rollback()
+
+
+def encode_history_cursor(created_at: datetime, message_id: str) -> str:
+    """Opaque cursor pointing just before the given message"""
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Parse a cursor from encode_history_cursor (ValueError if malformed)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), message_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid history cursor")
@@ -0,0 +1,148 @@
+"""
+Registry Snapshot - Pre-serialized, versioned API registry listings
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from app.api.schemas import APIResponse
+from app.core.config import settings
+from app.core import serialization
+from app.models.database import APIRegistry
+import hashlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Fields that can be requested with ?fields=
+LISTING_FIELDS = tuple(APIResponse.model_fields)
+
+# Snapshots kept at once (one per user and include_system), least recently used dropped first
+MAX_SNAPSHOTS = 256
+
+SnapshotKey = Tuple[bool, str]
+
+
+class RegistrySnapshot:
+    """Serve GET /apis/list from JSON bytes built once per registry version
+
+    The snapshot is rebuilt after local writes (invalidate()) and when the
+    registry fingerprint (row count and latest updated_at) changes, which
+    catches writes made by other workers. The fingerprint query runs at
+    most every REGISTRY_SNAPSHOT_REVALIDATE_SECONDS; in between, a listing
+    costs a dictionary lookup.
+
+    Each caller sees system APIs plus their own, so snapshots are kept per
+    (include_system, user_id) and bounded to MAX_SNAPSHOTS.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Bumped by invalidate(); part of every snapshot's identity
+        self.version = 0
+        # Format: {(include_system, user_id): {"version", "fingerprint", "checked_at", "rows"}}
+        self.snapshots: "OrderedDict[SnapshotKey, Dict[str, Any]]" = OrderedDict()
+        # Format: {(include_system, user_id, fields): (body, etag)}
+        self.bodies: Dict[Tuple[bool, str, Optional[Tuple[str, ...]]], Tuple[bytes, str]] = {}
+
+    def get(
+        self,
+        db: Session,
+        user_id: str,
+        include_system: bool = True,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[bytes, str]:
+        """Return the serialized listing visible to user_id and its strong ETag"""
+        field_key = tuple(fields) if fields else None
+        key = (include_system, user_id)
+        snapshot = self._current(db, key)
+
+        cache_key = (include_system, user_id, field_key)
+        with self.lock:
+            cached = self.bodies.get(cache_key)
+            if cached is not None and self.snapshots.get(key) is snapshot:
+                return cached
+
+        rows = snapshot["rows"]
+        if field_key:
+            rows = [{field: row.get(field) for field in field_key} for row in rows]
+        body = serialization.dumps(rows)
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+
+        with self.lock:
+            if self.snapshots.get(key) is snapshot:
+                self.bodies[cache_key] = (body, etag)
+        return body, etag
+
+    def invalidate(self):
+        """Drop all snapshots after a registry write"""
+        with self.lock:
+            self.version += 1
+            self.snapshots.clear()
+            self.bodies.clear()
+
+    def _current(self, db: Session, key: SnapshotKey) -> Dict[str, Any]:
+        now = time.time()
+        with self.lock:
+            snapshot = self.snapshots.get(key)
+            if snapshot is not None:
+                self.snapshots.move_to_end(key)
+            version = self.version
+        if snapshot is not None and now - snapshot["checked_at"] < settings.REGISTRY_SNAPSHOT_REVALIDATE_SECONDS:
+            return snapshot
+
+        fingerprint = self._fingerprint(db)
+        if snapshot is not None and snapshot["fingerprint"] == fingerprint:
+            snapshot["checked_at"] = now
+            return snapshot
+
+        snapshot = {
+            "version": version,
+            "fingerprint": fingerprint,
+            "checked_at": now,
+            "rows": self._load_rows(db, *key)
+        }
+        with self.lock:
+            # A write during the rebuild bumps the version; don't keep a stale snapshot
+            if self.version == version:
+                self._drop_bodies(key)
+                self.snapshots[key] = snapshot
+                self.snapshots.move_to_end(key)
+                while len(self.snapshots) > MAX_SNAPSHOTS:
+                    oldest, _ = self.snapshots.popitem(last=False)
+                    self._drop_bodies(oldest)
+        logger.debug(f"Rebuilt API registry snapshot for {key[1]} ({len(snapshot['rows'])} APIs)")
+        return snapshot
+
+    def _drop_bodies(self, key: SnapshotKey):
+        """Forget serialized bodies of one snapshot (caller holds the lock)"""
+        stale = [body_key for body_key in self.bodies if body_key[:2] == key]
+        for body_key in stale:
+            del self.bodies[body_key]
+
+    def _fingerprint(self, db: Session) -> Tuple[int, Optional[str]]:
+        """Cheap change detector: row count and latest update over the whole table"""
+        count, last_updated = db.query(
+            func.count(APIRegistry.api_id), func.max(APIRegistry.updated_at)
+        ).one()
+        return count, str(last_updated) if last_updated else None
+
+    def _load_rows(self, db: Session, include_system: bool, user_id: str) -> List[Dict[str, Any]]:
+        query = db.query(APIRegistry).filter(APIRegistry.is_active == True)
+        if include_system:
+            query = query.filter(or_(APIRegistry.is_system == True, APIRegistry.user_id == user_id))
+        else:
+            query = query.filter(and_(APIRegistry.user_id == user_id, APIRegistry.is_system == False))
+
+        # Validated once per snapshot rather than once per request
+        return [
+            APIResponse.model_validate(api).model_dump(mode="json")
+            for api in query.all()
+        ]
+
+
+# Global registry snapshot instance
+registry_snapshot = RegistrySnapshot()
@@ -0,0 +1,217 @@
+"""
+Request Plans - Registered APIs compiled once into flat request-building steps
+"""
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from cachetools import LRUCache
+from urllib.parse import quote
+from app.models.database import APIRegistry
+from datetime import datetime, timedelta
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+Entities = Dict[str, Any]
+Resolver = Callable[[Entities], Optional[Any]]
+
+DATE_PARAMS = ("d", "date", "day")
+SPORT_PARAMS = ("s", "sport", "league")
+
+# Fallbacks for parameter names that rarely match an entity name directly
+COMMON_MAPPINGS: Dict[str, Resolver] = {
+    "q": lambda entities: entities.get("location") or entities.get("keyword"),
+    "city": lambda entities: entities.get("location"),
+    "ids": lambda entities: entities.get("coin"),
+    "word": lambda entities: entities.get("word") or entities.get("keyword"),
+    "base": lambda entities: entities.get("from_currency"),
+    "title": lambda entities: entities.get("keyword"),
+    "owner": lambda entities: entities.get("owner"),
+    "repo": lambda entities: entities.get("repo"),
+    "t": lambda entities: _team_name(entities.get("keyword") or entities.get("team")),  # Sports team name
+}
+
+TEAM_NAME_NOISE = (" team", " fc", " club", " squad")
+
+PLACEHOLDER_PATTERN = re.compile(r"\{([^{}]+)\}")
+
+
+def _resolve_date(entities: Entities) -> Optional[Any]:
+    """Convert natural language dates to YYYY-MM-DD format"""
+    date_value = entities.get("date") or entities.get("day")
+    if not date_value:
+        # Don't auto-generate a date, so team-based queries return the latest matches
+        return None
+
+    date_str = str(date_value).lower()
+    if date_str == "today":
+        return datetime.now().strftime("%Y-%m-%d")
+    if date_str == "yesterday":
+        return (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    if date_str == "tomorrow":
+        return (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    return date_value
+
+
+def _resolve_sport(entities: Entities) -> Any:
+    sport = entities.get("sport") or entities.get("league") or entities.get("keyword")
+    if not sport:
+        # Default to Soccer for sports queries
+        return "Soccer"
+
+    # If keyword contains sport name, extract it
+    sport_str = str(sport).lower()
+    if "soccer" in sport_str or "football" in sport_str:
+        return "Soccer"
+    if "basketball" in sport_str:
+        return "Basketball"
+    if "baseball" in sport_str:
+        return "Baseball"
+    if "hockey" in sport_str:
+        return "Ice Hockey"
+    return sport
+
+
+def _team_name(value: Optional[Any]) -> Optional[Any]:
+    """Remove common words like "team", "fc", "club" from a team name"""
+    if not value:
+        return value
+    value_str = str(value)
+    for word in TEAM_NAME_NOISE:
+        value_str = value_str.replace(word, "").strip()
+    return value_str
+
+
+def compile_resolver(param_name: str) -> Resolver:
+    """
+    Resolver for one parameter: date parameters first, then a direct entity
+    match, then the sport and common mappings
+    """
+    if param_name in DATE_PARAMS:
+        return _resolve_date
+
+    if param_name in SPORT_PARAMS:
+        fallback = _resolve_sport
+    elif param_name in COMMON_MAPPINGS:
+        fallback = COMMON_MAPPINGS[param_name]
+    else:
+        def fallback(entities: Entities) -> None:
+            logger.warning(f"No mapping found for parameter '{param_name}' in entities: {entities}")
+            return None
+
+    def resolve(entities: Entities) -> Optional[Any]:
+        if param_name in entities:
+            return entities[param_name]
+        return fallback(entities)
+
+    return resolve
+
+
+class RequestPlan:
+    """An API's request, precompiled
+
+    Holds the auth injection (where the key goes), the endpoint split into
+    literal segments and path parameter slots, and one step per query
+    parameter with its resolver, so building a request is a flat loop.
+    """
+
+    def __init__(self, api: APIRegistry):
+        self.api_id = api.api_id
+        self.method = api.method or "GET"
+
+        # (location, name) of the API key, or None
+        self.auth: Optional[Tuple[str, str]] = None
+        auth_config = api.auth_config or {}
+        if auth_config.get("type") == "api_key":
+            self.auth = (auth_config.get("param_location", "query"), auth_config.get("param_name"))
+
+        parameters = api.parameters or {}
+        path_params: Dict[str, Resolver] = {}
+        # Format: [(name, resolver, required, default, has_default)]
+        self.query_steps: List[Tuple[str, Resolver, bool, Any, bool]] = []
+        for param in parameters.get("required", []):
+            if param.get("in_path"):
+                path_params[param["name"]] = compile_resolver(param["name"])
+            else:
+                self.query_steps.append((param["name"], compile_resolver(param["name"]), True, param.get("default"), False))
+        for param in parameters.get("optional", []):
+            self.query_steps.append((param["name"], compile_resolver(param["name"]), False, param.get("default"), "default" in param))
+
+        # Endpoint as alternating literals and (name, resolver) slots; placeholders
+        # without a required path parameter stay in the URL as written
+        self.segments: List[Any] = []
+        position = 0
+        endpoint = api.endpoint or ""
+        for match in PLACEHOLDER_PATTERN.finditer(endpoint):
+            name = match.group(1)
+            if name not in path_params:
+                continue
+            self.segments.append(endpoint[position:match.start()])
+            self.segments.append((name, path_params[name]))
+            position = match.end()
+        self.segments.append(endpoint[position:])
+
+    def build(self, entities: Entities, api_key: Optional[str] = None) -> Dict[str, Any]:
+        """Request config (url, method, headers, params, data) for the given entities"""
+        headers: Dict[str, Any] = {}
+        params: Dict[str, Any] = {}
+
+        if self.auth and api_key:
+            location, name = self.auth
+            if location == "header":
+                headers[name] = api_key
+            else:
+                params[name] = api_key
+
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+                continue
+            name, resolve = segment
+            value = resolve(entities)
+            if not value:
+                logger.warning(f"No value extracted for required path parameter '{name}'")
+                parts.append(f"{{{name}}}")
+                continue
+            # For dictionary API, handle multi-word terms by taking first word
+            if name == "word" and " " in str(value):
+                value = str(value).split()[0]
+            parts.append(quote(str(value), safe=""))
+
+        for name, resolve, required, default, has_default in self.query_steps:
+            value = resolve(entities)
+            if value:
+                params[name] = value
+            elif has_default:
+                params[name] = default
+            elif required and not default:
+                logger.warning(f"Missing required parameter: {name}")
+
+        return {
+            "url": "".join(parts),
+            "method": self.method,
+            "headers": headers,
+            "params": params,
+            "data": {}
+        }
+
+
+class RequestPlanner:
+    """Compile (and cache) the request plan for each registered API"""
+
+    def __init__(self):
+        # Format: {(api_id, updated_at): RequestPlan}
+        self.plans = LRUCache(maxsize=1000)
+
+    def for_api(self, api: APIRegistry) -> RequestPlan:
+        cache_key = (api.api_id, api.updated_at)
+        plan = self.plans.get(cache_key)
+        if plan is None:
+            plan = RequestPlan(api)
+            self.plans[cache_key] = plan
+        return plan
+
+
+# Global request planner instance
+request_planner = RequestPlanner()
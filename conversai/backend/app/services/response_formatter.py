@@ -1,10 +1,16 @@
 """
 Response Formatter - Formats API responses into natural language
 """
-from typing import Dict, Any, Optional
+from typing import AsyncIterator, Dict, Any, Optional
 from app.services.llm_service import llm_client
 from app.models.database import APIRegistry
-import json
+from app.core.cache import create_cache_backend
+from app.core.config import settings
+from app.core import serialization
+from app.core.lazy import Lazy
+from app.services.scheduler import llm_scheduler, priority_lane
+import asyncio
+import hashlib
 import logging
 import re
 from datetime import datetime
@@ -12,12 +18,30 @@ from datetime import datetime
 logger = logging.getLogger(__name__)
 
 
+# Failure modes whose explanations are pre-generated when an API is registered
+# Format: {error_class: (status_code, error_message)}
+COMMON_ERROR_MODES = {
+    "timeout": (None, "Request timed out"),
+    "401": (401, "API authentication failed. Please check your API key."),
+    "404": (404, "Resource not found. Please check your input."),
+    "429": (429, "Rate limit exceeded. Please try again in a few moments."),
+}
+
+
 class ResponseFormatter:
     """Format API responses into natural, conversational language"""
     
     def __init__(self):
         self.llm = llm_client
         self.templates = self._load_templates()
+        
+        # Natural-language error explanations
+        # Format: {"api_id:error_class": explanation}
+        self.error_explanations = create_cache_backend(
+            "error_explanation",
+            default_ttl=settings.CACHE_TTL_ERROR_EXPLANATION,
+            max_bytes=2 * 1024 * 1024
+        )
     
     def _load_templates(self) -> Dict[str, str]:
         """Load response templates for common APIs"""
@@ -54,26 +78,17 @@ class ResponseFormatter:
         """
         # Handle errors
         if "error" in api_data:
-            return self._format_error(api_data, api)
+            return await self._format_error(api_data, api)
         
-        # Check if API returned empty results (like empty matches array)
-        if isinstance(api_data, dict):
-            # Check for empty arrays in common result fields
-            if "matches" in api_data and isinstance(api_data["matches"], list) and len(api_data["matches"]) == 0:
-                logger.info(f"Empty results detected for {api.api_name}")
-                return "I couldn't find any matches for your query. The API returned no results. This could mean there are no matches scheduled for the specified date or criteria."
-            
-            # Check for zero count
-            if "resultSet" in api_data and isinstance(api_data["resultSet"], dict):
-                if api_data["resultSet"].get("count", 0) == 0:
-                    logger.info(f"Zero count detected for {api.api_name}")
-                    return "No results found for your query. Try adjusting your search criteria or checking a different date."
+        empty_message = self._empty_result_message(api_data, api)
+        if empty_message:
+            return empty_message
         
         # Prioritize LLM-based formatting for natural responses
         if use_llm and self.llm.client:
             try:
                 logger.info(f"Attempting LLM formatting for {api.api_name}")
-                formatted = self.llm.generate_natural_response(api_data, query, api.api_name)
+                formatted = await llm_scheduler.call(self.llm.generate_natural_response, api_data, query, api.api_name)
                 return self._add_metadata(formatted, api, api_data)
             except Exception as e:
                 logger.error(f"LLM formatting failed: {e}", exc_info=True)
@@ -88,7 +103,7 @@ class ResponseFormatter:
                     return self._add_metadata(formatted, api, api_data)
             except Exception as e:
                 logger.error(f"Template formatting failed for {api.api_name}: {e}", exc_info=True)
-                logger.error(f"API data: {json.dumps(api_data, indent=2, default=str)}")
+                logger.error(f"API data: {serialization.dumps_str(api_data, indent=True)}")
         
         # Last resort: category-based formatting
         try:
@@ -98,6 +113,75 @@ class ResponseFormatter:
             logger.error(f"Category formatting failed: {e}", exc_info=True)
             return f"Error formatting response: {str(e)}"
     
+    async def stream_response(
+        self,
+        api_data: Dict[str, Any],
+        api: APIRegistry,
+        query: str
+    ) -> AsyncIterator[str]:
+        """
+        Like format_response, but yields the LLM's answer piece by piece as
+        it is generated, then the source footer. Errors, empty results and
+        non-LLM formatting are yielded as a single piece.
+        """
+        if "error" in api_data or not self.llm.client or self._empty_result_message(api_data, api):
+            yield await self.format_response(api_data, api, query)
+            return
+        
+        # The SDK stream is blocking; pump it from a worker thread into the loop
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        
+        def produce():
+            try:
+                for piece in self.llm.stream_natural_response(api_data, query, api.api_name):
+                    loop.call_soon_threadsafe(queue.put_nowait, piece)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+        
+        pieces = []
+        failed = False
+        async with llm_scheduler.slot():
+            producer = loop.run_in_executor(None, produce)
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"LLM streaming failed: {item}")
+                    failed = True
+                    continue
+                pieces.append(item)
+                yield item
+            await producer
+        
+        if failed and not pieces:
+            yield await self.format_response(api_data, api, query, use_llm=False)
+            return
+        
+        text = "".join(pieces)
+        yield self._add_metadata(text, api, api_data)[len(text):]
+    
+    def _empty_result_message(self, api_data: Dict[str, Any], api: APIRegistry) -> Optional[str]:
+        """Message for an API response with no results (like an empty matches array), if it is one"""
+        if not isinstance(api_data, dict):
+            return None
+        
+        # Check for empty arrays in common result fields
+        if "matches" in api_data and isinstance(api_data["matches"], list) and len(api_data["matches"]) == 0:
+            logger.info(f"Empty results detected for {api.api_name}")
+            return "I couldn't find any matches for your query. The API returned no results. This could mean there are no matches scheduled for the specified date or criteria."
+        
+        # Check for zero count
+        if "resultSet" in api_data and isinstance(api_data["resultSet"], dict):
+            if api_data["resultSet"].get("count", 0) == 0:
+                logger.info(f"Zero count detected for {api.api_name}")
+                return "No results found for your query. Try adjusting your search criteria or checking a different date."
+        return None
+    
     def _apply_template(self, api: APIRegistry, data: Dict[str, Any]) -> Optional[str]:
         """Apply response template with data mapping"""
         if not api.response_mapping:
@@ -108,7 +192,7 @@ class ResponseFormatter:
             values = {}
             logger.info(f"Extracting values from data for {api.api_name}")
             logger.info(f"Response mapping: {api.response_mapping}")
-            logger.info(f"Data structure: {json.dumps(data, indent=2, default=str)[:1000]}")
+            logger.info(f"Data structure: {serialization.dumps_str(data)[:1000]}")
             
             for key, path in api.response_mapping.items():
                 value = self._extract_value_by_path(data, path)
@@ -190,7 +274,7 @@ class ResponseFormatter:
             return f"The weather in {city} is {condition} with a temperature of {temp}°C. Humidity is {humidity}%."
         except Exception as e:
             logger.error(f"Weather formatting error: {e}")
-            return f"Weather data: {json.dumps(data, indent=2)}"
+            return f"Weather data: {serialization.dumps_str(data, indent=True)}"
     
     def _format_crypto(self, data: Dict) -> str:
         """Format cryptocurrency data"""
@@ -203,7 +287,7 @@ class ResponseFormatter:
             return f"{coin.title()} is currently trading at ${price:,.2f} USD. 24-hour change: {change:.2f}%."
         except Exception as e:
             logger.error(f"Crypto formatting error: {e}")
-            return f"Cryptocurrency data: {json.dumps(data, indent=2)}"
+            return f"Cryptocurrency data: {serialization.dumps_str(data, indent=True)}"
     
     def _format_news(self, data: Dict) -> str:
         """Format news data"""
@@ -222,7 +306,7 @@ class ResponseFormatter:
             return formatted
         except Exception as e:
             logger.error(f"News formatting error: {e}")
-            return f"News data: {json.dumps(data, indent=2)}"
+            return f"News data: {serialization.dumps_str(data, indent=True)}"
     
     def _format_dictionary(self, data: Dict) -> str:
         """Format dictionary data"""
@@ -247,10 +331,10 @@ class ResponseFormatter:
                             result += f"\n\nExample: {example}"
                         return result
             
-            return f"Definition: {json.dumps(data, indent=2)}"
+            return f"Definition: {serialization.dumps_str(data, indent=True)}"
         except Exception as e:
             logger.error(f"Dictionary formatting error: {e}")
-            return f"Dictionary data: {json.dumps(data, indent=2)}"
+            return f"Dictionary data: {serialization.dumps_str(data, indent=True)}"
     
     def _format_exchange(self, data: Dict) -> str:
         """Format exchange rate data"""
@@ -269,17 +353,17 @@ class ResponseFormatter:
             return formatted
         except Exception as e:
             logger.error(f"Exchange formatting error: {e}")
-            return f"Exchange rate data: {json.dumps(data, indent=2)}"
+            return f"Exchange rate data: {serialization.dumps_str(data, indent=True)}"
     
     def _format_fact(self, data: Dict) -> str:
         """Format fact data"""
         try:
             if isinstance(data, list) and len(data) > 0:
                 return f"Here's an interesting fact: {data[0].get('fact', '')}"
-            return f"Fact: {json.dumps(data)}"
+            return f"Fact: {serialization.dumps_str(data)}"
         except Exception as e:
             logger.error(f"Fact formatting error: {e}")
-            return f"Fact data: {json.dumps(data, indent=2)}"
+            return f"Fact data: {serialization.dumps_str(data, indent=True)}"
     
     def _format_wikipedia(self, data: Dict) -> str:
         """Format Wikipedia data"""
@@ -291,7 +375,7 @@ class ResponseFormatter:
             return f"**{title}**\n\n{extract}\n\nRead more: {url}"
         except Exception as e:
             logger.error(f"Wikipedia formatting error: {e}")
-            return f"Wikipedia data: {json.dumps(data, indent=2)}"
+            return f"Wikipedia data: {serialization.dumps_str(data, indent=True)}"
     
     def _format_github(self, data: Dict) -> str:
         """Format GitHub repository data"""
@@ -305,31 +389,65 @@ class ResponseFormatter:
             return f"**{name}**\n{description}\n\n⭐ Stars: {stars:,} | Language: {language}\n{url}"
         except Exception as e:
             logger.error(f"GitHub formatting error: {e}")
-            return f"GitHub data: {json.dumps(data, indent=2)}"
+            return f"GitHub data: {serialization.dumps_str(data, indent=True)}"
     
     def _format_generic(self, data: Dict, api: APIRegistry) -> str:
         """Generic formatting for unknown categories"""
-        return f"Data from {api.api_name}:\n\n```json\n{json.dumps(data, indent=2)}\n```"
+        return f"Data from {api.api_name}:\n\n```json\n{serialization.dumps_str(data, indent=True)}\n```"
     
-    def _format_error(self, error_data: Dict, api: APIRegistry) -> str:
-        """Format error messages using LLM for natural responses"""
+    async def _format_error(self, error_data: Dict, api: APIRegistry) -> str:
+        """Format error messages, reusing cached LLM explanations where possible"""
         error_msg = error_data.get("error", "Unknown error")
         status_code = error_data.get("status_code")
         
-        # Try to generate a natural error response using LLM
+        # Serve a cached explanation for this API and failure mode
+        error_class = self._error_class(error_data)
+        cache_key = f"{api.api_id}:{error_class}"
+        cached_explanation = await self.error_explanations.aget(cache_key)
+        if cached_explanation:
+            logger.info(f"Error explanation cache hit for {api.api_name}: {error_class}")
+            return cached_explanation
+        
+        # Novel error: generate a natural error response using LLM
+        natural_response = None
         if self.llm.client:
-            try:
-                logger.info(f"Generating natural error message for {api.api_name}")
-                
-                # Create context for LLM
-                error_context = {
-                    "api_name": api.api_name,
-                    "error_message": error_msg,
-                    "status_code": status_code,
-                    "api_description": api.description
-                }
-                
-                prompt = f"""The user tried to query the {api.api_name} API but encountered an error.
+            natural_response = await llm_scheduler.call(self._generate_error_explanation, api, error_msg, status_code)
+        if natural_response:
+            await self.error_explanations.aset(cache_key, natural_response)
+            return natural_response
+        
+        # Fallback: Check for custom error messages in API config
+        if api.error_messages and status_code:
+            custom_msg = api.error_messages.get(str(status_code))
+            if custom_msg:
+                return f"❌ {custom_msg}"
+        
+        # Last resort: simple error message
+        return f"❌ I encountered an error while fetching data: {error_msg}"
+    
+    def _error_class(self, error_data: Dict) -> str:
+        """Classify an error by HTTP status code, or by failure status and message for transport errors"""
+        status_code = error_data.get("status_code")
+        if status_code:
+            return str(status_code)
+        # Unrelated transport failures share a status ("error", "failed"), so the message tells them apart
+        digest = hashlib.md5(str(error_data.get("error", "")).encode()).hexdigest()[:12]
+        return f"{error_data.get('status') or 'unknown'}:{digest}"
+    
+    def _generate_error_explanation(
+        self,
+        api: APIRegistry,
+        error_msg: str,
+        status_code: Optional[int]
+    ) -> Optional[str]:
+        """Generate a friendly error explanation using LLM (None if unavailable)"""
+        if not self.llm.client:
+            return None
+        
+        try:
+            logger.info(f"Generating natural error message for {api.api_name}")
+            
+            prompt = f"""The user tried to query the {api.api_name} API but encountered an error.
                 
 Error Details:
 - API: {api.api_name} ({api.description})
@@ -349,31 +467,44 @@ IMPORTANT RULES:
 - DO use natural, conversational language like you're talking to a friend
 - DO give simple, user-friendly query examples in quotes"""
 
-                response = self.llm.client.chat.completions.create(
-                    model=self.llm.model,
-                    messages=[
-                        {"role": "system", "content": "You are a helpful assistant that explains API errors in a friendly, conversational way."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.7,
-                    max_tokens=200
-                )
-                
-                natural_response = response.choices[0].message.content.strip()
-                logger.info(f"Generated natural error message: {natural_response}")
-                return natural_response
-                
-            except Exception as e:
-                logger.error(f"LLM error formatting failed: {e}", exc_info=True)
-        
-        # Fallback: Check for custom error messages in API config
-        if api.error_messages and status_code:
-            custom_msg = api.error_messages.get(str(status_code))
-            if custom_msg:
-                return f"❌ {custom_msg}"
+            response = self.llm.client.chat.completions.create(
+                model=self.llm.model,
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant that explains API errors in a friendly, conversational way."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=200
+            )
+            
+            natural_response = response.choices[0].message.content.strip()
+            logger.info(f"Generated natural error message: {natural_response}")
+            return natural_response
+            
+        except Exception as e:
+            logger.error(f"LLM error formatting failed: {e}", exc_info=True)
+            return None
+    
+    async def warm_error_explanations(self, api: APIRegistry):
+        """Pre-generate explanations for common failure modes of an API (admin lane)"""
+        generated = 0
+        for mode, (status_code, error_msg) in COMMON_ERROR_MODES.items():
+            error_class = self._error_class({"error": error_msg, "status_code": status_code, "status": mode})
+            cache_key = f"{api.api_id}:{error_class}"
+            if await self.error_explanations.aget(cache_key) is not None:
+                continue
+            
+            with priority_lane("admin"):
+                explanation = await llm_scheduler.call(self._generate_error_explanation, api, error_msg, status_code)
+            if explanation:
+                await self.error_explanations.aset(cache_key, explanation)
+                generated += 1
         
-        # Last resort: simple error message
-        return f"❌ I encountered an error while fetching data: {error_msg}"
+        logger.info(f"Pre-generated {generated} error explanations for {api.api_name}")
+    
+    async def invalidate_error_explanations(self, api_id: str):
+        """Drop cached error explanations for an API (e.g. after it was updated)"""
+        await self.error_explanations.adelete_prefix(f"{api_id}:")
     
     def _add_metadata(self, response: str, api: APIRegistry, data: Dict) -> str:
         """Add source attribution and timestamp"""
@@ -386,5 +517,5 @@ IMPORTANT RULES:
         return response + metadata
 
 
-# Global formatter instance
-response_formatter = ResponseFormatter()
+# Global formatter instance (constructed on first use)
+response_formatter: ResponseFormatter = Lazy(ResponseFormatter, "response_formatter")
@@ -0,0 +1,331 @@
+"""
+Retention - Archives and deletes old conversations, compacts old message metadata
+"""
+from typing import Dict, Any, List, Optional
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import Session
+from app.core.cache import create_cache_backend
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.core import serialization
+from app.models.database import Message, Conversation
+from datetime import datetime, timedelta
+import asyncio
+import gzip
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+# Metadata fields still used once a message is old (history bubbles, analytics)
+COMPACT_KEEP_KEYS = ("intent", "confidence", "api_id", "api_name", "api_used", "cached", "negative_cached", "error")
+
+STATE_FILE = "retention_state.json"
+
+
+class RetentionService:
+    """Keep the conversation tables bounded
+
+    Conversations that ended, or have been idle, for RETENTION_DAYS are
+    written to gzip-compressed JSONL archives (one conversation with its
+    messages per line) and then deleted, RETENTION_BATCH_SIZE conversations
+    per transaction. Messages older than RETENTION_COMPACT_AFTER_DAYS keep
+    only the metadata fields in COMPACT_KEEP_KEYS. Compaction changes stored
+    messages, so history pages are validated by a hash of their content
+    rather than by message IDs.
+
+    Every worker runs the loop. With a shared cache backend (redis or
+    sqlite) a pass first takes a lease in that backend, so only one worker
+    archives and compacts at a time; the others skip that round. Archive
+    files are named per pass and the state file is replaced atomically, so
+    workers never write to the same file.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()
+        self.running = False
+        self.progress: Dict[str, Any] = {}
+        self.last_report: Optional[Dict[str, Any]] = None
+        # Held by the worker running a pass (expires on its own if that worker dies)
+        self.leases = create_cache_backend("retention_lease", default_ttl=settings.RETENTION_INTERVAL_SECONDS, max_bytes=64 * 1024)
+
+    def start(self):
+        """Start the background retention loop"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+            logger.info("Retention service started")
+
+    async def stop(self):
+        """Stop the background retention loop"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.RETENTION_INTERVAL_SECONDS)
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}", exc_info=True)
+
+    async def run(self) -> Optional[Dict[str, Any]]:
+        """Run one retention pass off the event loop. Returns the report, or None
+        if another worker is running one."""
+        async with self.lock:
+            if not await self.leases.run(self.leases.add, "pass", os.getpid(), settings.RETENTION_INTERVAL_SECONDS):
+                logger.info("Retention: another worker is running a pass, skipping")
+                return None
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, self.run_once)
+            finally:
+                await self.leases.adelete("pass")
+
+    def run_once(self) -> Dict[str, Any]:
+        """Archive and delete expired conversations, then compact old metadata"""
+        started = time.time()
+        self.running = True
+        self.progress = {"archived_conversations": 0, "archived_messages": 0, "compacted_messages": 0}
+        storage_before = self.storage_stats()
+
+        db = SessionLocal()
+        try:
+            archive = self.archive_expired(db)
+            compacted = self.compact_metadata(db)
+        finally:
+            db.close()
+            self.running = False
+
+        if settings.RETENTION_VACUUM and archive["archived_conversations"] and engine.dialect.name == "sqlite":
+            # Freed pages are reused either way; VACUUM also returns them to the filesystem
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+
+        storage_after = self.storage_stats()
+        report = {
+            **archive,
+            **compacted,
+            "storage_before": storage_before,
+            "storage_after": storage_after,
+            "duration_seconds": round(time.time() - started, 3),
+            "finished_at": datetime.utcnow().isoformat()
+        }
+        self.last_report = report
+        logger.info(
+            f"Retention: archived {report['archived_conversations']} conversations "
+            f"({report['archived_messages']} messages, {report['archive_bytes']} bytes), "
+            f"compacted {report['compacted_messages']} messages "
+            f"(-{report['metadata_bytes_saved']} bytes)"
+        )
+        return report
+
+    def archive_expired(self, db: Session) -> Dict[str, Any]:
+        """Archive conversations past the retention period, then delete them in batches"""
+        cutoff = datetime.utcnow() - timedelta(days=settings.RETENTION_DAYS)
+        archive_path = None
+        archived_conversations = 0
+        archived_messages = 0
+        freed_bytes = 0
+
+        while True:
+            session_ids = self._expired_sessions(db, cutoff, settings.RETENTION_BATCH_SIZE)
+            if not session_ids:
+                break
+
+            conversations = db.query(
+                Conversation.session_id, Conversation.user_id,
+                Conversation.started_at, Conversation.ended_at
+            ).filter(Conversation.session_id.in_(session_ids)).all()
+            messages = db.query(
+                Message.message_id, Message.session_id, Message.role,
+                Message.content, Message.message_metadata, Message.created_at
+            ).filter(Message.session_id.in_(session_ids)).order_by(
+                Message.session_id, Message.created_at, Message.message_id
+            ).all()
+
+            by_session: Dict[str, List[Dict[str, Any]]] = {}
+            for msg in messages:
+                by_session.setdefault(msg.session_id, []).append({
+                    "message_id": msg.message_id,
+                    "role": msg.role,
+                    "content": msg.content,
+                    "metadata": msg.message_metadata,
+                    "created_at": msg.created_at
+                })
+
+            # Write (and flush) the archive before deleting, so a crash can
+            # at worst archive a batch twice but never lose it
+            if archive_path is None:
+                archive_path = self._archive_path()
+            with gzip.open(archive_path, "ab") as archive:
+                for conversation in conversations:
+                    line = {
+                        "session_id": conversation.session_id,
+                        "user_id": conversation.user_id,
+                        "started_at": conversation.started_at,
+                        "ended_at": conversation.ended_at,
+                        "messages": by_session.get(conversation.session_id, [])
+                    }
+                    archive.write(serialization.dumps(line) + b"\n")
+
+            db.query(Message).filter(Message.session_id.in_(session_ids)).delete(synchronize_session=False)
+            db.query(Conversation).filter(Conversation.session_id.in_(session_ids)).delete(synchronize_session=False)
+            db.commit()
+
+            archived_conversations += len(conversations)
+            archived_messages += len(messages)
+            freed_bytes += sum(
+                len(msg.content.encode()) + len(serialization.dumps(msg.message_metadata))
+                for msg in messages
+            )
+            self.progress["archived_conversations"] = archived_conversations
+            self.progress["archived_messages"] = archived_messages
+            logger.info(f"Retention: archived {archived_conversations} conversations so far")
+
+        return {
+            "archived_conversations": archived_conversations,
+            "archived_messages": archived_messages,
+            "archive_file": archive_path,
+            "archive_bytes": os.path.getsize(archive_path) if archive_path else 0,
+            "message_bytes_freed": freed_bytes
+        }
+
+    def compact_metadata(self, db: Session) -> Dict[str, Any]:
+        """Strip old messages' metadata down to COMPACT_KEEP_KEYS
+
+        Only messages that aged past the compaction cutoff since the last
+        run are visited; the watermark is kept in the archive directory.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=settings.RETENTION_COMPACT_AFTER_DAYS)
+        state = self._load_state()
+        watermark = state.get("compacted_until")
+        position = (datetime.fromisoformat(watermark), "") if watermark else None
+
+        compacted = 0
+        saved_bytes = 0
+        while True:
+            query = db.query(Message.message_id, Message.created_at, Message.message_metadata).filter(
+                Message.created_at < cutoff
+            )
+            if position:
+                query = query.filter(or_(
+                    Message.created_at > position[0],
+                    and_(Message.created_at == position[0], Message.message_id > position[1])
+                ))
+            rows = query.order_by(Message.created_at, Message.message_id).limit(settings.RETENTION_BATCH_SIZE).all()
+            if not rows:
+                break
+
+            for row in rows:
+                compact = compact_message_metadata(row.message_metadata)
+                if compact != row.message_metadata:
+                    saved_bytes += len(serialization.dumps(row.message_metadata)) - len(serialization.dumps(compact))
+                    db.query(Message).filter(Message.message_id == row.message_id).update(
+                        {Message.message_metadata: compact}, synchronize_session=False
+                    )
+                    compacted += 1
+            db.commit()
+
+            position = (rows[-1].created_at, rows[-1].message_id)
+            self.progress["compacted_messages"] = compacted
+
+        state["compacted_until"] = cutoff.isoformat()
+        self._save_state(state)
+        return {"compacted_messages": compacted, "metadata_bytes_saved": saved_bytes}
+
+    def storage_stats(self) -> Dict[str, Any]:
+        """Row counts, plus file and reusable (free page) bytes for SQLite"""
+        db = SessionLocal()
+        try:
+            stats: Dict[str, Any] = {
+                "conversations": db.query(func.count(Conversation.session_id)).scalar(),
+                "messages": db.query(func.count(Message.message_id)).scalar()
+            }
+        finally:
+            db.close()
+
+        if engine.dialect.name == "sqlite":
+            with engine.connect() as conn:
+                page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+                page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+                free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            stats["database_bytes"] = page_size * page_count
+            stats["free_bytes"] = page_size * free_pages
+        return stats
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get retention status and the last report"""
+        return {
+            "enabled": settings.RETENTION_ENABLED,
+            "scheduled": self.task is not None,
+            "running": self.running,
+            "progress": self.progress if self.running else None,
+            "retention_days": settings.RETENTION_DAYS,
+            "compact_after_days": settings.RETENTION_COMPACT_AFTER_DAYS,
+            "last_report": self.last_report
+        }
+
+    def _expired_sessions(self, db: Session, cutoff: datetime, limit: int) -> List[str]:
+        """Sessions that ended, or saw no message, before the cutoff"""
+        last_message = db.query(
+            Message.session_id.label("session_id"),
+            func.max(Message.created_at).label("last_at")
+        ).group_by(Message.session_id).subquery()
+
+        rows = db.query(Conversation.session_id).outerjoin(
+            last_message, last_message.c.session_id == Conversation.session_id
+        ).filter(or_(
+            Conversation.ended_at < cutoff,
+            and_(
+                Conversation.ended_at.is_(None),
+                func.coalesce(last_message.c.last_at, Conversation.started_at) < cutoff
+            )
+        )).limit(limit).all()
+        return [row.session_id for row in rows]
+
+    def _archive_path(self) -> str:
+        os.makedirs(settings.RETENTION_ARCHIVE_DIR, exist_ok=True)
+        # Unique per pass, so no two writers ever append to the same gzip file
+        name = f"conversations-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+        return os.path.join(settings.RETENTION_ARCHIVE_DIR, name)
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(settings.RETENTION_ARCHIVE_DIR, STATE_FILE), "rb") as f:
+                return serialization.loads(f.read())
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, Any]):
+        os.makedirs(settings.RETENTION_ARCHIVE_DIR, exist_ok=True)
+        path = os.path.join(settings.RETENTION_ARCHIVE_DIR, STATE_FILE)
+        # Write a temporary file and rename it, so readers never see a partial state
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(serialization.dumps(state))
+        os.replace(temp_path, path)
+
+
+def compact_message_metadata(metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Keep only COMPACT_KEEP_KEYS, reducing a nested intent dict to its name and confidence"""
+    if not isinstance(metadata, dict):
+        return metadata
+
+    compact = {key: metadata[key] for key in COMPACT_KEEP_KEYS if key in metadata}
+    intent = compact.get("intent")
+    if isinstance(intent, dict):
+        compact["intent"] = {key: intent[key] for key in ("intent", "confidence") if key in intent}
+    return compact
+
+
+# Global retention service instance
+retention_service = RetentionService()
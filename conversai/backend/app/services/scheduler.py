@@ -0,0 +1,198 @@
+"""
+Scheduler - Priority lanes for chat turns, LLM calls and upstream API calls
+"""
+from typing import Callable, Dict, Any, Optional, Tuple
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from app.core.config import settings
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Priority classes, most latency-sensitive first
+PRIORITY_CLASSES = ("interactive", "batch", "admin")
+
+# Class of the work running in the current task; set with priority_lane()
+current_priority: ContextVar[str] = ContextVar("current_priority", default="interactive")
+
+
+@contextmanager
+def priority_lane(priority: str):
+    """Run the enclosed work (and everything it awaits) in a priority class"""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority class: {priority}")
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class PriorityScheduler:
+    """Concurrency limit shared by the priority classes
+
+    Each class keeps PRIORITY_<CLASS>_RESERVED of the capacity for itself
+    (other classes never take those slots, even when they are idle) and
+    competes for the rest by PRIORITY_<CLASS>_WEIGHT: a freed slot goes to
+    the waiting class using the least of its weighted share. Within a class
+    waiters are served in arrival order.
+
+    Reservations never take the last slot, so every class can make
+    progress. When the reserved fractions don't fit a small capacity, the
+    more interactive classes keep theirs first (e.g. with a capacity of 2
+    only interactive reserves a slot and the other slot is shared).
+    """
+
+    def __init__(self, name: str, capacity_setting: str, classes: Tuple[str, ...] = PRIORITY_CLASSES):
+        self.name = name
+        self.capacity_setting = capacity_setting
+        # Only these classes use the lane, so only they hold reservations in it
+        self.classes = classes
+        self.in_use: Dict[str, int] = {priority: 0 for priority in classes}
+        # Futures of tasks waiting for a slot, per class, oldest first
+        self.waiters: Dict[str, deque] = {priority: deque() for priority in classes}
+        self.granted: Dict[str, int] = {priority: 0 for priority in classes}
+        self.max_queue_depth: Dict[str, int] = {priority: 0 for priority in classes}
+        # Recent queue waits of granted slots (seconds)
+        self.queue_waits: Dict[str, deque] = {priority: deque(maxlen=1000) for priority in classes}
+
+    @property
+    def capacity(self) -> int:
+        return max(getattr(settings, self.capacity_setting), 1)
+
+    def reserved(self, priority: str) -> int:
+        remaining = self.capacity - 1
+        for p in self.classes:
+            fraction = getattr(settings, f"PRIORITY_{p.upper()}_RESERVED")
+            share = min(max(1, int(self.capacity * fraction)) if fraction > 0 else 0, remaining)
+            if p == priority:
+                return share
+            remaining -= share
+        return 0
+
+    def weight(self, priority: str) -> int:
+        return max(getattr(settings, f"PRIORITY_{priority.upper()}_WEIGHT"), 1)
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None):
+        """Hold a slot of the current (or given) class for the duration of the block"""
+        priority = priority or current_priority.get()
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    async def call(self, fn: Callable, *args):
+        """Run a blocking function in the default executor while holding a slot"""
+        async with self.slot():
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def acquire(self, priority: str, timeout: Optional[float] = None):
+        if not self._has_waiters(priority) and self._can_grant(priority):
+            self._grant(priority, 0.0)
+            return
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self.waiters[priority].append(waiter)
+        self.max_queue_depth[priority] = max(self.max_queue_depth[priority], len(self.waiters[priority]))
+        queued_at = time.monotonic()
+        deadline = loop.call_later(timeout, self._expire, priority, waiter) if timeout is not None else None
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Cancelled after release() handed over the slot: give it back
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                self.release(priority)
+            raise
+        finally:
+            if deadline is not None:
+                deadline.cancel()
+        self.queue_waits[priority].append(time.monotonic() - queued_at)
+
+    def release(self, priority: str):
+        """Free a slot and hand freed capacity to the waiters entitled to it"""
+        self.in_use[priority] -= 1
+        while True:
+            candidates = [p for p in self.classes if self._has_waiters(p) and self._can_grant(p)]
+            if not candidates:
+                return
+            # Least weighted share in use first; ties go to the more interactive class
+            chosen = min(candidates, key=lambda p: self.in_use[p] / self.weight(p))
+            self.waiters[chosen].popleft().set_result(None)
+            self._grant(chosen)
+
+    def queue_depth(self, priority: Optional[str] = None) -> int:
+        classes = [priority] if priority else self.classes
+        return sum(1 for p in classes for waiter in self.waiters[p] if not waiter.done())
+
+    def get_stats(self) -> Dict[str, Any]:
+        classes = {}
+        for priority in self.classes:
+            waits = sorted(self.queue_waits[priority])
+            classes[priority] = {
+                "reserved": self.reserved(priority),
+                "weight": self.weight(priority),
+                "in_use": self.in_use[priority],
+                "queue_depth": self.queue_depth(priority),
+                "max_queue_depth": self.max_queue_depth[priority],
+                "granted": self.granted[priority],
+                "queue_wait_ms_p50": self._percentile_ms(waits, 0.5),
+                "queue_wait_ms_p99": self._percentile_ms(waits, 0.99)
+            }
+        return {
+            "capacity": self.capacity,
+            "in_use": sum(self.in_use.values()),
+            "queue_depth": self.queue_depth(),
+            "classes": classes
+        }
+
+    def _can_grant(self, priority: str) -> bool:
+        in_use = sum(self.in_use.values())
+        if in_use >= self.capacity:
+            return False
+        if self.in_use[priority] < self.reserved(priority):
+            return True
+        # Free slots still held back for the other classes' reservations
+        held = sum(max(0, self.reserved(p) - self.in_use[p]) for p in self.classes if p != priority)
+        return self.capacity - in_use > held
+
+    def _grant(self, priority: str, queue_wait: Optional[float] = None):
+        self.in_use[priority] += 1
+        self.granted[priority] += 1
+        if queue_wait is not None:
+            self.queue_waits[priority].append(queue_wait)
+
+    def _has_waiters(self, priority: str) -> bool:
+        waiters = self.waiters[priority]
+        while waiters and waiters[0].done():
+            waiters.popleft()
+        return bool(waiters)
+
+    def _expire(self, priority: str, waiter: asyncio.Future):
+        """Queue deadline passed: fail the waiter if it is still waiting"""
+        if waiter.done():
+            return
+        try:
+            self.waiters[priority].remove(waiter)
+        except ValueError:
+            pass
+        waiter.set_exception(self._timeout_error(priority))
+
+    def _timeout_error(self, priority: str) -> Exception:
+        return asyncio.TimeoutError(f"No {self.name} slot within the queue deadline")
+
+    def _percentile_ms(self, values, fraction: float) -> Optional[float]:
+        if not values:
+            return None
+        return round(values[min(int(len(values) * fraction), len(values) - 1)] * 1000, 1)
+
+
+# Global LLM and upstream API lanes
+llm_scheduler = PriorityScheduler("llm", "LLM_MAX_CONCURRENT")
+upstream_scheduler = PriorityScheduler("upstream", "UPSTREAM_MAX_CONCURRENT")
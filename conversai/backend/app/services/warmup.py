@@ -0,0 +1,159 @@
+"""
+Warmup - Resolves API hosts and opens pooled connections before taking traffic
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from collections import Counter
+from urllib.parse import urlsplit
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.lazy import resolve
+from app.models.database import APIRegistry, Message
+from app.services.http_client import shared_http_client
+from app.services.llm_service import llm_client
+from datetime import datetime
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Recent assistant messages sampled to rank hosts by use
+USAGE_SAMPLE_MESSAGES = 2000
+
+
+class WarmupService:
+    """Pay DNS, TCP and TLS setup at boot instead of on the first user requests
+
+    After startup, in the background: construct the LLM client, resolve
+    and cache DNS for every active API host, open a pooled keep-alive
+    connection to the WARMUP_CONNECT_HOSTS most used hosts, and optionally
+    probe the LLM (its SDK has its own connections and DNS, so the probe is
+    what warms them). The worker reports ready
+    (GET /health/ready) once this finishes or WARMUP_TIMEOUT_SECONDS
+    passes; warmup failures never keep it unready.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.ready = not settings.WARMUP_ENABLED
+        self.report: Dict[str, Any] = {}
+
+    def start(self):
+        """Start warmup in the background"""
+        if self.task is None:
+            self.ready = False
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "enabled": settings.WARMUP_ENABLED,
+            "report": self.report
+        }
+
+    async def _run(self):
+        started = time.perf_counter()
+        self.report = {"started_at": datetime.utcnow().isoformat()}
+        try:
+            await asyncio.wait_for(self.warm(), timeout=settings.WARMUP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.report["timed_out"] = True
+            logger.warning(f"Warmup did not finish within {settings.WARMUP_TIMEOUT_SECONDS} s")
+        except Exception as e:
+            self.report["error"] = str(e)
+            logger.error(f"Warmup failed: {e}", exc_info=True)
+        finally:
+            self.report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self.ready = True
+            logger.info(
+                f"Warmup done in {self.report['duration_ms']:.0f} ms: "
+                f"{len(self.report.get('resolved', []))} hosts resolved, "
+                f"{len(self.report.get('connected', []))} connections opened"
+            )
+
+    async def warm(self):
+        loop = asyncio.get_running_loop()
+
+        # Importing the LLM SDK takes a few hundred ms; keep it off the event loop
+        llm = await loop.run_in_executor(None, resolve, llm_client)
+
+        origins = await loop.run_in_executor(None, self._ranked_origins)
+
+        # Resolve every host concurrently; the answers are cached for DNS_CACHE_TTL_SECONDS
+        results = await asyncio.gather(
+            *(shared_http_client.resolver.resolve(host, port) for _, host, port in origins),
+            return_exceptions=True
+        )
+        resolved = [origin for origin, result in zip(origins, results) if not isinstance(result, Exception)]
+        self.report["resolved"] = [host for _, host, _ in resolved]
+        self.report["unresolved"] = [host for (_, host, _), result in zip(origins, results) if isinstance(result, Exception)]
+
+        # Pre-open connections to the most used hosts
+        to_connect = [origin for origin in origins[:settings.WARMUP_CONNECT_HOSTS] if origin in resolved]
+        connected = await asyncio.gather(*(self._open_connection(origin) for origin in to_connect))
+        self.report["connected"] = [host for (_, host, _), ok in zip(to_connect, connected) if ok]
+
+        if settings.WARMUP_LLM_PROBE and llm.client is not None:
+            self.report["llm_probe"] = await loop.run_in_executor(None, self._probe_llm, llm)
+
+    def _ranked_origins(self) -> List[Tuple[str, str, int]]:
+        """(scheme, host, port) of active APIs, most used first (by recent assistant messages)"""
+        db = SessionLocal()
+        try:
+            apis = db.query(APIRegistry.api_id, APIRegistry.endpoint).filter(APIRegistry.is_active == True).all()
+            recent = db.query(Message.message_metadata).filter(Message.role == "assistant").order_by(
+                Message.created_at.desc()
+            ).limit(USAGE_SAMPLE_MESSAGES).all()
+        finally:
+            db.close()
+
+        usage = Counter(
+            row.message_metadata.get("api_id") for row in recent
+            if isinstance(row.message_metadata, dict) and row.message_metadata.get("api_id")
+        )
+        origin_usage: Counter = Counter()
+        for api in apis:
+            parts = urlsplit(api.endpoint or "")
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                continue
+            try:
+                port = parts.port or (443 if parts.scheme == "https" else 80)
+            except ValueError:
+                continue
+            # Every active API counts once, so unused system APIs still rank above nothing
+            origin_usage[(parts.scheme, parts.hostname, port)] += 1 + usage.get(api.api_id, 0) * 10
+        return [origin for origin, _ in origin_usage.most_common()]
+
+    async def _open_connection(self, origin: Tuple[str, str, int]) -> bool:
+        """Open (and leave pooled) a keep-alive connection with a HEAD request to the origin"""
+        scheme, host, port = origin
+        try:
+            response = await shared_http_client.get().head(f"{scheme}://{host}:{port}/")
+            await response.aclose()
+            return True
+        except Exception as e:
+            logger.info(f"Warmup could not connect to {host}: {e}")
+            return False
+
+    def _probe_llm(self, llm) -> Optional[str]:
+        """Cheap LLM call (lists models, no tokens used) to warm the SDK's connection"""
+        try:
+            llm.client.models.list()
+            return "ok"
+        except Exception as e:
+            logger.info(f"LLM warmup probe failed: {e}")
+            return f"failed: {e}"
+
+
+# Global warmup service instance
+warmup_service = WarmupService()
@@ -0,0 +1,66 @@
+"""
+Benchmark the JSON codec used for cache entries, JSON columns and HTTP
+responses (app.core.serialization) against the standard library.
+
+Run from the backend directory:  python benchmark_serialization.py
+"""
+import json
+import timeit
+from app.core import serialization
+
+# Representative payloads from the hot path
+request_params = {"q": "London", "units": "metric", "appid": "x" * 32}
+news_payload = {
+    "status": "ok",
+    "totalResults": 20,
+    "articles": [
+        {
+            "source": {"id": None, "name": f"Source {i}"},
+            "title": f"Headline number {i} about markets and weather",
+            "description": "A short description of the article. " * 4,
+            "url": f"https://example.com/articles/{i}",
+            "publishedAt": "2024-01-01T12:00:00Z"
+        }
+        for i in range(20)
+    ]
+}
+message_metadata = {"api_used": "NewsAPI", "cached": False, "negative_cached": False, "intent": "news"}
+
+CASES = [
+    ("sorted params", request_params, {"sort_keys": True}),
+    ("cached news payload", news_payload, {}),
+    ("message metadata", message_metadata, {}),
+]
+
+
+def bench(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    print(f"orjson available: {serialization.orjson is not None}\n")
+    print(f"{'case':<22}{'op':<8}{'stdlib µs':>12}{'codec µs':>12}{'speedup':>10}")
+    for name, value, options in CASES:
+        encoded = serialization.dumps(value)
+        number = 20000 if len(encoded) < 1000 else 2000
+        timings = [
+            ("dumps",
+             lambda: json.dumps(value, **options),
+             lambda: serialization.dumps(value, **options)),
+            ("loads",
+             lambda: json.loads(encoded),
+             lambda: serialization.loads(encoded)),
+        ]
+        for op, stdlib_func, codec_func in timings:
+            stdlib_us = bench(stdlib_func, number)
+            codec_us = bench(codec_func, number)
+            print(f"{name:<22}{op:<8}{stdlib_us:>12.2f}{codec_us:>12.2f}{stdlib_us / codec_us:>9.1f}x")
+
+    # Prompt payloads are sent compact instead of indented
+    indented = len(json.dumps(news_payload, indent=2))
+    compact = len(serialization.dumps(news_payload))
+    print(f"\nNews payload in prompts: {indented} -> {compact} characters ({1 - compact / indented:.0%} smaller)")
+
+
+if __name__ == "__main__":
+    main()
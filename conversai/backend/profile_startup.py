@@ -0,0 +1,79 @@
+"""
+Profile worker boot: module import times (python -X importtime) and the
+per-phase timings of the startup event, checked against STARTUP_BUDGET_MS.
+
+Run from the backend directory:  python profile_startup.py [--top N]
+Exits with status 1 when boot exceeds the budget.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+
+
+def import_profile(top: int):
+    """Import app.main in a fresh interpreter and report the slowest modules"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, env=os.environ.copy()
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing app.main failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    total_us = next((cumulative for name, _, cumulative in rows if name == "app.main"), 0)
+    print(f"Importing app.main (fresh interpreter): {total_us / 1000:.0f} ms, {len(rows)} modules\n")
+
+    # Top-level packages by cumulative time (what an import of the package costs)
+    packages = {}
+    for name, _, cumulative in rows:
+        package = name.split(".")[0]
+        packages[package] = max(packages.get(package, 0), cumulative)
+    print(f"{'package':<36}{'cumulative ms':>14}")
+    for package, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:<36}{cumulative / 1000:>14.1f}")
+
+    print(f"\n{'module':<60}{'self ms':>10}")
+    for name, self_us, _ in sorted(rows, key=lambda row: -row[1])[:top]:
+        print(f"{name:<60}{self_us / 1000:>10.1f}")
+
+
+async def startup_profile_report():
+    """Run the startup and shutdown events in-process and return the boot report"""
+    from app.main import app
+    from app.core.startup import startup_profile
+
+    await app.router.startup()
+    try:
+        return startup_profile.report()
+    finally:
+        await app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="rows to show per table")
+    args = parser.parse_args()
+
+    import_profile(args.top)
+
+    report = asyncio.run(startup_profile_report())
+    print(f"\n{'phase':<36}{'ms':>14}")
+    for phase, ms in report["phases_ms"].items():
+        print(f"{phase:<36}{ms:>14.1f}")
+    print(f"{'total':<36}{report['total_ms']:>14.1f}   (budget {report['budget_ms']} ms)")
+
+    if report["over_budget"]:
+        print("\nBoot is over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
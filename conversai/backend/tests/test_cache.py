@@ -0,0 +1,220 @@
+"""
+Tests for the cache backends (app/core/cache.py)
+"""
+import threading
+import time
+import pytest
+from app.core.cache import (
+    GDSFStore, MemoryCacheBackend, RedisCacheBackend, SQLiteCacheBackend, TieredCacheBackend,
+    ENTRY_OVERHEAD_BYTES
+)
+
+
+@pytest.fixture
+def redis_cache():
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisCacheBackend("test", default_ttl=300, client=fakeredis.FakeRedis())
+
+
+@pytest.fixture
+def tiered(tmp_path):
+    cache = TieredCacheBackend(
+        MemoryCacheBackend("test", 300, max_bytes=1024 * 1024),
+        SQLiteCacheBackend("test", 300, path=str(tmp_path / "cache.db"))
+    )
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def blocked_writer(tiered):
+    """Hold the tiered writer thread so queued disk operations stay pending"""
+    gate = threading.Event()
+    tiered.pending.put(gate.wait)
+    yield gate
+    gate.set()
+
+
+def entry_size(key, payload):
+    return len(payload) + len(key) + ENTRY_OVERHEAD_BYTES
+
+
+# Redis
+
+def test_redis_index_counts_entries_and_bytes_per_prefix(redis_cache):
+    redis_cache.set("a:1", "x" * 10)
+    redis_cache.set("a:2", "y" * 20)
+    redis_cache.set("b:1", [1, 2, 3])
+
+    assert redis_cache.size() == 3
+    usage = redis_cache.usage_by_prefix()
+    assert usage["a"] == {"entries": 2, "bytes": 12 + 22}
+    assert usage["b"] == {"entries": 1, "bytes": len(b"[1,2,3]")}
+
+    # Overwriting a key changes its bytes, not the entry count
+    redis_cache.set("a:1", "x")
+    assert redis_cache.usage_by_prefix()["a"] == {"entries": 2, "bytes": 3 + 22}
+    assert redis_cache.get("a:1") == "x"
+
+
+def test_redis_delete_prefix_updates_index(redis_cache):
+    for key in ("a:1", "a:2", "ab:1", "b:1"):
+        redis_cache.set(key, key)
+
+    assert redis_cache.delete_prefix("a:") == 2
+    assert redis_cache.get("a:1") is None
+    assert redis_cache.get("ab:1") == "ab:1"
+    assert redis_cache.size() == 2
+    assert set(redis_cache.usage_by_prefix()) == {"ab", "b"}
+
+    redis_cache.delete("b:1")
+    assert redis_cache.size() == 1
+    assert set(redis_cache.usage_by_prefix()) == {"ab"}
+
+
+def test_redis_delete_prefix_matches_glob_characters_literally(redis_cache):
+    for key in ("q*:1", "qx:1", "r[a]:1", "ra:1", "s?:1", "sx:1"):
+        redis_cache.set(key, 1)
+
+    assert redis_cache.delete_prefix("q*") == 1
+    assert redis_cache.delete_prefix("r[a]") == 1
+    assert redis_cache.delete_prefix("s?") == 1
+    assert redis_cache.get("qx:1") == 1
+    assert redis_cache.get("ra:1") == 1
+    assert redis_cache.get("sx:1") == 1
+
+
+def test_redis_expired_keys_are_pruned_from_index(redis_cache):
+    redis_cache.set("a:1", 1)
+    assert redis_cache.add("a:2", 2, ttl=0.05)
+    time.sleep(0.1)
+
+    assert redis_cache.get("a:2") is None
+    assert redis_cache.size() == 1
+    assert redis_cache.usage_by_prefix()["a"]["entries"] == 1
+
+
+def test_redis_add_only_stores_absent_keys(redis_cache):
+    assert redis_cache.add("lease", 1, ttl=10)
+    assert not redis_cache.add("lease", 2, ttl=10)
+    assert redis_cache.get("lease") == 1
+    assert redis_cache.size() == 1
+
+
+def test_redis_clear_drops_entries_and_index(redis_cache):
+    redis_cache.set("a:1", 1)
+    redis_cache.set("b:1", 2)
+    redis_cache.clear()
+
+    assert redis_cache.size() == 0
+    assert redis_cache.usage_by_prefix() == {}
+    assert redis_cache.client.keys("*") == []
+
+
+# Tiered write-behind
+
+def test_tiered_loads_disk_entries_on_memory_miss(tiered):
+    tiered.set("a:1", {"v": 1})
+    tiered.flush()
+    tiered.memory.clear()
+
+    assert tiered.get("a:1") == {"v": 1}
+    # Promoted back into memory
+    assert tiered.memory.get("a:1") == {"v": 1}
+
+
+@pytest.mark.asyncio
+async def test_tiered_queued_delete_hides_disk_row(tiered, blocked_writer):
+    tiered.set("a:1", {"v": 1})
+    tiered.persistent.set("a:1", {"v": 1})
+
+    tiered.delete("a:1")
+    assert tiered.get("a:1") is None
+    assert await tiered.aget("a:1") is None
+    assert tiered.memory.get("a:1") is None
+
+    blocked_writer.set()
+    tiered.flush()
+    assert tiered.deleted_keys == {}
+    assert tiered.persistent.get("a:1") is None
+
+
+def test_tiered_queued_prefix_delete_hides_disk_rows_until_rewritten(tiered, blocked_writer):
+    tiered.persistent.set("a:1", 1)
+    tiered.persistent.set("a:2", 2)
+    tiered.persistent.set("b:1", 3)
+
+    tiered.delete_prefix("a:")
+    assert tiered.get("a:1") is None
+    assert tiered.get("b:1") == 3
+
+    # A write after the delete is served from memory
+    tiered.set("a:2", 4)
+    assert tiered.get("a:2") == 4
+
+    blocked_writer.set()
+    tiered.flush()
+    assert tiered.deleted_prefixes == {}
+    assert tiered.persistent.get("a:1") is None
+    assert tiered.persistent.get("a:2") == 4
+
+
+def test_tiered_disk_read_racing_a_delete_is_not_promoted(tiered, monkeypatch):
+    tiered.persistent.set("a:1", 1)
+    read_entry = tiered.persistent.get_entry
+
+    def get_entry_then_delete(key):
+        entry = read_entry(key)
+        # The delete lands while the row is in flight
+        tiered.delete(key)
+        return entry
+
+    monkeypatch.setattr(tiered.persistent, "get_entry", get_entry_then_delete)
+    assert tiered.get("a:1") is None
+    assert tiered.memory.get("a:1") is None
+
+
+# GDSF
+
+def test_gdsf_stays_within_max_bytes():
+    removed = []
+    payload = b"x" * 100
+    store = GDSFStore(entry_size("k0", payload) * 3, on_remove=lambda key, reason: removed.append((key, reason)))
+
+    for index in range(5):
+        assert store.set(f"k{index}", payload, time.time() + 60, time.time())
+        assert store.bytes <= store.max_bytes
+
+    assert len(store.data) == 3
+    assert [reason for _, reason in removed] == ["eviction", "eviction"]
+
+
+def test_gdsf_evicts_large_cold_entries_before_small_hot_ones():
+    now = time.time()
+    store = GDSFStore(2000, on_remove=lambda key, reason: None)
+    store.set("small", b"s" * 50, now + 60, now)
+    store.set("large", b"l" * 1000, now + 60, now)
+    for _ in range(3):
+        store.get("small", now)
+
+    store.set("new", b"n" * 500, now + 60, now)
+    assert "small" in store.data
+    assert "large" not in store.data
+
+
+def test_gdsf_rejects_oversized_entries():
+    store = GDSFStore(10000, on_remove=lambda key, reason: None, max_entry_bytes=500)
+    assert not store.set("big", b"x" * 1000, time.time() + 60, time.time())
+    assert store.rejected == 1
+    assert store.bytes == 0
+
+
+def test_gdsf_reports_expirations():
+    removed = []
+    store = GDSFStore(10000, on_remove=lambda key, reason: removed.append((key, reason)))
+    now = time.time()
+    store.set("old", b"x", now + 1, now)
+
+    assert store.get("old", now + 2) is None
+    assert removed == [("old", "expiration")]
+    assert store.bytes == 0
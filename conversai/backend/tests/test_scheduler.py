@@ -0,0 +1,184 @@
+"""
+Tests for the priority lanes (app/services/scheduler.py)
+"""
+import asyncio
+import pytest
+from app.core.config import settings
+from app.services.scheduler import PriorityScheduler
+
+
+@pytest.fixture
+def lane(monkeypatch):
+    """Build a scheduler over LLM_MAX_CONCURRENT with the given capacity and reserved fractions"""
+    def build(capacity, interactive=0.0, batch=0.0, admin=0.0):
+        monkeypatch.setattr(settings, "LLM_MAX_CONCURRENT", capacity)
+        monkeypatch.setattr(settings, "PRIORITY_INTERACTIVE_RESERVED", interactive)
+        monkeypatch.setattr(settings, "PRIORITY_BATCH_RESERVED", batch)
+        monkeypatch.setattr(settings, "PRIORITY_ADMIN_RESERVED", admin)
+        monkeypatch.setattr(settings, "PRIORITY_INTERACTIVE_WEIGHT", 6)
+        monkeypatch.setattr(settings, "PRIORITY_BATCH_WEIGHT", 3)
+        monkeypatch.setattr(settings, "PRIORITY_ADMIN_WEIGHT", 1)
+        return PriorityScheduler("test", "LLM_MAX_CONCURRENT")
+    return build
+
+
+async def queue(scheduler, priority, order, label, timeout=None):
+    """Wait for a slot, note the grant and keep the slot"""
+    await scheduler.acquire(priority, timeout=timeout)
+    order.append(label)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_freed_slots_go_to_interactive_first_then_arrival_order(lane):
+    scheduler = lane(1)
+    await scheduler.acquire("admin")
+
+    order = []
+    tasks = [
+        asyncio.create_task(queue(scheduler, "batch", order, "batch-1")),
+        asyncio.create_task(queue(scheduler, "interactive", order, "interactive-1")),
+        asyncio.create_task(queue(scheduler, "interactive", order, "interactive-2")),
+    ]
+    await settle()
+    assert order == []
+    assert scheduler.queue_depth() == 3
+
+    scheduler.release("admin")
+    await settle()
+    scheduler.release("interactive")
+    await settle()
+    scheduler.release("interactive")
+    await settle()
+
+    assert order == ["interactive-1", "interactive-2", "batch-1"]
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_freed_slot_goes_to_class_using_least_of_its_weighted_share(lane):
+    scheduler = lane(3)
+    await scheduler.acquire("interactive")
+    await scheduler.acquire("interactive")
+    await scheduler.acquire("admin")
+
+    order = []
+    tasks = [
+        asyncio.create_task(queue(scheduler, "interactive", order, "interactive")),
+        asyncio.create_task(queue(scheduler, "batch", order, "batch")),
+    ]
+    await settle()
+
+    # interactive holds 2/6 of its weight, batch 0/3
+    scheduler.release("admin")
+    await settle()
+    assert order == ["batch"]
+
+    scheduler.release("batch")
+    await settle()
+    assert order == ["batch", "interactive"]
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_reservations_are_never_taken_by_other_classes(lane):
+    scheduler = lane(10, interactive=0.5, batch=0.1, admin=0.1)
+    assert [scheduler.reserved(p) for p in scheduler.classes] == [5, 1, 1]
+
+    # Admin gets its own slot plus the 3 shared ones, never interactive's or batch's
+    for _ in range(4):
+        await scheduler.acquire("admin", timeout=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        await scheduler.acquire("admin", timeout=0.01)
+
+    # Interactive and batch still start at once
+    for _ in range(5):
+        await scheduler.acquire("interactive", timeout=0.01)
+    await scheduler.acquire("batch", timeout=0.01)
+    assert sum(scheduler.in_use.values()) == 10
+
+
+@pytest.mark.asyncio
+async def test_reservations_larger_than_capacity_keep_interactive_and_a_shared_slot(lane):
+    # Each fraction rounds up to one slot: 3 reserved slots for a capacity of 2
+    scheduler = lane(2, interactive=0.5, batch=0.1, admin=0.1)
+    assert [scheduler.reserved(p) for p in scheduler.classes] == [1, 0, 0]
+
+    # Batch and admin share the unreserved slot...
+    await scheduler.acquire("batch", timeout=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        await scheduler.acquire("admin", timeout=0.01)
+
+    # ...and never block interactive
+    await scheduler.acquire("interactive", timeout=0.01)
+
+    scheduler.release("batch")
+    await scheduler.acquire("admin", timeout=0.01)
+    assert scheduler.in_use == {"interactive": 1, "batch": 0, "admin": 1}
+
+
+@pytest.mark.asyncio
+async def test_single_slot_has_no_reservations(lane):
+    scheduler = lane(1, interactive=0.5, batch=0.1, admin=0.1)
+    assert [scheduler.reserved(p) for p in scheduler.classes] == [0, 0, 0]
+    await scheduler.acquire("admin", timeout=0.01)
+
+
+@pytest.mark.asyncio
+async def test_queue_deadline_sheds_the_waiter(lane):
+    scheduler = lane(1)
+    await scheduler.acquire("interactive")
+
+    with pytest.raises(asyncio.TimeoutError):
+        await scheduler.acquire("batch", timeout=0.02)
+    assert scheduler.queue_depth() == 0
+    assert not scheduler.waiters["batch"]
+
+    # The freed slot isn't handed to the expired waiter
+    scheduler.release("interactive")
+    assert scheduler.in_use == {"interactive": 0, "batch": 0, "admin": 0}
+    await scheduler.acquire("batch", timeout=0.01)
+
+
+@pytest.mark.asyncio
+async def test_cancel_after_grant_hands_the_slot_back(lane):
+    scheduler = lane(1)
+    await scheduler.acquire("interactive")
+
+    order = []
+    waiting = asyncio.create_task(queue(scheduler, "batch", order, "batch"))
+    await settle()
+
+    # release() grants the slot to the waiter; it is cancelled before it resumes
+    scheduler.release("interactive")
+    assert scheduler.in_use["batch"] == 1
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+
+    assert order == []
+    assert scheduler.in_use == {"interactive": 0, "batch": 0, "admin": 0}
+    await scheduler.acquire("interactive", timeout=0.01)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_is_skipped(lane):
+    scheduler = lane(1)
+    await scheduler.acquire("admin")
+
+    order = []
+    cancelled = asyncio.create_task(queue(scheduler, "interactive", order, "cancelled"))
+    kept = asyncio.create_task(queue(scheduler, "interactive", order, "kept"))
+    await settle()
+    cancelled.cancel()
+    await settle()
+
+    scheduler.release("admin")
+    await settle()
+    assert order == ["kept"]
+    assert scheduler.in_use["interactive"] == 1
+    await kept
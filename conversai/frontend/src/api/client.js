@@ -21,7 +21,8 @@ export const chatAPI = {
 
   getHistory: async (sessionId, limit = 50) => {
     const response = await api.get(`/api/chat/history/${sessionId}`, {
-      params: { limit },
+      // Bubbles show the API used, cache status and intent confidence
+      params: { limit, include_metadata: true },
     });
     return response.data;
   },